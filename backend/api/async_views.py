@@ -0,0 +1,143 @@
+import json
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .cohort import Cohort
+from .metrics import endpoint, timer
+from .views import (
+    DPQueryRun, release_count, release_mean, release_sum, release_median,
+    release_histogram, requested_quantiles, histogram_range
+)
+
+
+# Vues async (ASGI) des requêtes DP : même contrat que les vues DRF, mais les
+# agrégats passent par l'ORM async et le bruit est calculé dans le pool de
+# threads, sans bloquer la boucle d'événements.
+
+def run_in_thread(func, *args):
+    """Exécuter un calcul CPU (NumPy, bruit) dans le pool de threads"""
+    return sync_to_async(func, thread_sensitive=False)(*args)
+
+
+async def aexecute_count(cohort, data):
+    """Count avec DP sur une cohorte (async)"""
+    with timer('aggregate'):
+        true_count = await cohort.acount()
+    return await run_in_thread(release_count, true_count, data)
+
+
+async def aexecute_mean(cohort, data):
+    """Mean avec DP sur une cohorte (async)"""
+    with timer('aggregate'):
+        stats = await cohort.asufficient_stats(data['columns'])
+    return await run_in_thread(release_mean, stats, data)
+
+
+async def aexecute_sum(cohort, data):
+    """Sum avec DP sur une cohorte (async)"""
+    with timer('aggregate'):
+        stats = await cohort.asufficient_stats(data['columns'])
+    return await run_in_thread(release_sum, stats, data)
+
+
+async def aexecute_median(cohort, data):
+    """Median avec DP sur une cohorte (async)"""
+    with timer('aggregate'):
+        true_quantiles, count = await cohort.aquantiles(data['column'], requested_quantiles(data))
+    return await run_in_thread(release_median, true_quantiles, count, data)
+
+
+async def aexecute_histogram(cohort, data):
+    """Histogram avec DP sur une cohorte (async)"""
+    with timer('aggregate'):
+        hist = await cohort.ahistogram(data['column'], *histogram_range(data))
+    return await run_in_thread(release_histogram, hist, data)
+
+
+ASYNC_EXECUTORS = {
+    'count': aexecute_count,
+    'mean': aexecute_mean,
+    'sum': aexecute_sum,
+    'median': aexecute_median,
+    'histogram': aexecute_histogram,
+}
+
+
+def jwt_post_view(view):
+    """POST uniquement, authentification JWT (comme les vues DRF), sans CSRF"""
+    authenticator = JWTAuthentication()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return JsonResponse({'detail': f'Method "{request.method}" not allowed.'},
+                                status=status.HTTP_405_METHOD_NOT_ALLOWED)
+        try:
+            auth = await sync_to_async(authenticator.authenticate)(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        if auth is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                                status=status.HTTP_401_UNAUTHORIZED)
+        request.user = auth[0]
+        return await view(request, *args, **kwargs)
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+async def arun_dp_query(request, query_type):
+    """Valider, autoriser, exécuter et logger une requête DP (async)"""
+    try:
+        params = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+    with endpoint(f'async_{query_type}'):
+        run = DPQueryRun(request, request.user, query_type, params)
+
+        # Budget, rejeu et log : accès base courts, dans le thread dédié à l'ORM sync
+        response = await sync_to_async(run.prepare)()
+        if response is None:
+            try:
+                payload, rows = await ASYNC_EXECUTORS[query_type](Cohort(run.filters, version=run.version), run.data)
+                response = await sync_to_async(run.finish)(payload, rows)
+            except Exception as e:
+                response = await sync_to_async(run.fail)(e)
+
+    body, status_code = response
+    return JsonResponse(body, status=status_code, safe=False)
+
+
+@jwt_post_view
+async def query_count(request):
+    """Count avec DP (async)"""
+    return await arun_dp_query(request, 'count')
+
+
+@jwt_post_view
+async def query_mean(request):
+    """Mean avec DP (async)"""
+    return await arun_dp_query(request, 'mean')
+
+
+@jwt_post_view
+async def query_sum(request):
+    """Sum avec DP (async)"""
+    return await arun_dp_query(request, 'sum')
+
+
+@jwt_post_view
+async def query_median(request):
+    """Median avec DP (async)"""
+    return await arun_dp_query(request, 'median')
+
+
+@jwt_post_view
+async def query_histogram(request):
+    """Histogram avec DP (async)"""
+    return await arun_dp_query(request, 'histogram')
@@ -0,0 +1,172 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Iterable, List
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .models import QueryLog
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_FLUSH = object()
+
+
+class QueryLogWriter:
+    """
+    Écriture asynchrone des QueryLog : les logs sont mis en file en mémoire
+    et écrits par un thread de fond avec bulk_create, dès que batch_size
+    logs sont en attente ou que flush_interval secondes sont écoulées.
+
+    La file est bornée. Quand elle est pleine (backpressure) :
+    - 'block' : l'appelant attend jusqu'à block_timeout secondes, puis écrit
+      lui-même le log de façon synchrone
+    - 'sync'  : l'appelant écrit immédiatement le log de façon synchrone
+    Aucun log n'est jamais abandonné : l'audit trail reste complet.
+    """
+
+    BACKPRESSURE_POLICIES = ('block', 'sync')
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_queue_size: int = 10000, backpressure: str = 'block',
+                 block_timeout: float = 1.0, enabled: bool = True):
+        if backpressure not in self.BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self.enabled = enabled
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'QueryLogWriter':
+        return cls(
+            batch_size=getattr(settings, 'QUERY_LOG_BATCH_SIZE', 100),
+            flush_interval=getattr(settings, 'QUERY_LOG_FLUSH_INTERVAL', 1.0),
+            max_queue_size=getattr(settings, 'QUERY_LOG_QUEUE_SIZE', 10000),
+            backpressure=getattr(settings, 'QUERY_LOG_BACKPRESSURE', 'block'),
+            enabled=getattr(settings, 'QUERY_LOG_ASYNC', True),
+        )
+
+    def submit(self, log: QueryLog):
+        """Mettre un log en file (écriture synchrone si désactivé ou file pleine)"""
+        if not self.enabled:
+            log.save()
+            return
+
+        self._ensure_started()
+        try:
+            if self.backpressure == 'block':
+                self._queue.put(log, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(log)
+        except queue.Full:
+            logger.warning('QueryLog queue full, writing log synchronously')
+            log.save()
+
+    def submit_many(self, logs: Iterable[QueryLog]):
+        for log in logs:
+            self.submit(log)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Demander l'écriture immédiate des logs en file et l'attendre au plus
+        timeout secondes. Renvoie False si des logs restent en attente.
+        """
+        if self._thread is None:
+            return True
+        try:
+            self._queue.put_nowait(_FLUSH)
+        except queue.Full:
+            pass  # File pleine : le thread écrit déjà des lots complets
+
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                logger.warning('QueryLog flush timed out with %d pending logs',
+                               self._queue.unfinished_tasks)
+                return False
+            time.sleep(0.005)
+        return True
+
+    def shutdown(self, timeout: float = 10.0):
+        """Vider la file et arrêter le thread (appelé à l'arrêt du process)"""
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning('QueryLog queue full at shutdown, pending logs may be lost')
+            return
+        thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='querylog-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        pending: List[QueryLog] = []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            flushing = False
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                    self._queue.task_done()
+                elif item is _FLUSH:
+                    flushing = True
+                    self._queue.task_done()
+                else:
+                    pending.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            if pending and (stopping or flushing or len(pending) >= self.batch_size
+                            or time.monotonic() >= deadline):
+                try:
+                    self._write(pending)
+                finally:
+                    # Toujours acquitter : flush() ne doit jamais attendre un lot perdu
+                    for _ in pending:
+                        self._queue.task_done()
+                    pending = []
+                    deadline = None
+
+        connection.close()
+
+    def _write(self, logs: List[QueryLog]):
+        try:
+            close_old_connections()
+            QueryLog.objects.bulk_create(logs)
+        except Exception:
+            logger.exception('QueryLog bulk insert failed, retrying row by row')
+            for log in logs:
+                try:
+                    log.save()
+                except Exception:
+                    logger.exception('QueryLog write failed: %s', log.pk)
+
+
+query_log_writer = QueryLogWriter.from_settings()
+atexit.register(query_log_writer.shutdown)
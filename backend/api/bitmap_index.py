@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Any
+
+
+def to_bitmap(mask: np.ndarray) -> int:
+    """Convertir un masque booléen en bitmap (entier Python, bit i = ligne i)"""
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+def popcount(bitmap: int) -> int:
+    """Nombre de bits à 1"""
+    if hasattr(bitmap, 'bit_count'):
+        return bitmap.bit_count()
+    return bin(bitmap).count('1')
+
+
+class BitmapIndex:
+    """
+    Index bitmap sur les colonnes à faible cardinalité du snapshot patients.
+
+    - gender, blood_type : un bitmap par valeur (construit à la création)
+    - zip_code : bitmaps construits à la demande, cache LRU borné
+    - age : index bit-sliced (un bitmap par bit de l'âge), les plages
+      age_min/age_max se résolvent en ~7 opérations AND/OR/XOR
+
+    Rôle : les filtres que le cube de comptages ne sait pas lire (listes IN,
+    and/or/not) sont évalués sur l'arbre compilé par AND/OR/NOT de bitmaps.
+    """
+
+    EAGER_COLUMNS = ('gender', 'blood_type')
+    LAZY_COLUMNS = ('zip_code',)
+    AGE_BITS = 7  # âges 0-127
+
+    def __init__(self, snapshot, lazy_cache_size: int = 256):
+        self.snapshot = snapshot
+        self.size = snapshot.size
+        self.all_rows = (1 << self.size) - 1
+        self.lazy_cache_size = lazy_cache_size
+        self._lazy = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.equality = {}
+        for column in self.EAGER_COLUMNS:
+            codes = snapshot.columns[column]
+            self.equality[column] = {
+                code: to_bitmap(codes == code)
+                for code in range(len(snapshot.categories[column]))
+            }
+
+        ages = snapshot.columns['age'].astype(np.int64)
+        self.age_slices = [to_bitmap((ages >> bit) & 1 == 1) for bit in range(self.AGE_BITS)]
+        self.ages_in_range = not len(ages) or (ages.min() >= 0 and ages.max() < 1 << self.AGE_BITS)
+
+    def supports(self, node: tuple) -> bool:
+        """Arbre de filtre compilé (filters._parse) évaluable sur les bitmaps"""
+        kind = node[0]
+        if kind in ('and', 'or'):
+            return all(self.supports(child) for child in node[1])
+        if kind == 'not':
+            return self.supports(node[1])
+        if kind == 'range':
+            return node[1] == 'age' and self.ages_in_range
+        return node[1] in self.EAGER_COLUMNS + self.LAZY_COLUMNS
+
+    def _equality_bitmap(self, column: str, value: Any) -> int:
+        code = self.snapshot.category_code(column, value)
+        if code < 0:
+            return 0
+        if column in self.equality:
+            return self.equality[column][code]
+
+        key = (column, code)
+        with self._lock:
+            if key in self._lazy:
+                self._lazy.move_to_end(key)
+                return self._lazy[key]
+
+        bitmap = to_bitmap(self.snapshot.columns[column] == code)
+        with self._lock:
+            self._lazy[key] = bitmap
+            if len(self._lazy) > self.lazy_cache_size:
+                self._lazy.popitem(last=False)
+        return bitmap
+
+    def _age_at_most(self, bound: int) -> int:
+        """Bitmap des lignes avec age <= bound (comparaison bit-sliced)"""
+        if bound < 0:
+            return 0
+        if bound >= (1 << self.AGE_BITS) - 1:
+            return self.all_rows
+
+        less = 0
+        equal = self.all_rows
+        for bit in reversed(range(self.AGE_BITS)):
+            bit_slice = self.age_slices[bit]
+            if (bound >> bit) & 1:
+                less |= equal & (self.all_rows ^ bit_slice)
+                equal &= bit_slice
+            else:
+                equal &= self.all_rows ^ bit_slice
+        return less | equal
+
+    def bitmap(self, node: tuple) -> int:
+        """Bitmap des lignes satisfaisant l'arbre de filtre (voir supports)"""
+        kind = node[0]
+        if kind == 'and':
+            result = self.all_rows
+            for child in node[1]:
+                if not result:
+                    break
+                result &= self.bitmap(child)
+            return result
+        if kind == 'or':
+            result = 0
+            for child in node[1]:
+                result |= self.bitmap(child)
+            return result
+        if kind == 'not':
+            return self.all_rows ^ self.bitmap(node[1])
+        if kind == 'range':
+            _, _, bound, value = node
+            if bound == 'min':
+                return self.all_rows ^ self._age_at_most(int(np.ceil(value)) - 1)
+            return self._age_at_most(int(np.floor(value)))
+
+        _, column, values = node
+        result = 0
+        for value in values:
+            result |= self._equality_bitmap(column, value)
+        return result
+
+    def count(self, node: tuple) -> int:
+        """Count filtré par popcount, sans parcourir la table"""
+        return popcount(self.bitmap(node))
+
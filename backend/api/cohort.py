@@ -0,0 +1,232 @@
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from asgiref.sync import sync_to_async
+
+from .models import Patient, DataVersion
+from .services import (
+    CATEGORICAL_DOMAINS, DIMENSION_DOMAINS, aggregate_sufficient_stats, aggregate_histogram,
+    aggregate_quantiles, aggregate_groups, aggregate_crosstab, aggregate_time_series,
+    aggregate_candidate_counts,
+    time_buckets, truncate_dates,
+    aaggregate_sufficient_stats, aaggregate_histogram, aaggregate_quantiles
+)
+from .snapshot import PatientSnapshot, get_snapshot
+from .count_cube import count_cube
+from .prefix_index import get_prefix_index
+from .filters import compile_filters
+
+
+def apply_filters(queryset, filters):
+    """Appliquer les filtres au queryset (un seul prédicat Q compilé)"""
+    return queryset.filter(compile_filters(filters).q)
+
+
+class Cohort:
+    """Patients correspondant aux filtres, évalués sur le snapshot colonnaire ou via l'ORM"""
+
+    def __init__(self, filters: Dict[str, Any], snapshot: Optional[PatientSnapshot] = None,
+                 version: Optional[int] = None):
+        self.filters = filters
+        self.plan = compile_filters(filters)
+        # Version des données (DataVersion) à laquelle snapshot et index doivent être
+        self.version = version if version is not None else DataVersion.current()
+        self.snapshot = snapshot if snapshot is not None else get_snapshot(self.version)
+        self._mask = None
+
+    @property
+    def in_memory(self) -> bool:
+        return self.snapshot is not None
+
+    @property
+    def queryset(self):
+        return Patient.objects.filter(self.plan.q)
+
+    @property
+    def mask(self) -> np.ndarray:
+        """Masque des patients sélectionnés (calculé une seule fois)"""
+        if self._mask is None:
+            self._mask = self.plan.mask(self.snapshot)
+        return self._mask
+
+    def _cube(self):
+        """Cube de comptages si les filtres sont dans sa forme (conjonction plate supportée)"""
+        simple = self.plan.simple
+        if simple is None:
+            return None
+        cube = count_cube.get(self.version)
+        return cube if cube is not None and cube.supports(simple) else None
+
+    def _prefix_index(self, columns: List[str]):
+        simple = self.plan.simple
+        return None if simple is None else get_prefix_index(simple, columns, self.version)
+
+    def count(self) -> int:
+        # Cube de comptages : somme de cellules, indépendante de la taille de la table
+        cube = self._cube()
+        if cube is not None:
+            return cube.count(self.plan.simple)
+        # Plage sur une colonne entière hors du cube (ex. blood_pressure_systolic) : sommes cumulées
+        index = self._prefix_index([])
+        if index is not None:
+            return index.count(self.plan.simple)
+
+        if self.in_memory:
+            # Listes IN et and/or/not (hors du cube) : popcount sur les bitmaps du snapshot
+            index = self.snapshot.bitmap_index
+            if self._mask is None and index is not None and index.supports(self.plan.node):
+                return index.count(self.plan.node)
+            return int(np.count_nonzero(self.mask))
+        return self.queryset.count()
+
+    def sufficient_stats(self, columns: List[str]) -> Dict[str, Any]:
+        """Count, sum et sum_sq par colonne (même format que aggregate_sufficient_stats)"""
+        # Plage sur une colonne entière (ex. age) : deux lectures dans les sommes cumulées
+        index = self._prefix_index(columns)
+        if index is not None:
+            return index.sufficient_stats(self.plan.simple, columns)
+
+        if not self.in_memory:
+            return aggregate_sufficient_stats(self.queryset, columns)
+
+        count = self.count()
+        stats = {}
+        for column in columns:
+            values = self.snapshot.values(column, self.mask)
+            stats[column] = {
+                'sum': float(values.sum()) if count else None,
+                'sum_sq': float(np.dot(values, values)) if count else None,
+            }
+        return {'count': count, 'columns': stats}
+
+    def histogram(self, column: str, lower: float, upper: float, num_bins: int) -> List[int]:
+        """Compteurs par bin sur [lower, upper] sans matérialiser la colonne côté ORM"""
+        if not self.in_memory:
+            return aggregate_histogram(self.queryset, column, lower, upper, num_bins)
+        values = self.snapshot.values(column, self.mask)
+        values = values[(values >= lower) & (values <= upper)]
+
+        # Même calcul d'index que le GROUP BY SQL (résultats identiques aux bords)
+        bins = np.floor((values - lower) * (num_bins / (upper - lower))).astype(np.int64)
+        bins[values >= upper] = num_bins - 1
+        return np.bincount(np.clip(bins, 0, num_bins - 1), minlength=num_bins).tolist()
+
+    def grouped(self, group_by: str, column: Optional[str] = None,
+                bounds: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Comptages (et sommes clippées de column) par catégorie déclarée de group_by"""
+        if not self.in_memory:
+            return aggregate_groups(self.queryset, group_by, column, bounds)
+        
+        domain = CATEGORICAL_DOMAINS[group_by]
+        groups = self._dimension_positions(group_by)
+        inside = groups >= 0
+        
+        counts = np.bincount(groups[inside], minlength=len(domain))
+        sums = None
+        if column is not None:
+            values = np.clip(self.snapshot.values(column, self.mask)[inside], *bounds)
+            sums = np.bincount(groups[inside], weights=values, minlength=len(domain))
+        return counts, sums
+
+    def _dimension_positions(self, dimension: str) -> np.ndarray:
+        """Position de chaque ligne de la cohorte dans le domaine de la dimension (-1 si hors domaine)"""
+        if dimension == 'age_decade':
+            decades = self.snapshot.columns['age'][self.mask].astype(np.int64) // 10
+            return np.where((decades >= 0) & (decades < len(DIMENSION_DOMAINS[dimension])), decades, -1)
+        
+        positions = {value: i for i, value in enumerate(DIMENSION_DOMAINS[dimension])}
+        # Code de catégorie du snapshot -> position dans le domaine
+        lookup = np.array([positions.get(value, -1) for value in self.snapshot.categories[dimension]],
+                          dtype=np.int64)
+        return lookup[self.snapshot.columns[dimension][self.mask]]
+
+    def crosstab(self, dimensions: List[str]) -> np.ndarray:
+        """Table de contingence (comptages) de la cohorte sur 2 ou 3 dimensions"""
+        if not self.in_memory:
+            return aggregate_crosstab(self.queryset, dimensions)
+        
+        shape = tuple(len(DIMENSION_DOMAINS[dimension]) for dimension in dimensions)
+        positions = [self._dimension_positions(dimension) for dimension in dimensions]
+        inside = np.logical_and.reduce([p >= 0 for p in positions])
+        cells = np.ravel_multi_index([p[inside] for p in positions], shape)
+        return np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+
+    def candidate_counts(self, columns: List[str], domains: List[List[str]]) -> np.ndarray:
+        """Comptages de la cohorte pour chaque combinaison des domaines (0 si absente)"""
+        if not self.in_memory:
+            return aggregate_candidate_counts(self.queryset, columns, domains)
+        
+        shape = tuple(len(domain) for domain in domains)
+        positions = []
+        for column, domain in zip(columns, domains):
+            lookup = {value: i for i, value in enumerate(domain)}
+            codes = np.array([lookup.get(value, -1) for value in self.snapshot.categories[column]],
+                             dtype=np.int64)
+            positions.append(codes[self.snapshot.columns[column][self.mask]])
+        inside = np.logical_and.reduce([p >= 0 for p in positions])
+        cells = np.ravel_multi_index([p[inside] for p in positions], shape)
+        return np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+    
+    def time_series(self, bucket: str, start, end, column: Optional[str] = None,
+                    bounds: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Comptages (et sommes clippées de column) par bucket de admission_date sur [start, end]"""
+        if not self.in_memory:
+            return aggregate_time_series(self.queryset, bucket, start, end, column, bounds)
+        
+        buckets = time_buckets(bucket, start, end)
+        dates = self.snapshot.columns['admission_date'][self.mask]
+        inside = (dates >= np.datetime64(start, 'D')) & (dates <= np.datetime64(end, 'D'))
+        positions = np.searchsorted(buckets, truncate_dates(dates[inside], bucket))
+        
+        counts = np.bincount(positions, minlength=len(buckets))
+        sums = None
+        if column is not None:
+            values = np.clip(self.snapshot.values(column, self.mask)[inside], *bounds)
+            sums = np.bincount(positions, weights=values, minlength=len(buckets))
+        return counts, sums
+
+    def quantiles(self, column: str, quantiles: List[float]) -> Tuple[Dict[float, float], int]:
+        """Quantiles vrais de la colonne et taille de la cohorte, sans matérialiser les valeurs"""
+        if not self.in_memory:
+            return aggregate_quantiles(self.queryset, column, quantiles)
+        mask = self.mask if self.filters else None
+        return self.snapshot.quantiles(column, quantiles, mask)
+
+    def values(self, column: str) -> np.ndarray:
+        """Valeurs d'une colonne numérique pour la cohorte"""
+        if self.in_memory:
+            return self.snapshot.values(column, self.mask)
+        values = self.queryset.values_list(column, flat=True)
+        return np.array([float(v) for v in values if v is not None], dtype=np.float64)
+
+    # Versions async : ORM async, calculs NumPy sur le snapshot dans le pool de threads
+
+    async def acount(self) -> int:
+        cube = self._cube()
+        if cube is not None:
+            return cube.count(self.plan.simple)
+        index = self._prefix_index([])
+        if index is not None:
+            return index.count(self.plan.simple)
+        if self.in_memory:
+            return await sync_to_async(self.count, thread_sensitive=False)()
+        return await self.queryset.acount()
+
+    async def asufficient_stats(self, columns: List[str]) -> Dict[str, Any]:
+        index = self._prefix_index(columns)
+        if index is not None:
+            return index.sufficient_stats(self.plan.simple, columns)
+        if self.in_memory:
+            return await sync_to_async(self.sufficient_stats, thread_sensitive=False)(columns)
+        return await aaggregate_sufficient_stats(self.queryset, columns)
+
+    async def ahistogram(self, column: str, lower: float, upper: float, num_bins: int) -> List[int]:
+        if self.in_memory:
+            return await sync_to_async(self.histogram, thread_sensitive=False)(
+                column, lower, upper, num_bins
+            )
+        return await aaggregate_histogram(self.queryset, column, lower, upper, num_bins)
+
+    async def aquantiles(self, column: str, quantiles: List[float]) -> Tuple[Dict[float, float], int]:
+        if self.in_memory:
+            return await sync_to_async(self.quantiles, thread_sensitive=False)(column, quantiles)
+        return await aaggregate_quantiles(self.queryset, column, quantiles)
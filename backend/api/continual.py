@@ -0,0 +1,203 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Patient, ContinualCounter, ContinualCounterNode
+from .services import DifferentialPrivacyService
+
+
+logger = logging.getLogger(__name__)
+
+ADMISSIONS_COUNTER = 'admissions'
+
+_local = threading.local()
+
+
+def dyadic_nodes(step: int) -> List[Tuple[int, int]]:
+    """Noeuds (level, index) dont l'union couvre exactement les pas 1..step"""
+    nodes = []
+    covered = 0
+    for level in reversed(range(step.bit_length())):
+        if step & (1 << level):
+            nodes.append((level, covered >> level))
+            covered += 1 << level
+    return nodes
+
+
+def get_counter(name: str = ADMISSIONS_COUNTER) -> Optional[ContinualCounter]:
+    """Époque courante du compteur (la plus récente)"""
+    return ContinualCounter.objects.filter(name=name).order_by('-epoch').first()
+
+
+def _new_epoch(name: str, previous: Optional[ContinualCounter]) -> ContinualCounter:
+    return ContinualCounter.objects.create(
+        name=name,
+        epoch=0 if previous is None else previous.epoch + 1,
+        epsilon=getattr(settings, 'CONTINUAL_COUNTER_EPSILON', 1.0),
+        horizon=getattr(settings, 'CONTINUAL_COUNTER_HORIZON', 4096),
+    )
+
+
+def record_batch(count: int, name: str = ADMISSIONS_COUNTER, window: int = 0) -> Optional[ContinualCounter]:
+    """
+    Enregistrer un lot d'ingestion comme un pas du compteur : la somme
+    partielle de chaque niveau est mise à jour (O(log T) noeuds) et les
+    intervalles clos par ce pas sont publiés avec un bruit Lap(levels / epsilon).
+
+    window > 0 : moins de window secondes après le dernier pas, le lot est
+    seulement ajouté à pending (publié avec le pas suivant).
+    """
+    if not getattr(settings, 'CONTINUAL_COUNTER_ENABLED', True):
+        return None
+
+    with transaction.atomic():
+        counter = (
+            ContinualCounter.objects.select_for_update()
+            .filter(name=name).order_by('-epoch').first()
+        )
+        now = timezone.now()
+        if (window and counter is not None and counter.last_step_at is not None
+                and (now - counter.last_step_at).total_seconds() < window):
+            counter.pending += count
+            counter.save(update_fields=['pending', 'updated_at'])
+            return counter
+
+        count += 0 if counter is None else counter.pending
+        if counter is None or counter.is_exhausted:
+            if counter is not None:
+                logger.info('Continual counter %s reached its horizon (%d steps): epoch %d',
+                            name, counter.horizon, counter.epoch + 1)
+            # Premier pas d'une époque : tout l'historique existant (lot courant inclus)
+            counter = _new_epoch(name, counter)
+            count = Patient.objects.count()
+
+        step = counter.steps + 1
+        open_levels = [level for level in range(counter.levels) if (step - 1) % (1 << level)]
+        existing = {}
+        if open_levels:
+            keys = Q()
+            for level in open_levels:
+                keys |= Q(level=level, index=(step - 1) >> level)
+            existing = {
+                node.level: node
+                for node in ContinualCounterNode.objects.filter(keys, counter=counter)
+            }
+
+        new_nodes, updated_nodes, closed = [], [], []
+        for level in range(counter.levels):
+            node = existing.get(level)
+            if node is None:
+                node = ContinualCounterNode(counter=counter, level=level, index=(step - 1) >> level)
+                new_nodes.append(node)
+            else:
+                updated_nodes.append(node)
+            node.true_sum += count
+            if step % (1 << level) == 0:
+                closed.append(node)
+
+        # Un pas appartient à un noeud par niveau : sensibilité = levels
+        if closed:
+            dp_service = DifferentialPrivacyService(epsilon=counter.epsilon)
+            noisy = dp_service.add_laplace_noise([node.true_sum for node in closed], counter.levels)
+            for node, value in zip(closed, noisy):
+                node.noisy_sum = float(value)
+
+        ContinualCounterNode.objects.bulk_create(new_nodes)
+        ContinualCounterNode.objects.bulk_update(updated_nodes, ['true_sum', 'noisy_sum'])
+        counter.steps = step
+        counter.pending = 0
+        counter.last_step_at = now
+        counter.save(update_fields=['steps', 'pending', 'last_step_at', 'updated_at'])
+    return counter
+
+
+def flush_pending(name: str = ADMISSIONS_COUNTER) -> Optional[ContinualCounter]:
+    """
+    Publier les insertions en attente une fois la fenêtre écoulée : sans
+    insertion ultérieure, pending ne serait jamais clos par record_batch.
+    Appelé à la lecture du compteur.
+    """
+    counter = get_counter(name)
+    window = getattr(settings, 'CONTINUAL_COUNTER_WINDOW', 86400)
+    if (counter is None or not counter.pending or counter.last_step_at is None
+            or (timezone.now() - counter.last_step_at).total_seconds() < window):
+        return counter
+    # Sous verrou, record_batch relit pending : un lecteur concurrent arrivé
+    # après ce pas retombe dans la fenêtre et n'ajoute rien
+    _record_safely(0, name, window)
+    return get_counter(name)
+
+
+def released_nodes(counter: ContinualCounter, steps: Optional[List[int]] = None) -> Dict[Tuple[int, int], ContinualCounterNode]:
+    """Noeuds publiés nécessaires aux pas demandés (tous les noeuds publiés si steps est None)"""
+    nodes = ContinualCounterNode.objects.filter(counter=counter, noisy_sum__isnull=False)
+    if steps is not None:
+        keys = Q()
+        for level, index in {key for step in steps for key in dyadic_nodes(step)}:
+            keys |= Q(level=level, index=index)
+        nodes = nodes.filter(keys)
+    return {(node.level, node.index): node for node in nodes}
+
+
+def running_total(nodes: Dict[Tuple[int, int], ContinualCounterNode], step: int,
+                  field: str = 'noisy_sum') -> float:
+    """Total courant au pas step, somme des noeuds de sa décomposition dyadique"""
+    return sum(getattr(nodes[key], field) for key in dyadic_nodes(step))
+
+
+class IngestionBatch:
+    """Lot d'ingestion en cours : les patients créés comptent pour un seul pas"""
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, count: int = 1):
+        self.count += count
+
+
+def current_batch() -> Optional[IngestionBatch]:
+    return getattr(_local, 'batch', None)
+
+
+@contextmanager
+def ingestion_batch(name: str = ADMISSIONS_COUNTER):
+    """
+    Regrouper les insertions du bloc en un seul pas du compteur continu.
+    Les créations via save() sont comptées par le signal post_save ;
+    les bulk_create (sans signal) doivent appeler batch.add(n) et DataVersion.bump().
+    """
+    outer = current_batch()
+    if outer is not None:
+        yield outer
+        return
+
+    batch = IngestionBatch()
+    _local.batch = batch
+    try:
+        yield batch
+    finally:
+        _local.batch = None
+    if batch.count:
+        _record_safely(batch.count, name)
+
+
+def patient_ingested():
+    """Patient créé : compté dans le lot courant, sinon regroupé par fenêtre"""
+    batch = current_batch()
+    if batch is not None:
+        batch.add()
+    else:
+        _record_safely(1, ADMISSIONS_COUNTER, getattr(settings, 'CONTINUAL_COUNTER_WINDOW', 86400))
+
+
+def _record_safely(count: int, name: str, window: int = 0):
+    # L'ingestion ne doit pas échouer à cause du compteur
+    try:
+        record_batch(count, name, window)
+    except Exception:
+        logger.exception('Continual counter %s update failed (%d patients)', name, count)
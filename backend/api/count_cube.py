@@ -0,0 +1,115 @@
+import threading
+import numpy as np
+from typing import Dict, Any
+from django.db.models import Count
+
+from .incremental import MaintainedIndex
+from .models import Patient
+
+
+class CountCube:
+    """
+    Cube de comptages précalculé sur (age, gender, blood_type), avec zip_code
+    en dimension creuse (par zip : index de cellule -> comptage).
+
+    Un count filtré (age_min/age_max, gender, blood_type, zip_code) est une
+    somme sur au plus 121 x 3 x 8 cellules, quelle que soit la taille de la table.
+    """
+
+    MAX_AGE = 120
+    GENDERS = [code for code, _ in Patient.GENDER_CHOICES]
+    BLOOD_TYPES = [code for code, _ in Patient.BLOOD_TYPES]
+    SUPPORTED_FILTERS = {'age_min', 'age_max', 'gender', 'blood_type', 'zip_code'}
+
+    def __init__(self):
+        self.shape = (self.MAX_AGE + 1, len(self.GENDERS), len(self.BLOOD_TYPES))
+        self.cells = np.zeros(self.shape, dtype=np.int64)
+        self.zip_cells: Dict[str, Dict[int, int]] = {}
+        # Lignes hors du domaine du cube : le cube refuse alors de répondre
+        self.out_of_domain = 0
+        self._gender_index = {g: i for i, g in enumerate(self.GENDERS)}
+        self._blood_index = {b: i for i, b in enumerate(self.BLOOD_TYPES)}
+        # Protège les dictionnaires par zip (modifiés par add() pendant les lectures)
+        self._zip_lock = threading.Lock()
+
+    @classmethod
+    def build(cls) -> 'CountCube':
+        """Construire le cube en un seul GROUP BY"""
+        cube = cls()
+        rows = (
+            Patient.objects.order_by()
+            .values_list('age', 'gender', 'blood_type', 'zip_code')
+            .annotate(n=Count('pk'))
+        )
+        for age, gender, blood_type, zip_code, n in rows.iterator():
+            cube._add_cell(age, gender, blood_type, zip_code, n)
+        return cube
+
+    def _add_cell(self, age, gender, blood_type, zip_code, n):
+        g = self._gender_index.get(gender)
+        b = self._blood_index.get(blood_type)
+        if age is None or not 0 <= age <= self.MAX_AGE or g is None or b is None:
+            self.out_of_domain += n
+            return
+
+        self.cells[age, g, b] += n
+        flat = int(np.ravel_multi_index((age, g, b), self.shape))
+        with self._zip_lock:
+            zip_counts = self.zip_cells.setdefault(zip_code, {})
+            zip_counts[flat] = zip_counts.get(flat, 0) + n
+            if zip_counts[flat] == 0:
+                del zip_counts[flat]
+
+    def add(self, patient, sign: int):
+        """Mise à jour incrémentale (insertion +1 / suppression -1)"""
+        self._add_cell(patient.age, patient.gender, patient.blood_type, patient.zip_code, sign)
+
+    def supports(self, filters: Dict[str, Any]) -> bool:
+        return self.out_of_domain == 0 and set(filters) <= self.SUPPORTED_FILTERS
+
+    def _selection(self, filters: Dict[str, Any]):
+        """Tranches (age, gender, blood_type) correspondant aux filtres, ou None si vide"""
+        lower = int(np.ceil(float(filters.get('age_min', 0))))
+        upper = int(np.floor(float(filters.get('age_max', self.MAX_AGE))))
+        lower, upper = max(lower, 0), min(upper, self.MAX_AGE)
+        if lower > upper:
+            return None
+        selection = [slice(lower, upper + 1), slice(None), slice(None)]
+
+        for axis, column, index in ((1, 'gender', self._gender_index),
+                                    (2, 'blood_type', self._blood_index)):
+            if column in filters:
+                position = index.get(str(filters[column]))
+                if position is None:
+                    return None
+                selection[axis] = slice(position, position + 1)
+        return tuple(selection)
+
+    def count(self, filters: Dict[str, Any]) -> int:
+        selection = self._selection(filters)
+        if selection is None:
+            return 0
+        if 'zip_code' not in filters:
+            return int(self.cells[selection].sum())
+
+        with self._zip_lock:
+            items = list(self.zip_cells.get(str(filters['zip_code']), {}).items())
+        if not items:
+            return 0
+        flat, counts = np.array(items, dtype=np.int64).T
+        ages, genders, bloods = np.unravel_index(flat, self.shape)
+        age_slice, gender_slice, blood_slice = selection
+        inside = (
+            (ages >= age_slice.start) & (ages < age_slice.stop)
+            & self._in_slice(genders, gender_slice) & self._in_slice(bloods, blood_slice)
+        )
+        return int(counts[inside].sum())
+
+    @staticmethod
+    def _in_slice(values: np.ndarray, selection: slice) -> np.ndarray:
+        if selection.start is None:
+            return np.ones(len(values), dtype=bool)
+        return values == selection.start
+
+
+count_cube = MaintainedIndex('count-cube', CountCube.build)
@@ -0,0 +1,163 @@
+import json
+import operator
+import datetime
+from functools import lru_cache, reduce
+import numpy as np
+from typing import Dict, Any, Optional
+from django.db.models import Q
+
+from .snapshot import NUMERIC_COLUMNS, CATEGORICAL_COLUMNS, DATE_COLUMNS
+
+
+# Langage de filtres (JSON) :
+#   {"<colonne numérique>_min": 30, "<colonne numérique>_max": 60}  plage inclusive
+#   {"admission_date_min": "2023-01-01", "admission_date_max": "2023-12-31"}
+#   {"gender": "F"} égalité, {"blood_type": ["A+", "O-"]} liste IN
+#   (gender, blood_type, zip_code, diagnosis)
+#   {"and": [...]}, {"or": [...]}, {"not": {...}}
+# Les clés d'un même objet sont combinées par AND : les filtres historiques
+# (age_min, age_max, gender, blood_type, zip_code) restent valides tels quels.
+
+LOGICAL_KEYS = ('and', 'or', 'not')
+
+
+class FilterError(ValueError):
+    """Filtre invalide (clé inconnue ou valeur mal typée)"""
+
+
+class CompiledFilter:
+    """
+    Filtre validé et compilé une seule fois : un objet Q pour l'ORM et un
+    plan évalué en masque NumPy vectorisé sur le snapshot.
+
+    simple contient les filtres sous forme conjonctive plate (plages et
+    égalités scalaires) quand c'est possible : c'est la forme attendue par
+    le cube de comptages et les index de sommes cumulées ; node est évalué
+    par l'index bitmap du snapshot pour les autres formes.
+    """
+
+    def __init__(self, node: tuple, simple: Optional[Dict[str, Any]]):
+        self.node = node
+        self.simple = simple
+        self.q = _to_q(node)
+
+    def mask(self, snapshot) -> np.ndarray:
+        """Masque booléen des lignes du snapshot satisfaisant le filtre"""
+        return _to_mask(self.node, snapshot)
+
+
+def _parse_scalar(key: str, value: Any):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise FilterError(f"Invalid value for '{key}': {value!r}")
+    return value
+
+
+def _parse_number(where: str, value: Any) -> float:
+    # Chaînes numériques ("30") acceptées comme avant la compilation des filtres
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise FilterError(f"'{where}' must be a number")
+    try:
+        number = float(value)
+    except ValueError:
+        raise FilterError(f"'{where}' must be a number")
+    if not np.isfinite(number):
+        raise FilterError(f"'{where}' must be a finite number")
+    return number
+
+
+def _parse(filters: Any, path: str = 'filters') -> tuple:
+    if not isinstance(filters, dict):
+        raise FilterError(f"'{path}' must be an object")
+
+    nodes = []
+    for key, value in filters.items():
+        where = f'{path}.{key}'
+        if key in ('and', 'or'):
+            if not isinstance(value, list):
+                raise FilterError(f"'{where}' must be a list")
+            nodes.append((key, tuple(_parse(item, f'{where}[{i}]') for i, item in enumerate(value))))
+        elif key == 'not':
+            nodes.append(('not', _parse(value, where)))
+        elif key.endswith(('_min', '_max')) and key[:-4] in NUMERIC_COLUMNS:
+            nodes.append(('range', key[:-4], key[-3:], _parse_number(where, value)))
+        elif key.endswith(('_min', '_max')) and key[:-4] in DATE_COLUMNS:
+            try:
+                date = datetime.date.fromisoformat(str(value))
+            except ValueError:
+                raise FilterError(f"'{where}' must be an ISO date (YYYY-MM-DD)")
+            nodes.append(('range', key[:-4], key[-3:], date))
+        elif key in CATEGORICAL_COLUMNS:
+            values = value if isinstance(value, list) else [value]
+            nodes.append(('in', key, tuple(str(_parse_scalar(where, v)) for v in values)))
+        else:
+            raise FilterError(f"Unknown filter '{where}'")
+
+    return ('and', tuple(nodes))
+
+
+def _to_q(node: tuple) -> Q:
+    kind = node[0]
+    if kind == 'and':
+        return reduce(operator.and_, (_to_q(child) for child in node[1]), Q())
+    if kind == 'or':
+        return reduce(operator.or_, (_to_q(child) for child in node[1]), Q(pk__in=[]))
+    if kind == 'not':
+        # ~Q() vide ne filtre rien pour l'ORM : la négation de "tout" est "rien"
+        q = _to_q(node[1])
+        return ~q if q else Q(pk__in=[])
+    if kind == 'range':
+        _, column, bound, value = node
+        lookup = 'gte' if bound == 'min' else 'lte'
+        return Q(**{f'{column}__{lookup}': value})
+    _, column, values = node
+    if len(values) == 1:
+        return Q(**{column: values[0]})
+    return Q(**{f'{column}__in': values})
+
+
+def _to_mask(node: tuple, snapshot) -> np.ndarray:
+    kind = node[0]
+    if kind == 'and':
+        mask = np.ones(snapshot.size, dtype=bool)
+        for child in node[1]:
+            mask &= _to_mask(child, snapshot)
+        return mask
+    if kind == 'or':
+        mask = np.zeros(snapshot.size, dtype=bool)
+        for child in node[1]:
+            mask |= _to_mask(child, snapshot)
+        return mask
+    if kind == 'not':
+        return ~_to_mask(node[1], snapshot)
+    if kind == 'range':
+        _, column, bound, value = node
+        if column in DATE_COLUMNS:
+            value = np.datetime64(value, 'D')
+        values = snapshot.columns[column]
+        return values >= value if bound == 'min' else values <= value
+    _, column, values = node
+    codes = [snapshot.category_code(column, value) for value in values]
+    return np.isin(snapshot.columns[column], [code for code in codes if code >= 0])
+
+
+def _simple_form(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Filtres conjonctifs plats (sans and/or/not ni liste IN), sinon None"""
+    for key, value in filters.items():
+        if key in LOGICAL_KEYS or isinstance(value, list):
+            return None
+    return dict(filters)
+
+
+@lru_cache(maxsize=1024)
+def _compile_normalized(normalized: str) -> CompiledFilter:
+    filters = json.loads(normalized)
+    return CompiledFilter(_parse(filters), _simple_form(filters))
+
+
+def compile_filters(filters: Dict[str, Any]) -> CompiledFilter:
+    """Valider et compiler les filtres (plan mis en cache par filtre normalisé)"""
+    try:
+        normalized = json.dumps(filters or {}, sort_keys=True)
+    except (TypeError, ValueError):
+        raise FilterError('Filters must be JSON serializable')
+    return _compile_normalized(normalized)
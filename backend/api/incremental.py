@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class MaintainedIndex:
+    """
+    Index en mémoire dérivé de la table patients : construit depuis la base
+    dans un thread de fond à une version des données (DataVersion), puis mis
+    à jour incrémentalement à chaque insertion ou suppression de patient de
+    ce process (l'index doit implémenter add(patient, sign)).
+
+    get(version) ne renvoie l'index que s'il est à la version demandée, sinon
+    None (l'appelant se rabat alors sur le snapshot ou l'ORM) : les écritures
+    des autres process et les chargements en bulk le rendent obsolète.
+
+    Une construction pendant laquelle la version a changé est jetée (son
+    contenu est incertain) : l'index maintenu reste servi un TTL de plus, et
+    la reconstruction suivante attend REBUILD_BACKOFF secondes. Un index plus
+    vieux que DP_INDEX_TTL reste servi pendant sa reconstruction.
+    """
+
+    REBUILD_BACKOFF = 5.0
+
+    def __init__(self, name: str, build: Callable[[], Any]):
+        self.name = name
+        self._build = build
+        self._index = None
+        self._index_version = None
+        self._built_at = None
+        self._building = False
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _is_expired(self) -> bool:
+        ttl = getattr(settings, 'DP_INDEX_TTL', 300)
+        return ttl > 0 and time.monotonic() - self._built_at > ttl
+
+    def get(self, version: int) -> Optional[Any]:
+        if not getattr(settings, 'DP_INDEXES_ENABLED', True):
+            return None
+
+        with self._lock:
+            index = self._index if self._index_version == version else None
+            stale = index is None or self._is_expired()
+            if stale and not self._building and time.monotonic() >= self._retry_at:
+                self._building = True
+                threading.Thread(
+                    target=self._rebuild, name=f'{self.name}-build', daemon=True
+                ).start()
+        return index
+
+    def _rebuild(self):
+        from .models import DataVersion
+        try:
+            version = DataVersion.current()
+            index = self._build()
+            unchanged = DataVersion.current() == version
+            with self._lock:
+                if unchanged:
+                    self._index = index
+                    self._index_version = version
+                else:
+                    self._retry_at = time.monotonic() + self.REBUILD_BACKOFF
+                self._built_at = time.monotonic()
+        except Exception:
+            logger.exception('%s build failed', self.name)
+        finally:
+            with self._lock:
+                self._building = False
+            connection.close()
+
+    def apply(self, patient, sign: int, version: int):
+        """Appliquer l'insertion (+1) ou la suppression (-1) validée qui a porté les données à version"""
+        with self._lock:
+            # Index d'une autre version : il n'est plus servi et sera reconstruit
+            if self._index is not None and self._index_version == version - 1:
+                self._index.add(patient, sign)
+                self._index_version = version
+
+    def invalidate(self):
+        """Jeter l'index (modification non incrémentale, ex. mise à jour d'un patient)"""
+        with self._lock:
+            self._index = None
@@ -0,0 +1,64 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from api.models import EpsilonBudget, QueryLog
+from api.services import PolicyEnforcer
+from api.synthetic import build_synthetic_dataset, save_synthetic_dataset
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Build a differentially private synthetic patients table (one epsilon charge)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--epsilon', type=float, required=True,
+                            help='Total epsilon spent on the release')
+        parser.add_argument('--user', default='admin',
+                            help='Administrator whose epsilon budget is charged')
+        parser.add_argument('--rows', type=int, default=None,
+                            help='Synthetic rows (default: noisy patient count)')
+        parser.add_argument('--bins', type=int, default=20,
+                            help='Bins per numeric marginal')
+        parser.add_argument('--months', type=int, default=24,
+                            help='Admission months covered, ending this month')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Sampling seed (the DP noise is never seeded)')
+
+    def handle(self, *args, **options):
+        epsilon = options['epsilon']
+        if epsilon <= 0:
+            raise CommandError('epsilon must be positive')
+
+        try:
+            user = User.objects.get(username=options['user'], role='admin')
+        except User.DoesNotExist:
+            raise CommandError(f"No administrator named {options['user']}")
+
+        # Même politique que les requêtes DP : budget vérifié puis débité une fois
+        enforcer = PolicyEnforcer(user, EpsilonBudget.for_user(user))
+        can_execute, message = enforcer.can_execute_query(epsilon)
+        if not can_execute:
+            raise CommandError(message)
+
+        start_time = time.time()
+        arrays, metadata = build_synthetic_dataset(
+            epsilon, rows=options['rows'], num_bins=options['bins'],
+            months=options['months'], seed=options['seed']
+        )
+        if not enforcer.consume_budget(epsilon):
+            raise CommandError('Insufficient epsilon budget (consumed concurrently)')
+        name = save_synthetic_dataset(arrays, metadata)
+
+        QueryLog.objects.create(
+            user=user,
+            query_type='synthetic',
+            epsilon_used=epsilon,
+            query_params={key: options[key] for key in ('rows', 'bins', 'months')},
+            result_data={'name': name, 'rows': metadata['rows']},
+            status='success',
+            execution_time=time.time() - start_time,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Synthetic dataset {name}: {metadata['rows']} rows, epsilon {epsilon}"
+        ))
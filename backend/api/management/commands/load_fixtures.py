@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from api.models import Patient, EpsilonBudget
+from django.db import transaction
+from api.models import Patient, EpsilonBudget, DataVersion
+from api.continual import ingestion_batch
 from faker import Faker
 import random
 from datetime import datetime, timedelta
@@ -75,6 +77,10 @@ class Command(BaseCommand):
             )
             patients.append(patient)
         
-        # Bulk create
-        Patient.objects.bulk_create(patients)
+        # Bulk create (sans signal : lot compté et version incrémentée explicitement)
+        with ingestion_batch() as batch:
+            with transaction.atomic():
+                Patient.objects.bulk_create(patients)
+                DataVersion.bump()
+            batch.add(len(patients))
         self.stdout.write(f"Created {count} patients")
\ No newline at end of file
@@ -0,0 +1,129 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Tuple
+
+
+# Bornes (secondes) des buckets des histogrammes de latence
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Endpoint en cours (propagé aux threads par sync_to_async) et étapes ouvertes
+_current_endpoint: ContextVar[str] = ContextVar('metrics_endpoint', default='other')
+_open_stages: ContextVar[Tuple[str, ...]] = ContextVar('metrics_open_stages', default=())
+
+
+class LatencyHistogram:
+    """Histogramme cumulatif de latences (format Prometheus)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, compteur cumulé) pour chaque bucket, +Inf compris"""
+        running = 0
+        rows = []
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            running += count
+            rows.append(('+Inf' if bound == float('inf') else repr(bound), running))
+        return rows
+
+
+class MetricsRegistry:
+    """Histogrammes de latence en mémoire, par (endpoint, étape)"""
+
+    NAME = 'dp_api_stage_latency_seconds'
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get((endpoint, stage))
+            if histogram is None:
+                histogram = self._histograms[(endpoint, stage)] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Exposition texte Prometheus (version 0.0.4)"""
+        lines = [
+            f'# HELP {self.NAME} Latency of API request processing stages.',
+            f'# TYPE {self.NAME} histogram',
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            snapshot = [(key, histogram.cumulative(), histogram.total, histogram.count)
+                        for key, histogram in items]
+
+        for (endpoint, stage), buckets, total, count in snapshot:
+            labels = f'endpoint="{_escape(endpoint)}",stage="{_escape(stage)}"'
+            for bound, cumulative in buckets:
+                lines.append(f'{self.NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.NAME}_sum{{{labels}}} {total!r}')
+            lines.append(f'{self.NAME}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def timer(stage: str):
+    """
+    Mesurer une étape de l'endpoint courant. Une étape imbriquée dans une
+    étape de même nom (ex. noisy_quantiles -> noisy_quantile) n'est comptée qu'une fois.
+    """
+    open_stages = _open_stages.get()
+    if stage in open_stages:
+        yield
+        return
+
+    token = _open_stages.set(open_stages + (stage,))
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(_current_endpoint.get(), stage, time.perf_counter() - start)
+        _open_stages.reset(token)
+
+
+@contextmanager
+def endpoint(name: str):
+    """Déclarer l'endpoint courant et mesurer sa durée totale (étape 'total')"""
+    token = _current_endpoint.set(name)
+    try:
+        with timer('total'):
+            yield
+    finally:
+        _current_endpoint.reset(token)
+
+
+def timed(stage: str):
+    """Décorateur : mesurer chaque appel comme l'étape stage"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
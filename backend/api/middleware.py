@@ -0,0 +1,136 @@
+import cProfile
+import logging
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+logger = logging.getLogger(__name__)
+
+
+def profiler_directory() -> Path:
+    return Path(getattr(settings, 'PROFILER_DIR', settings.BASE_DIR / 'profiles'))
+
+
+class SamplingProfilerMiddleware:
+    """
+    Profilage cProfile opt-in des requêtes API :
+    - une fraction PROFILER_SAMPLE_RATE des requêtes, tirée au hasard
+    - ou les requêtes portant l'en-tête X-Profile: 1 d'un administrateur (JWT)
+
+    Chaque profil est écrit dans PROFILER_DIR sous <endpoint>_<timestamp>.prof
+    (PROFILER_MAX_FILES fichiers au plus, les plus anciens sont supprimés).
+    Un seul profil actif à la fois : cProfile n'est pas réentrant.
+
+    Compatible sync et async : sous ASGI, les vues async ne sont pas
+    ramenées dans le thread sync. Un profil async couvre aussi les autres
+    coroutines exécutées par la boucle pendant la requête.
+    """
+
+    HEADER = 'HTTP_X_PROFILE'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PROFILER_ENABLED', True)
+        self.sample_rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0)
+        self.max_files = getattr(settings, 'PROFILER_MAX_FILES', 200)
+        self._busy = threading.Lock()
+        self._authenticator = JWTAuthentication()
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        if not self.enabled or not self._should_profile(request):
+            return self.get_response(request)
+
+        # Une autre requête est déjà profilée : ne pas attendre
+        if not self._busy.acquire(blocking=False):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            self._save(profiler, request)
+        finally:
+            self._busy.release()
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled or not await self._ashould_profile(request):
+            return await self.get_response(request)
+
+        if not self._busy.acquire(blocking=False):
+            return await self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+            await sync_to_async(self._save)(profiler, request)
+        finally:
+            self._busy.release()
+        return response
+
+    def _header_requested(self, request) -> bool:
+        return request.META.get(self.HEADER) in ('1', 'true', 'yes')
+
+    def _sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _should_profile(self, request) -> bool:
+        if not request.path.startswith('/api/'):
+            return False
+        if self._header_requested(request):
+            return self._is_admin(request)
+        return self._sampled()
+
+    async def _ashould_profile(self, request) -> bool:
+        # Le JWT n'est vérifié (lecture de l'utilisateur en base) que si l'en-tête est présent
+        if not request.path.startswith('/api/'):
+            return False
+        if self._header_requested(request):
+            return await sync_to_async(self._is_admin)(request)
+        return self._sampled()
+
+    def _is_admin(self, request) -> bool:
+        """L'authentification DRF n'a pas encore eu lieu : vérifier le JWT ici"""
+        try:
+            auth = self._authenticator.authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return auth is not None and auth[0].role == 'admin'
+
+    def _save(self, profiler, request):
+        match = getattr(request, 'resolver_match', None)
+        name = match.url_name if match is not None and match.url_name else request.path
+        name = re.sub(r'[^A-Za-z0-9_-]+', '-', name).strip('-') or 'root'
+        directory = profiler_directory()
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(directory / f'{name}_{time.time_ns()}.prof')
+            self._prune(directory)
+        except OSError:
+            logger.exception('Could not write profile for %s', request.path)
+
+    def _prune(self, directory: Path):
+        files = sorted(directory.glob('*.prof'), key=lambda path: path.stat().st_mtime)
+        for path in files[:max(0, len(files) - self.max_files)]:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['blood_type'], name='patients_blood_t_49bba0_idx'),
+        ),
+    ]
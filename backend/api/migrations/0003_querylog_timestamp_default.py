@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_patient_blood_type_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='querylog',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_querylog_groupby_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='querylog',
+            name='query_type',
+            field=models.CharField(choices=[('count', 'Count'), ('mean', 'Mean'), ('sum', 'Sum'), ('median', 'Median'), ('histogram', 'Histogram'), ('groupby', 'Group by'), ('crosstab', 'Crosstab')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_querylog_timeseries_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContinualCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('epsilon', models.FloatField()),
+                ('horizon', models.IntegerField(help_text="Nombre maximal de pas (lots d'ingestion)")),
+                ('steps', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'continual_counters',
+            },
+        ),
+        migrations.CreateModel(
+            name='ContinualCounterNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.SmallIntegerField()),
+                ('index', models.IntegerField()),
+                ('true_sum', models.BigIntegerField(default=0)),
+                ('noisy_sum', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('counter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nodes', to='api.continualcounter')),
+            ],
+            options={
+                'db_table': 'continual_counter_nodes',
+                'unique_together': {('counter', 'level', 'index')},
+            },
+        ),
+    ]
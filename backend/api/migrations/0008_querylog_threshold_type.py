@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_continual_counter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='querylog',
+            name='query_type',
+            field=models.CharField(choices=[('count', 'Count'), ('mean', 'Mean'), ('sum', 'Sum'), ('median', 'Median'), ('histogram', 'Histogram'), ('groupby', 'Group by'), ('crosstab', 'Crosstab'), ('timeseries', 'Time series'), ('threshold', 'Threshold')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_querylog_synthetic_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['updated_at'], name='patients_updated_f5b193_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_patient_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RangeTree',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('column', models.CharField(max_length=50)),
+                ('branching', models.SmallIntegerField()),
+                ('epsilon', models.FloatField()),
+                ('filters_digest', models.CharField(max_length=64)),
+                ('data_version', models.CharField(max_length=100)),
+                ('tree', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'range_trees',
+                'unique_together': {('column', 'branching', 'epsilon', 'filters_digest', 'data_version')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_range_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='epsilonbudget',
+            name='consumed_delta',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='epsilonbudget',
+            name='total_delta',
+            field=models.FloatField(default=0.001),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_epsilonbudget_delta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='continualcounter',
+            name='epoch',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='continualcounter',
+            name='last_step_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='continualcounter',
+            name='pending',
+            field=models.IntegerField(default=0, help_text='Créations isolées pas encore publiées'),
+        ),
+        migrations.AlterField(
+            model_name='continualcounter',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='continualcounter',
+            unique_together={('name', 'epoch')},
+        ),
+    ]
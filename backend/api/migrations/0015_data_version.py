@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+def create_data_version(apps, schema_editor):
+    apps.get_model('api', 'DataVersion').objects.get_or_create(pk=1)
+
+
+def delete_range_trees(apps, schema_editor):
+    # Arbres indexés par l'ancien marqueur texte : plus jamais relus
+    apps.get_model('api', 'RangeTree').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_continual_counter_epochs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'data_versions',
+            },
+        ),
+        migrations.RunPython(create_data_version, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patients_updated_f5b193_idx',
+        ),
+        migrations.RunPython(delete_range_trees, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='rangetree',
+            name='data_version',
+            field=models.BigIntegerField(),
+        ),
+    ]
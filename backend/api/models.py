@@ -1,8 +1,12 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
+from django.core.cache import cache
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
+import hashlib
+import json
 import uuid
 
 
@@ -62,36 +66,134 @@ class Patient(models.Model):
             models.Index(fields=['age']),
             models.Index(fields=['gender']),
             models.Index(fields=['zip_code']),
+            models.Index(fields=['blood_type']),
             models.Index(fields=['admission_date']),
         ]
     
     def __str__(self):
         return f"Patient {self.patient_id}"
     
+    def save(self, *args, **kwargs):
+        # Ligne et DataVersion (signal post_save) validées dans la même transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+    
     @property
     def bmi(self):
         height_m = self.height / 100
         return round(self.weight / (height_m ** 2), 2)
 
 
+class DataVersion(models.Model):
+    """
+    Version des données patients partagée par tous les process (une seule
+    ligne) : incrémentée dans la transaction de chaque écriture de patients
+    (signaux, chargements en bulk). Les réponses rejouables, le snapshot et
+    les index en mémoire sont indexés par cette version.
+    """
+    version = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'data_versions'
+    
+    @classmethod
+    def current(cls) -> int:
+        """Version courante (lecture par clé primaire)"""
+        version = cls.objects.filter(pk=1).values_list('version', flat=True).first()
+        return version or 0
+    
+    @classmethod
+    def bump(cls) -> int:
+        """Incrémenter la version (à appeler dans la transaction de l'écriture)"""
+        with transaction.atomic():
+            if not cls.objects.filter(pk=1).update(version=models.F('version') + 1):
+                cls.objects.get_or_create(pk=1, defaults={'version': 1})
+            return cls.objects.filter(pk=1).values_list('version', flat=True).get()
+    
+    def __str__(self):
+        return f"Patients data version {self.version}"
+
+
 class EpsilonBudget(models.Model):
     """Budget epsilon par utilisateur avec tracking"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='epsilon_budget')
     total_budget = models.FloatField(default=10.0)
     consumed_budget = models.FloatField(default=0.0)
+    # Delta des requêtes (epsilon, delta)-DP (mécanisme gaussien), composé additivement
+    total_delta = models.FloatField(default=1e-3)
+    consumed_delta = models.FloatField(default=0.0)
     warning_threshold = models.FloatField(default=2.0)
     last_reset = models.DateTimeField(default=timezone.now)
     reset_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Tolérance sur les erreurs d'arrondi flottant des débits cumulés
+    BUDGET_TOLERANCE = 1e-9
+    DELTA_TOLERANCE = 1e-15
+    
+    # Cache write-through : champs de l'état + budget consommé en micro-epsilon
+    # (entier, pour un cache.incr atomique à chaque débit)
+    CACHED_FIELDS = ('id', 'user_id', 'total_budget', 'total_delta', 'consumed_delta',
+                     'warning_threshold', 'last_reset', 'reset_count', 'created_at', 'updated_at')
+    MICRO_EPSILON = 1_000_000
+    
     class Meta:
         db_table = 'epsilon_budgets'
     
+    @staticmethod
+    def _cache_keys(user_id):
+        return f'epsilon_budget:{user_id}:state', f'epsilon_budget:{user_id}:consumed'
+    
+    @classmethod
+    def for_user(cls, user, fresh=False):
+        """
+        Budget de l'utilisateur, lu dans le cache sans requête SQL si possible.
+        Le cache est local au process : fresh=True relit la base (affichages,
+        resets) ; le débit reste l'UPDATE conditionnel de consume().
+        """
+        state_key, consumed_key = cls._cache_keys(user.pk)
+        cached = {} if fresh else cache.get_many([state_key, consumed_key])
+        if state_key in cached and consumed_key in cached:
+            state = dict(cached[state_key], consumed_budget=cached[consumed_key] / cls.MICRO_EPSILON)
+            fields = [f.attname for f in cls._meta.concrete_fields]
+            budget = cls.from_db('default', fields, [state[f] for f in fields])
+        else:
+            budget, _ = cls.objects.get_or_create(user=user)
+            budget.write_to_cache()
+        budget.user = user
+        return budget
+    
+    def write_to_cache(self):
+        """Écrire l'état complet du budget dans le cache"""
+        state_key, consumed_key = self._cache_keys(self.user_id)
+        timeout = getattr(settings, 'EPSILON_BUDGET_CACHE_TIMEOUT', 3600)
+        cache.set_many({
+            state_key: {f: getattr(self, f) for f in self.CACHED_FIELDS},
+            consumed_key: round(self.consumed_budget * self.MICRO_EPSILON),
+        }, timeout=timeout)
+    
+    def reload(self):
+        """Relire l'état depuis la base et le réécrire dans le cache"""
+        self.refresh_from_db()
+        self.write_to_cache()
+    
+    @classmethod
+    def evict_from_cache(cls, user_id):
+        cache.delete_many(list(cls._cache_keys(user_id)))
+    
     @property
     def remaining_budget(self):
         return round(self.total_budget - self.consumed_budget, 4)
     
+    @property
+    def remaining_delta(self):
+        return max(0.0, self.total_delta - self.consumed_delta)
+    
     @property
     def is_warning(self):
         return self.remaining_budget <= self.warning_threshold
@@ -100,21 +202,51 @@ class EpsilonBudget(models.Model):
     def is_depleted(self):
         return self.remaining_budget <= 0
     
-    def can_consume(self, epsilon):
-        return self.remaining_budget >= epsilon
+    def can_consume(self, epsilon, delta=0.0):
+        return (self.remaining_budget >= epsilon
+                and self.consumed_delta + delta <= self.total_delta + self.DELTA_TOLERANCE)
     
-    def consume(self, epsilon):
-        if self.can_consume(epsilon):
+    def consume(self, epsilon, delta=0.0):
+        """
+        Débit atomique : un seul UPDATE conditionnel (consumed + epsilon <= total,
+        idem pour delta), sans lecture préalable ni verrou. Deux requêtes
+        concurrentes ne peuvent pas dépenser le même budget : la base n'applique
+        que les débits couverts.
+        """
+        conditions = {
+            'consumed_budget__lte': models.F('total_budget') - epsilon + self.BUDGET_TOLERANCE,
+        }
+        changes = {
+            'consumed_budget': models.F('consumed_budget') + epsilon,
+            'updated_at': timezone.now(),
+        }
+        if delta:
+            conditions['consumed_delta__lte'] = models.F('total_delta') - delta + self.DELTA_TOLERANCE
+            changes['consumed_delta'] = models.F('consumed_delta') + delta
+        updated = EpsilonBudget.objects.filter(pk=self.pk, **conditions).update(**changes)
+        if updated and delta:
+            # Débit delta (rare, mécanisme gaussien) : l'état en cache est relu de la base
+            self.reload()
+            return True
+        if updated:
             self.consumed_budget += epsilon
-            self.save()
+            try:
+                cache.incr(self._cache_keys(self.user_id)[1], round(epsilon * self.MICRO_EPSILON))
+            except ValueError:
+                self.write_to_cache()
             return True
+        
+        # Débit refusé : resynchroniser le cache avec la base
+        self.reload()
         return False
     
     def reset(self):
         self.consumed_budget = 0.0
+        self.consumed_delta = 0.0
         self.last_reset = timezone.now()
         self.reset_count += 1
-        self.save()
+        self.save(update_fields=['consumed_budget', 'consumed_delta', 'last_reset', 'reset_count',
+                                 'updated_at'])
     
     def __str__(self):
         return f"{self.user.username}: {self.remaining_budget}/{self.total_budget}"
@@ -128,6 +260,12 @@ class QueryLog(models.Model):
         ('sum', 'Sum'),
         ('median', 'Median'),
         ('histogram', 'Histogram'),
+        ('groupby', 'Group by'),
+        ('crosstab', 'Crosstab'),
+        ('timeseries', 'Time series'),
+        ('threshold', 'Threshold'),
+        ('range_tree', 'Range tree'),
+        ('synthetic', 'Synthetic data'),
     ]
     
     STATUS_CHOICES = [
@@ -150,7 +288,8 @@ class QueryLog(models.Model):
     error_message = models.TextField(blank=True)
     execution_time = models.FloatField(help_text="Execution time in seconds")
     rows_affected = models.IntegerField(default=0)
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Horodaté à la création de l'objet (et non à l'INSERT, qui peut être différé)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
     
@@ -165,4 +304,93 @@ class QueryLog(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.query_type} - {self.status}"
\ No newline at end of file
+        return f"{self.user.username} - {self.query_type} - {self.status}"
+
+class ContinualCounter(models.Model):
+    """
+    Compteur à publication continue (mécanisme binaire) : chaque lot
+    d'ingestion est un pas de temps, et chaque pas met à jour un noeud par
+    niveau de l'arbre dyadique. Epsilon est dépensé une seule fois pour tout
+    l'horizon ; les totaux courants sont relus depuis les noeuds publiés.
+    
+    Horizon atteint : le lot suivant ouvre une nouvelle époque (nouvel arbre,
+    nouvel epsilon, premier pas = tout l'historique). Les créations isolées
+    s'accumulent dans pending jusqu'à la fin de la fenêtre en cours.
+    """
+    name = models.CharField(max_length=50)
+    epoch = models.IntegerField(default=0)
+    epsilon = models.FloatField()
+    horizon = models.IntegerField(help_text="Nombre maximal de pas (lots d'ingestion)")
+    steps = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0, help_text="Créations isolées pas encore publiées")
+    last_step_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'continual_counters'
+        unique_together = [('name', 'epoch')]
+    
+    @property
+    def levels(self):
+        """Nombre de niveaux de l'arbre (chaque pas appartient à un noeud par niveau)"""
+        return max(1, self.horizon.bit_length())
+    
+    @property
+    def is_exhausted(self):
+        return self.steps >= self.horizon
+    
+    def __str__(self):
+        return f"{self.name} #{self.epoch}: {self.steps}/{self.horizon}"
+
+
+class ContinualCounterNode(models.Model):
+    """Somme partielle d'un intervalle dyadique de pas, publiée bruitée une fois l'intervalle clos"""
+    counter = models.ForeignKey(ContinualCounter, on_delete=models.CASCADE, related_name='nodes')
+    level = models.SmallIntegerField()
+    index = models.IntegerField()
+    true_sum = models.BigIntegerField(default=0)
+    noisy_sum = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'continual_counter_nodes'
+        unique_together = [('counter', 'level', 'index')]
+    
+    def __str__(self):
+        return f"{self.counter.name} [{self.level}, {self.index}]"
+
+
+class RangeTree(models.Model):
+    """
+    Arbre de comptages bruités publié par une range-tree query, partagé par
+    tous les process : les plages sont relues ici sans nouveau scan ni débit.
+    Une version des données (DataVersion) par arbre, les anciennes versions
+    sont supprimées à la publication suivante.
+    """
+    column = models.CharField(max_length=50)
+    branching = models.SmallIntegerField()
+    epsilon = models.FloatField()
+    filters_digest = models.CharField(max_length=64)
+    data_version = models.BigIntegerField()
+    tree = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'range_trees'
+        unique_together = [('column', 'branching', 'epsilon', 'filters_digest', 'data_version')]
+    
+    @staticmethod
+    def key(params, data_version):
+        """Champs identifiant l'arbre construit avec ces paramètres sur cette version des données"""
+        filters = json.dumps(params.get('filters') or {}, sort_keys=True, default=str)
+        return {
+            'column': params['column'],
+            'branching': params.get('branching', 4),
+            'epsilon': params.get('epsilon', 1.0),
+            'filters_digest': hashlib.sha256(filters.encode()).hexdigest(),
+            'data_version': data_version,
+        }
+    
+    def __str__(self):
+        return f"{self.column} (b={self.branching}, eps={self.epsilon}) @ {self.data_version}"
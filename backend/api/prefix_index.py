@@ -0,0 +1,140 @@
+import numpy as np
+from functools import partial
+from typing import List, Dict, Any
+from django.db.models import Count, Sum, F, FloatField
+
+from .incremental import MaintainedIndex
+from .models import Patient
+from .snapshot import NUMERIC_COLUMNS
+
+
+# Colonnes entières indexées et leur domaine (validateurs du modèle)
+KEY_COLUMNS = {
+    'age': (0, 120),
+    'blood_pressure_systolic': (50, 250),
+    'blood_pressure_diastolic': (30, 150),
+}
+
+VALUE_COLUMNS = list(NUMERIC_COLUMNS)
+
+
+class PrefixSumIndex:
+    """
+    Index de sommes cumulées sur une colonne entière : comptages, sommes et
+    sommes des carrés de chaque colonne numérique par valeur de la clé.
+
+    Count, sum et mean sur une plage [<column>_min, <column>_max] se lisent
+    en deux accès aux tableaux cumulés, quelle que soit la taille de la table.
+    """
+
+    def __init__(self, column: str, lower: int, upper: int):
+        self.column = column
+        self.lower = lower
+        self.upper = upper
+        size = upper - lower + 1
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.sums = {value: np.zeros(size) for value in VALUE_COLUMNS}
+        self.sums_sq = {value: np.zeros(size) for value in VALUE_COLUMNS}
+        self.supported_filters = {f'{column}_min', f'{column}_max'}
+        # Lignes hors du domaine de la clé : l'index refuse alors de répondre
+        self.out_of_domain = 0
+        self._prefix = None
+
+    @classmethod
+    def build(cls, column: str) -> 'PrefixSumIndex':
+        """Construire l'index en un seul GROUP BY sur la colonne clé"""
+        index = cls(column, *KEY_COLUMNS[column])
+        aggregates = {'n': Count('pk')}
+        for value in VALUE_COLUMNS:
+            aggregates[f'sum_{value}'] = Sum(value, output_field=FloatField())
+            aggregates[f'sumsq_{value}'] = Sum(F(value) * F(value), output_field=FloatField())
+
+        rows = Patient.objects.order_by().values(column).annotate(**aggregates)
+        for row in rows.iterator():
+            index._add_bucket(row[column], row['n'], {
+                value: (row[f'sum_{value}'] or 0.0, row[f'sumsq_{value}'] or 0.0)
+                for value in VALUE_COLUMNS
+            })
+        return index
+
+    def _add_bucket(self, key, n: int, totals: Dict[str, tuple]):
+        if key is None or not self.lower <= key <= self.upper:
+            self.out_of_domain += n
+            return
+
+        position = key - self.lower
+        self.counts[position] += n
+        for value, (total, total_sq) in totals.items():
+            self.sums[value][position] += total
+            self.sums_sq[value][position] += total_sq
+        self._prefix = None
+
+    def add(self, patient, sign: int):
+        """Mise à jour incrémentale (insertion +1 / suppression -1)"""
+        totals = {}
+        for value in VALUE_COLUMNS:
+            x = float(getattr(patient, value))
+            totals[value] = (sign * x, sign * x * x)
+        self._add_bucket(getattr(patient, self.column), sign, totals)
+
+    def _prefixes(self):
+        """Tableaux cumulés (avec un zéro en tête), recalculés après modification"""
+        prefix = self._prefix
+        if prefix is None:
+            def cumulate(array):
+                return np.concatenate(([0], np.cumsum(array)))
+            prefix = {
+                'count': cumulate(self.counts),
+                'sum': {value: cumulate(self.sums[value]) for value in VALUE_COLUMNS},
+                'sum_sq': {value: cumulate(self.sums_sq[value]) for value in VALUE_COLUMNS},
+            }
+            self._prefix = prefix
+        return prefix
+
+    def supports(self, filters: Dict[str, Any], columns: List[str] = ()) -> bool:
+        return (self.out_of_domain == 0 and set(filters) <= self.supported_filters
+                and set(columns) <= set(VALUE_COLUMNS))
+
+    def _range(self, filters: Dict[str, Any]):
+        """Bornes [start, stop) dans les tableaux cumulés"""
+        lower = int(np.ceil(float(filters.get(f'{self.column}_min', self.lower))))
+        upper = int(np.floor(float(filters.get(f'{self.column}_max', self.upper))))
+        start = min(max(lower, self.lower), self.upper + 1) - self.lower
+        stop = max(min(upper, self.upper) + 1, self.lower) - self.lower
+        return start, max(start, stop)
+
+    def count(self, filters: Dict[str, Any]) -> int:
+        start, stop = self._range(filters)
+        prefix = self._prefixes()['count']
+        return int(prefix[stop] - prefix[start])
+
+    def sufficient_stats(self, filters: Dict[str, Any], columns: List[str]) -> Dict[str, Any]:
+        """Count, sum et sum_sq par colonne (même format que aggregate_sufficient_stats)"""
+        start, stop = self._range(filters)
+        prefix = self._prefixes()
+        count = int(prefix['count'][stop] - prefix['count'][start])
+        stats = {}
+        for column in columns:
+            stats[column] = {
+                'sum': float(prefix['sum'][column][stop] - prefix['sum'][column][start])
+                if count else None,
+                'sum_sq': float(prefix['sum_sq'][column][stop] - prefix['sum_sq'][column][start])
+                if count else None,
+            }
+        return {'count': count, 'columns': stats}
+
+
+prefix_indexes = {
+    column: MaintainedIndex(f'prefix-{column}', partial(PrefixSumIndex.build, column))
+    for column in KEY_COLUMNS
+}
+
+
+def get_prefix_index(filters: Dict[str, Any], columns: List[str], version: int):
+    """Index de sommes cumulées (à cette version des données) capable de répondre aux filtres, ou None"""
+    for column, holder in prefix_indexes.items():
+        if set(filters) <= {f'{column}_min', f'{column}_max'}:
+            index = holder.get(version)
+            if index is not None and index.supports(filters, columns):
+                return index
+    return None
@@ -0,0 +1,33 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
+from django.core.cache import caches
+
+from .models import DataVersion
+
+
+# Cache dédié (LRU + TTL configurés dans settings.CACHES['dp_answers'])
+ANSWER_CACHE_ALIAS = 'dp_answers'
+
+
+def query_fingerprint(query_type: str, data: Dict[str, Any], version: Optional[int] = None) -> str:
+    """Empreinte canonique d'une requête validée pour la version courante des données"""
+    canonical = json.dumps({'type': query_type, 'params': data}, sort_keys=True, default=str)
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    if version is None:
+        version = DataVersion.current()
+    return f'dp_answer:{version}:{digest}'
+
+
+def get_released_answer(fingerprint: str) -> Optional[Tuple[Dict[str, Any], int]]:
+    """Réponse bruitée déjà publiée pour cette requête : (payload, rows) ou None"""
+    return caches[ANSWER_CACHE_ALIAS].get(fingerprint)
+
+
+def store_released_answer(fingerprint: str, payload: Dict[str, Any], rows: int):
+    caches[ANSWER_CACHE_ALIAS].set(fingerprint, (payload, rows))
+
+
+def clear_released_answers():
+    """Invalider toutes les réponses (les données patients ont changé)"""
+    caches[ANSWER_CACHE_ALIAS].clear()
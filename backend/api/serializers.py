@@ -1,5 +1,10 @@
 from rest_framework import serializers
 from .models import Patient, QueryLog, EpsilonBudget, User
+from .services import (
+    DEFAULT_COLUMN_BOUNDS, CATEGORICAL_DOMAINS, DIMENSION_DOMAINS, TIME_BUCKETS, time_buckets
+)
+from .filters import compile_filters, FilterError
+from .prefix_index import KEY_COLUMNS
 from django.contrib.auth import get_user_model
 
 
@@ -38,24 +43,38 @@ class QueryLogSerializer(serializers.ModelSerializer):
 class EpsilonBudgetSerializer(serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
     remaining_budget = serializers.ReadOnlyField()
+    remaining_delta = serializers.ReadOnlyField()
     is_warning = serializers.ReadOnlyField()
     is_depleted = serializers.ReadOnlyField()
     
     class Meta:
         model = EpsilonBudget
         fields = ['id', 'user', 'user_username', 'total_budget', 'consumed_budget', 
-                 'remaining_budget', 'is_warning', 'is_depleted', 'warning_threshold',
+                 'remaining_budget', 'total_delta', 'consumed_delta', 'remaining_delta',
+                 'is_warning', 'is_depleted', 'warning_threshold',
                  'last_reset', 'reset_count', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'consumed_budget', 'last_reset', 'reset_count', 
+        read_only_fields = ['id', 'consumed_budget', 'consumed_delta', 'last_reset', 'reset_count', 
                            'created_at', 'updated_at']
 
 
 # Serializers pour les requêtes
 
+class FilterField(serializers.DictField):
+    """Filtres de cohorte, validés et compilés par le langage de filtres (api.filters)"""
+    
+    def to_internal_value(self, data):
+        filters = super().to_internal_value(data)
+        try:
+            compile_filters(filters)
+        except FilterError as e:
+            raise serializers.ValidationError(str(e))
+        return filters
+
+
 class QueryCountSerializer(serializers.Serializer):
     """Serializer pour count queries"""
     epsilon = serializers.FloatField(min_value=0.01, max_value=5.0, default=1.0)
-    filters = serializers.DictField(required=False, default=dict)
+    filters = FilterField(required=False, default=dict)
     
     # Filtres possibles
     age_min = serializers.IntegerField(required=False)
@@ -75,7 +94,7 @@ class QueryMeanSerializer(serializers.Serializer):
         ]),
         min_length=1
     )
-    filters = serializers.DictField(required=False, default=dict)
+    filters = FilterField(required=False, default=dict)
     
     # Bounds pour chaque colonne
     age_bounds = serializers.ListField(child=serializers.FloatField(), default=[0, 120])
@@ -95,7 +114,7 @@ class QuerySumSerializer(serializers.Serializer):
         ]),
         min_length=1
     )
-    filters = serializers.DictField(required=False, default=dict)
+    filters = FilterField(required=False, default=dict)
     bounds = serializers.DictField(required=False, default=dict)
 
 
@@ -106,8 +125,12 @@ class QueryMedianSerializer(serializers.Serializer):
         'age', 'weight', 'height', 'blood_pressure_systolic',
         'blood_pressure_diastolic', 'treatment_cost'
     ])
-    filters = serializers.DictField(required=False, default=dict)
+    filters = FilterField(required=False, default=dict)
     bounds = serializers.ListField(child=serializers.FloatField(), min_length=2, max_length=2)
+    quantiles = serializers.ListField(
+        child=serializers.FloatField(min_value=0.0, max_value=1.0),
+        required=False, min_length=1, max_length=10
+    )
 
 
 class QueryHistogramSerializer(serializers.Serializer):
@@ -118,9 +141,180 @@ class QueryHistogramSerializer(serializers.Serializer):
         'blood_pressure_diastolic', 'treatment_cost'
     ])
     num_bins = serializers.IntegerField(min_value=2, max_value=50, default=10)
-    filters = serializers.DictField(required=False, default=dict)
+    filters = FilterField(required=False, default=dict)
     min_value = serializers.FloatField(required=False)
     max_value = serializers.FloatField(required=False)
+    
+    def validate(self, attrs):
+        default_min, default_max = DEFAULT_COLUMN_BOUNDS[attrs['column']]
+        if attrs.get('min_value', default_min) >= attrs.get('max_value', default_max):
+            raise serializers.ValidationError('max_value must be greater than min_value')
+        return attrs
+
+
+class QueryGroupBySerializer(serializers.Serializer):
+    """Serializer pour group-by queries (count/mean/sum par catégorie)"""
+    epsilon = serializers.FloatField(min_value=0.01, max_value=5.0, default=1.0)
+    group_by = serializers.ChoiceField(choices=list(CATEGORICAL_DOMAINS))
+    aggregate = serializers.ChoiceField(choices=['count', 'mean', 'sum'], default='count')
+    column = serializers.ChoiceField(choices=list(DEFAULT_COLUMN_BOUNDS), required=False)
+    bounds = serializers.ListField(
+        child=serializers.FloatField(), min_length=2, max_length=2, required=False
+    )
+    filters = FilterField(required=False, default=dict)
+    
+    def validate(self, attrs):
+        if attrs['aggregate'] != 'count' and 'column' not in attrs:
+            raise serializers.ValidationError({'column': 'Required for mean and sum aggregates'})
+        if 'bounds' in attrs and attrs['bounds'][0] >= attrs['bounds'][1]:
+            raise serializers.ValidationError({'bounds': 'Upper bound must be greater than lower bound'})
+        return attrs
+
+
+class QueryCrosstabSerializer(serializers.Serializer):
+    """Serializer pour crosstab queries (tables de contingence à 2 ou 3 dimensions)"""
+    epsilon = serializers.FloatField(min_value=0.01, max_value=5.0, default=1.0)
+    dimensions = serializers.ListField(
+        child=serializers.ChoiceField(choices=list(DIMENSION_DOMAINS)), min_length=2, max_length=3
+    )
+    mechanism = serializers.ChoiceField(choices=['laplace', 'gaussian'], default='laplace')
+    delta = serializers.FloatField(min_value=1e-10, max_value=1e-3, default=1e-5)
+    consistent = serializers.BooleanField(default=False)
+    filters = FilterField(required=False, default=dict)
+    
+    def validate_dimensions(self, dimensions):
+        if len(set(dimensions)) != len(dimensions):
+            raise serializers.ValidationError('Dimensions must be distinct')
+        return dimensions
+    
+    def validate(self, attrs):
+        # Calibrage classique sigma = sqrt(2 ln(1.25/delta)) / epsilon : valide pour epsilon < 1
+        if attrs.get('mechanism') == 'gaussian' and attrs.get('epsilon', 1.0) >= 1:
+            raise serializers.ValidationError(
+                {'epsilon': 'The gaussian mechanism requires epsilon < 1'}
+            )
+        return attrs
+
+
+class QueryThresholdSerializer(serializers.Serializer):
+    """Serializer pour threshold queries (cohortes zip_code x diagnosis au-dessus d'un seuil)"""
+    MAX_CANDIDATES = 100000
+    
+    epsilon = serializers.FloatField(min_value=0.01, max_value=5.0, default=1.0)
+    threshold = serializers.FloatField(min_value=0)
+    max_positives = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    # Candidats déclarés par le client : les lire dans les données révélerait
+    # quels zip_code et diagnosis existent, hors de toute garantie DP
+    zip_codes = serializers.ListField(child=serializers.CharField(max_length=10), min_length=1)
+    diagnoses = serializers.ListField(child=serializers.CharField(), min_length=1)
+    filters = FilterField(required=False, default=dict)
+    
+    def validate(self, attrs):
+        for field in ('zip_codes', 'diagnoses'):
+            if len(set(attrs[field])) != len(attrs[field]):
+                raise serializers.ValidationError({field: 'Values must be distinct'})
+        candidates = len(attrs['zip_codes']) * len(attrs['diagnoses'])
+        if candidates > self.MAX_CANDIDATES:
+            raise serializers.ValidationError(
+                f'Too many candidate cohorts ({candidates}, max {self.MAX_CANDIDATES})'
+            )
+        return attrs
+
+
+class QueryRangeTreeSerializer(serializers.Serializer):
+    """Serializer pour range-tree queries (histogramme hiérarchique d'une colonne entière)"""
+    epsilon = serializers.FloatField(min_value=0.01, max_value=5.0, default=1.0)
+    column = serializers.ChoiceField(choices=list(KEY_COLUMNS))
+    branching = serializers.IntegerField(min_value=2, max_value=16, default=4)
+    filters = FilterField(required=False, default=dict)
+
+
+class RangeLookupSerializer(QueryRangeTreeSerializer):
+    """Plages [min, max] à lire dans un arbre déjà publié (mêmes paramètres que sa construction)"""
+    MAX_RANGES = 1000
+    
+    ranges = serializers.ListField(
+        child=serializers.ListField(child=serializers.FloatField(), min_length=2, max_length=2),
+        min_length=1, max_length=MAX_RANGES
+    )
+    
+    def validate_ranges(self, ranges):
+        for lower, upper in ranges:
+            if lower > upper:
+                raise serializers.ValidationError('Each range must satisfy min <= max')
+        return ranges
+    
+    def tree_params(self):
+        """Paramètres de construction de l'arbre (empreinte de la réponse publiée)"""
+        return {field: value for field, value in self.validated_data.items() if field != 'ranges'}
+
+
+class QueryTimeSeriesSerializer(serializers.Serializer):
+    """Serializer pour time-series queries (admissions par jour/semaine/mois)"""
+    MAX_BUCKETS = 1000
+    
+    epsilon = serializers.FloatField(min_value=0.01, max_value=5.0, default=1.0)
+    bucket = serializers.ChoiceField(choices=list(TIME_BUCKETS), default='month')
+    start = serializers.DateField()
+    end = serializers.DateField()
+    aggregate = serializers.ChoiceField(choices=['count', 'mean'], default='count')
+    column = serializers.ChoiceField(choices=list(DEFAULT_COLUMN_BOUNDS), required=False)
+    bounds = serializers.ListField(
+        child=serializers.FloatField(), min_length=2, max_length=2, required=False
+    )
+    filters = FilterField(required=False, default=dict)
+    
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'end': 'End date must not be before start date'})
+        if len(time_buckets(attrs['bucket'], attrs['start'], attrs['end'])) > self.MAX_BUCKETS:
+            raise serializers.ValidationError(f'At most {self.MAX_BUCKETS} buckets per query')
+        if attrs['aggregate'] == 'mean' and 'column' not in attrs:
+            raise serializers.ValidationError({'column': 'Required for mean aggregates'})
+        if 'bounds' in attrs and attrs['bounds'][0] >= attrs['bounds'][1]:
+            raise serializers.ValidationError({'bounds': 'Upper bound must be greater than lower bound'})
+        
+        # Dates gardées en ISO : les paramètres sont sérialisés en JSON (logs, rejeu)
+        attrs['start'] = attrs['start'].isoformat()
+        attrs['end'] = attrs['end'].isoformat()
+        return attrs
+
+
+class QueryBatchSerializer(serializers.Serializer):
+    """Serializer pour un batch de requêtes (tous les types de requêtes DP)"""
+    queries = serializers.ListField(child=serializers.DictField(), min_length=1, max_length=50)
+    
+    SPEC_SERIALIZERS = {
+        'count': QueryCountSerializer,
+        'mean': QueryMeanSerializer,
+        'sum': QuerySumSerializer,
+        'median': QueryMedianSerializer,
+        'histogram': QueryHistogramSerializer,
+        'groupby': QueryGroupBySerializer,
+        'crosstab': QueryCrosstabSerializer,
+        'timeseries': QueryTimeSeriesSerializer,
+        'threshold': QueryThresholdSerializer,
+        'range_tree': QueryRangeTreeSerializer,
+    }
+    
+    def validate_queries(self, queries):
+        validated = []
+        errors = {}
+        for idx, spec in enumerate(queries):
+            spec = dict(spec)
+            query_type = spec.pop('type', None)
+            if query_type not in self.SPEC_SERIALIZERS:
+                errors[idx] = {'type': [f'Must be one of: {", ".join(self.SPEC_SERIALIZERS)}']}
+                continue
+            spec_serializer = self.SPEC_SERIALIZERS[query_type](data=spec)
+            if not spec_serializer.is_valid():
+                errors[idx] = spec_serializer.errors
+                continue
+            validated.append({'type': query_type, 'data': spec_serializer.validated_data})
+        
+        if errors:
+            raise serializers.ValidationError(errors)
+        return validated
 
 
 class DataLoadSerializer(serializers.Serializer):
@@ -1,9 +1,306 @@
 
 import numpy as np
 from typing import List, Dict, Any, Tuple
-from django.db.models import QuerySet, Count, Avg, Sum
+from django.db.models import (
+    QuerySet, Count, Avg, Sum, F, FloatField, IntegerField, ExpressionWrapper,
+    Case, When, Value
+)
+from django.db.models.functions import Floor, Greatest, Least, TruncDay, TruncWeek, TruncMonth
 from decimal import Decimal
 
+from .metrics import timed
+from .models import Patient
+
+
+# Bornes par défaut des colonnes numériques (clipping / sensibilité / bins)
+DEFAULT_COLUMN_BOUNDS = {
+    'age': (0, 120),
+    'weight': (30, 200),
+    'height': (100, 250),
+    'blood_pressure_systolic': (50, 250),
+    'blood_pressure_diastolic': (30, 150),
+    'treatment_cost': (0, 100000),
+}
+
+# Domaines déclarés des colonnes catégorielles groupables (jamais lus dans les
+# données : une catégorie absente de la cohorte est publiée avec un comptage bruité)
+CATEGORICAL_DOMAINS = {
+    'gender': [code for code, _ in Patient.GENDER_CHOICES],
+    'blood_type': [code for code, _ in Patient.BLOOD_TYPES],
+}
+
+# Dimensions des tableaux croisés : colonnes catégorielles et tranches d'âge dérivées
+AGE_DECADES = 13  # 0-9 ... 120-129
+DIMENSION_DOMAINS = {
+    **CATEGORICAL_DOMAINS,
+    'age_decade': [f'{10 * i}-{10 * i + 9}' for i in range(AGE_DECADES)],
+}
+
+
+def dimension_position(dimension: str, value: Any) -> int:
+    """Position d'une valeur lue en base dans le domaine de la dimension (-1 si hors domaine)"""
+    if value is None:
+        return -1
+    if dimension == 'age_decade':
+        decade = int(value)
+        return decade if 0 <= decade < AGE_DECADES else -1
+    try:
+        return DIMENSION_DOMAINS[dimension].index(value)
+    except ValueError:
+        return -1
+
+
+def _sufficient_stats_aggregates(columns: List[str]) -> Dict[str, Any]:
+    aggregates = {'n': Count('pk')}
+    for column in columns:
+        aggregates[f'sum_{column}'] = Sum(column, output_field=FloatField())
+        aggregates[f'sumsq_{column}'] = Sum(F(column) * F(column), output_field=FloatField())
+    return aggregates
+
+
+def _sufficient_stats_result(row: Dict[str, Any], columns: List[str]) -> Dict[str, Any]:
+    return {
+        'count': row['n'],
+        'columns': {
+            column: {'sum': row[f'sum_{column}'], 'sum_sq': row[f'sumsq_{column}']}
+            for column in columns
+        }
+    }
+
+
+def aggregate_sufficient_stats(queryset: QuerySet, columns: List[str]) -> Dict[str, Any]:
+    """Count, somme et somme des carrés de chaque colonne en une seule requête SQL"""
+    row = queryset.order_by().aggregate(**_sufficient_stats_aggregates(columns))
+    return _sufficient_stats_result(row, columns)
+
+
+async def aaggregate_sufficient_stats(queryset: QuerySet, columns: List[str]) -> Dict[str, Any]:
+    """Version async de aggregate_sufficient_stats (ORM async)"""
+    row = await queryset.order_by().aaggregate(**_sufficient_stats_aggregates(columns))
+    return _sufficient_stats_result(row, columns)
+
+
+def _quantile_position(q: float, count: int) -> Tuple[float, int]:
+    position = q * (count - 1)
+    return position, int(np.floor(position))
+
+
+def _interpolate(values: List[float], position: float, low: int) -> float:
+    if len(values) == 1 or position == low:
+        return values[0]
+    return values[0] + (values[1] - values[0]) * (position - low)
+
+
+def aggregate_quantiles(queryset: QuerySet, column: str,
+                        quantiles: List[float]) -> Tuple[Dict[float, float], int]:
+    """
+    Quantiles (interpolation linéaire, comme np.quantile) par lectures
+    ordonnées à offset dans la base : au plus 2 valeurs lues par quantile.
+    """
+    queryset = queryset.exclude(**{f'{column}__isnull': True})
+    count = queryset.count()
+    if count == 0:
+        return {}, 0
+    
+    ordered = queryset.order_by(column).values_list(column, flat=True)
+    results = {}
+    for q in quantiles:
+        position, low = _quantile_position(q, count)
+        values = [float(v) for v in ordered[low:low + 2]]
+        results[q] = _interpolate(values, position, low)
+    return results, count
+
+
+async def aaggregate_quantiles(queryset: QuerySet, column: str,
+                               quantiles: List[float]) -> Tuple[Dict[float, float], int]:
+    """Version async de aggregate_quantiles (ORM async)"""
+    queryset = queryset.exclude(**{f'{column}__isnull': True})
+    count = await queryset.acount()
+    if count == 0:
+        return {}, 0
+    
+    ordered = queryset.order_by(column).values_list(column, flat=True)
+    results = {}
+    for q in quantiles:
+        position, low = _quantile_position(q, count)
+        values = [float(v) async for v in ordered[low:low + 2]]
+        results[q] = _interpolate(values, position, low)
+    return results, count
+
+
+def _histogram_rows(queryset: QuerySet, column: str, lower: float, upper: float,
+                    num_bins: int) -> QuerySet:
+    norm = num_bins / (upper - lower)
+    bin_index = Case(
+        When(**{f'{column}__gte': upper}, then=Value(num_bins - 1)),
+        default=Floor(ExpressionWrapper((F(column) - lower) * norm, output_field=FloatField())),
+        output_field=IntegerField(),
+    )
+    
+    return (
+        queryset
+        .filter(**{f'{column}__gte': lower, f'{column}__lte': upper})
+        .order_by()
+        .annotate(bin=bin_index)
+        .values('bin')
+        .annotate(n=Count('pk'))
+    )
+
+
+def _histogram_counts(rows, num_bins: int) -> List[int]:
+    counts = [0] * num_bins
+    for row in rows:
+        index = min(max(int(row['bin']), 0), num_bins - 1)
+        counts[index] += row['n']
+    return counts
+
+
+def aggregate_histogram(queryset: QuerySet, column: str, lower: float, upper: float,
+                        num_bins: int) -> List[int]:
+    """
+    Histogramme calculé dans la base : un seul GROUP BY sur l'index de bin,
+    seuls num_bins compteurs sortent de la base (mêmes bins que np.histogram).
+    """
+    rows = _histogram_rows(queryset, column, lower, upper, num_bins)
+    return _histogram_counts(rows, num_bins)
+
+
+async def aaggregate_histogram(queryset: QuerySet, column: str, lower: float, upper: float,
+                               num_bins: int) -> List[int]:
+    """Version async de aggregate_histogram (itération async sur le GROUP BY)"""
+    rows = _histogram_rows(queryset, column, lower, upper, num_bins)
+    return _histogram_counts([row async for row in rows], num_bins)
+
+
+def aggregate_groups(queryset: QuerySet, group_by: str, column: str = None,
+                     bounds: Tuple[float, float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Comptage et somme clippée à bounds de column (si fournie) par catégorie
+    de group_by, en un seul GROUP BY, alignés sur CATEGORICAL_DOMAINS.
+    """
+    domain = CATEGORICAL_DOMAINS[group_by]
+    positions = {value: i for i, value in enumerate(domain)}
+    
+    aggregates = {'n': Count('pk')}
+    if column is not None:
+        lower, upper = bounds
+        clipped = Greatest(Least(F(column), Value(float(upper)), output_field=FloatField()),
+                           Value(float(lower)), output_field=FloatField())
+        aggregates['total'] = Sum(clipped, output_field=FloatField())
+    
+    counts = np.zeros(len(domain), dtype=np.int64)
+    sums = np.zeros(len(domain)) if column is not None else None
+    for row in queryset.order_by().values(group_by).annotate(**aggregates):
+        position = positions.get(row[group_by])
+        if position is None:
+            continue  # valeur hors du domaine déclaré
+        counts[position] += row['n']
+        if sums is not None:
+            sums[position] += row['total'] or 0.0
+    return counts, sums
+
+
+def aggregate_crosstab(queryset: QuerySet, dimensions: List[str]) -> np.ndarray:
+    """Table de contingence complète (comptages) sur les dimensions, en un seul GROUP BY"""
+    shape = tuple(len(DIMENSION_DOMAINS[dimension]) for dimension in dimensions)
+    table = np.zeros(shape, dtype=np.int64)
+    
+    queryset = queryset.order_by()
+    if 'age_decade' in dimensions:
+        queryset = queryset.annotate(age_decade=Floor(
+            ExpressionWrapper(F('age') / 10.0, output_field=FloatField())
+        ))
+    
+    for row in queryset.values_list(*dimensions).annotate(n=Count('pk')):
+        *values, n = row
+        cell = tuple(dimension_position(d, v) for d, v in zip(dimensions, values))
+        if min(cell) >= 0:
+            table[cell] += n
+    return table
+
+
+def aggregate_candidate_counts(queryset: QuerySet, columns: List[str],
+                               domains: List[List[str]]) -> np.ndarray:
+    """
+    Comptages de toutes les cohortes candidates (produit des domaines des
+    colonnes) en un seul GROUP BY ; les combinaisons absentes valent 0.
+    """
+    positions = [{value: i for i, value in enumerate(domain)} for domain in domains]
+    counts = np.zeros(tuple(len(domain) for domain in domains), dtype=np.int64)
+    for row in queryset.order_by().values_list(*columns).annotate(n=Count('pk')):
+        *values, n = row
+        cell = tuple(p.get(v, -1) for p, v in zip(positions, values))
+        if min(cell) >= 0:
+            counts[cell] += n
+    return counts
+
+
+# Troncature SQL de admission_date par taille de bucket
+TIME_BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def truncate_dates(dates: np.ndarray, bucket: str) -> np.ndarray:
+    """Début du bucket (jour, semaine ISO commençant le lundi, mois) de dates datetime64[D]"""
+    dates = dates.astype('datetime64[D]')
+    if bucket == 'week':
+        # 1970-01-01 est un jeudi : (jours + 3) % 7 = jours écoulés depuis le lundi
+        return dates - ((dates.astype(np.int64) + 3) % 7).astype('timedelta64[D]')
+    if bucket == 'month':
+        return dates.astype('datetime64[M]').astype('datetime64[D]')
+    return dates
+
+
+def time_buckets(bucket: str, start, end) -> np.ndarray:
+    """Tous les débuts de buckets couvrant [start, end] (plage déclarée, jamais lue dans les données)"""
+    first, last = truncate_dates(np.array([start, end], dtype='datetime64[D]'), bucket)
+    if bucket == 'month':
+        months = np.arange(first.astype('datetime64[M]'), last.astype('datetime64[M]') + 1)
+        return months.astype('datetime64[D]')
+    step = 7 if bucket == 'week' else 1
+    return np.arange(first, last + 1, step)
+
+
+def aggregate_time_series(queryset: QuerySet, bucket: str, start, end, column: str = None,
+                          bounds: Tuple[float, float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Comptage (et somme clippée de column) par bucket de admission_date sur
+    [start, end], en un seul GROUP BY sur la date tronquée. Les buckets
+    vides sont remplis à 0.
+    """
+    buckets = time_buckets(bucket, start, end)
+    positions = {value: i for i, value in enumerate(buckets.astype(str))}
+    
+    aggregates = {'n': Count('pk')}
+    if column is not None:
+        lower, upper = bounds
+        clipped = Greatest(Least(F(column), Value(float(upper)), output_field=FloatField()),
+                           Value(float(lower)), output_field=FloatField())
+        aggregates['total'] = Sum(clipped, output_field=FloatField())
+    
+    rows = (
+        queryset
+        .filter(admission_date__gte=start, admission_date__lte=end)
+        .order_by()
+        .annotate(bucket=TIME_BUCKETS[bucket]('admission_date'))
+        .values('bucket')
+        .annotate(**aggregates)
+    )
+    
+    counts = np.zeros(len(buckets), dtype=np.int64)
+    sums = np.zeros(len(buckets)) if column is not None else None
+    for row in rows:
+        position = positions.get(str(row['bucket'])[:10])
+        if position is None:
+            continue
+        counts[position] += row['n']
+        if sums is not None:
+            sums[position] += row['total'] or 0.0
+    return counts, sums
+
 
 class DifferentialPrivacyService:
     """Service pour appliquer differential privacy aux requêtes"""
@@ -25,18 +322,23 @@ class DifferentialPrivacyService:
         
         return sensitivities.get(query_type, 1.0)
     
-    def add_laplace_noise(self, true_value: float, sensitivity: float) -> float:
-        """Ajouter du bruit Laplacien"""
+    def add_laplace_noise(self, true_value, sensitivity: float):
+        """Ajouter du bruit Laplacien (scalaire, ou tableau en un seul tirage vectorisé)"""
         scale = sensitivity / self.epsilon
-        noise = np.random.laplace(0, scale)
-        return true_value + noise
+        if np.ndim(true_value) == 0:
+            return true_value + np.random.laplace(0, scale)
+        true_value = np.asarray(true_value, dtype=np.float64)
+        return true_value + np.random.laplace(0, scale, size=true_value.shape)
     
-    def add_gaussian_noise(self, true_value: float, sensitivity: float) -> float:
-        """Ajouter du bruit Gaussien (pour (epsilon, delta)-DP)"""
+    def add_gaussian_noise(self, true_value, sensitivity: float):
+        """Ajouter du bruit Gaussien (pour (epsilon, delta)-DP), scalaire ou tableau"""
         sigma = (sensitivity * np.sqrt(2 * np.log(1.25 / self.delta))) / self.epsilon
-        noise = np.random.normal(0, sigma)
-        return true_value + noise
+        if np.ndim(true_value) == 0:
+            return true_value + np.random.normal(0, sigma)
+        true_value = np.asarray(true_value, dtype=np.float64)
+        return true_value + np.random.normal(0, sigma, size=true_value.shape)
     
+    @timed('noise')
     def noisy_count(self, count: int) -> Dict[str, Any]:
         """Count avec DP"""
         sensitivity = 1.0
@@ -54,8 +356,16 @@ class DifferentialPrivacyService:
             'sensitivity': sensitivity
         }
     
+    @timed('noise')
     def noisy_sum(self, total: float, bounds: Tuple[float, float], count: int) -> Dict[str, Any]:
         """Sum avec DP"""
+        return self.noisy_sum_from_stats({'count': count, 'sum': total}, bounds)
+    
+    @timed('noise')
+    def noisy_sum_from_stats(self, stats: Dict[str, float], bounds: Tuple[float, float]) -> Dict[str, Any]:
+        """Sum avec DP à partir des statistiques suffisantes (count, sum)"""
+        total = float(stats['sum'])
+        count = stats['count']
         lower, upper = bounds
         sensitivity = (upper - lower) * count
         
@@ -71,9 +381,18 @@ class DifferentialPrivacyService:
             'bounds': bounds
         }
     
+    @timed('noise')
     def noisy_mean(self, mean: float, bounds: Tuple[float, float], count: int) -> Dict[str, Any]:
         """Mean avec DP"""
+        return self.noisy_mean_from_stats({'count': count, 'sum': mean * count}, bounds)
+    
+    @timed('noise')
+    def noisy_mean_from_stats(self, stats: Dict[str, float], bounds: Tuple[float, float]) -> Dict[str, Any]:
+        """Mean avec DP à partir des statistiques suffisantes (count, sum, sum_sq)"""
         lower, upper = bounds
+        count = stats['count']
+        true_sum = float(stats['sum'])
+        mean = true_sum / count
         
         # Pour la moyenne, on utilise la composition de count et sum
         epsilon_count = self.epsilon / 2
@@ -83,7 +402,6 @@ class DifferentialPrivacyService:
         noisy_count_value = max(1, self.add_laplace_noise(float(count), 1.0 / epsilon_count))
         
         # Ajouter du bruit à la somme
-        true_sum = mean * count
         sensitivity_sum = (upper - lower) * count
         noisy_sum_value = self.add_laplace_noise(true_sum, sensitivity_sum / epsilon_sum)
         
@@ -103,9 +421,10 @@ class DifferentialPrivacyService:
             'count': count
         }
     
+    @timed('noise')
     def noisy_median(self, values: List[float], bounds: Tuple[float, float]) -> Dict[str, Any]:
         """Median avec DP (approximation)"""
-        if not values:
+        if len(values) == 0:
             return {
                 'noisy_result': 0,
                 'true_result': 0,
@@ -113,31 +432,55 @@ class DifferentialPrivacyService:
                 'error': 'No values provided'
             }
         
-        true_median = float(np.median(values))
+        return self.noisy_quantile(float(np.median(values)), bounds)
+    
+    @timed('noise')
+    def noisy_quantile(self, true_value: float, bounds: Tuple[float, float],
+                       quantile: float = 0.5) -> Dict[str, Any]:
+        """Quantile avec DP à partir de sa valeur vraie (déjà calculée)"""
         lower, upper = bounds
         sensitivity = (upper - lower) / 2
         
-        noisy_value = self.add_laplace_noise(true_median, sensitivity)
+        noisy_value = self.add_laplace_noise(true_value, sensitivity)
         noisy_value = max(lower, min(upper, noisy_value))
         
         return {
             'noisy_result': round(noisy_value, 2),
-            'true_result': round(true_median, 2),
-            'noise_added': round(noisy_value - true_median, 2),
+            'true_result': round(true_value, 2),
+            'noise_added': round(noisy_value - true_value, 2),
             'epsilon_used': self.epsilon,
             'mechanism': 'Laplace',
             'sensitivity': sensitivity,
+            'bounds': bounds,
+            'quantile': quantile
+        }
+    
+    @timed('noise')
+    def noisy_quantiles(self, true_quantiles: Dict[float, float],
+                        bounds: Tuple[float, float]) -> Dict[str, Any]:
+        """Plusieurs quantiles avec DP (epsilon réparti également)"""
+        epsilon_per_quantile = self.epsilon / len(true_quantiles)
+        quantile_service = DifferentialPrivacyService(epsilon=epsilon_per_quantile, delta=self.delta)
+        
+        return {
+            'quantiles': {
+                str(q): quantile_service.noisy_quantile(value, bounds, q)
+                for q, value in true_quantiles.items()
+            },
+            'epsilon_used': self.epsilon,
+            'epsilon_per_quantile': epsilon_per_quantile,
+            'mechanism': 'Laplace',
             'bounds': bounds
         }
     
+    @timed('noise')
     def noisy_histogram(self, bins: List[int], num_bins: int) -> Dict[str, Any]:
         """Histogram avec DP"""
         sensitivity = 1.0  # Une personne peut affecter au plus 1 bin
         
-        noisy_bins = []
-        for count in bins:
-            noisy_count = self.add_laplace_noise(float(count), sensitivity)
-            noisy_bins.append(max(0, round(noisy_count)))
+        # Un seul tirage pour tous les bins
+        noisy_bins = np.maximum(0, np.round(self.add_laplace_noise(bins, sensitivity)))
+        noisy_bins = noisy_bins.astype(int).tolist()
         
         return {
             'noisy_bins': noisy_bins,
@@ -148,6 +491,264 @@ class DifferentialPrivacyService:
             'num_bins': num_bins
         }
 
+    @timed('noise')
+    def noisy_group_counts(self, groups: List[str], counts) -> Dict[str, Any]:
+        """
+        Comptages par groupe avec DP : un seul tirage vectorisé. Les groupes
+        sont disjoints (composition parallèle) : epsilon est consommé une fois.
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        noisy = np.maximum(0, np.round(self.add_laplace_noise(counts, 1.0))).astype(np.int64)
+        
+        return {
+            'groups': {
+                group: {
+                    'noisy_result': int(noisy[i]),
+                    'true_result': int(counts[i]),
+                    'noise_added': int(noisy[i] - counts[i]),
+                }
+                for i, group in enumerate(groups)
+            },
+            'epsilon_used': self.epsilon,
+            'mechanism': 'Laplace',
+            'sensitivity': 1.0,
+            'composition': 'parallel'
+        }
+    
+    @timed('noise')
+    def noisy_group_sums(self, groups: List[str], sums,
+                         bounds: Tuple[float, float]) -> Dict[str, Any]:
+        """Sommes (valeurs clippées à bounds) par groupe avec DP, un seul tirage vectorisé"""
+        lower, upper = bounds
+        sums = np.asarray(sums, dtype=np.float64)
+        sensitivity = max(abs(lower), abs(upper))
+        noisy = self.add_laplace_noise(sums, sensitivity)
+        
+        return {
+            'groups': {
+                group: {
+                    'noisy_result': round(float(noisy[i]), 2),
+                    'true_result': round(float(sums[i]), 2),
+                    'noise_added': round(float(noisy[i] - sums[i]), 2),
+                }
+                for i, group in enumerate(groups)
+            },
+            'epsilon_used': self.epsilon,
+            'mechanism': 'Laplace',
+            'sensitivity': sensitivity,
+            'bounds': bounds,
+            'composition': 'parallel'
+        }
+    
+    @timed('noise')
+    def noisy_group_means(self, groups: List[str], counts, sums,
+                          bounds: Tuple[float, float]) -> Dict[str, Any]:
+        """
+        Moyennes par groupe avec DP : count et somme clippée bruités
+        (epsilon / 2 chacun) en deux tirages vectorisés, composition parallèle.
+        """
+        lower, upper = bounds
+        counts = np.asarray(counts, dtype=np.float64)
+        sums = np.asarray(sums, dtype=np.float64)
+        half = DifferentialPrivacyService(epsilon=self.epsilon / 2, delta=self.delta)
+        
+        noisy_counts = np.maximum(1.0, half.add_laplace_noise(counts, 1.0))
+        noisy_sums = half.add_laplace_noise(sums, max(abs(lower), abs(upper)))
+        noisy_means = np.clip(noisy_sums / noisy_counts, lower, upper)
+        
+        groups_result = {}
+        for i, group in enumerate(groups):
+            true_mean = float(sums[i] / counts[i]) if counts[i] else None
+            groups_result[group] = {
+                'noisy_result': round(float(noisy_means[i]), 2),
+                'true_result': true_mean,
+                'noise_added': round(float(noisy_means[i]) - true_mean, 2) if counts[i] else None,
+                'noisy_count': int(round(noisy_counts[i])),
+                'count': int(counts[i]),
+            }
+        
+        return {
+            'groups': groups_result,
+            'epsilon_used': self.epsilon,
+            'mechanism': 'Laplace (Composition)',
+            'bounds': bounds,
+            'composition': 'parallel'
+        }
+
+    @timed('noise')
+    def noisy_crosstab(self, table, labels: Dict[str, List[str]], mechanism: str = 'laplace',
+                       consistent: bool = False) -> Dict[str, Any]:
+        """
+        Table de contingence avec DP : toutes les cellules bruitées en un seul
+        tirage (une personne est dans une seule cellule : sensibilité 1).
+
+        consistent : post-traitement (sans coût epsilon) -- cellules négatives
+        ramenées à 0, puis remise à l'échelle et arrondi pour conserver le total
+        bruité. Les marges sont toujours dérivées de la table publiée.
+        """
+        table = np.asarray(table, dtype=np.int64)
+        sensitivity = 1.0
+        if mechanism == 'gaussian':
+            noisy = self.add_gaussian_noise(table, sensitivity)
+        else:
+            noisy = self.add_laplace_noise(table, sensitivity)
+        
+        if consistent:
+            noisy_total = max(0.0, float(noisy.sum()))
+            noisy = np.maximum(noisy, 0.0)
+            if noisy.sum() > 0:
+                noisy = noisy * (noisy_total / noisy.sum())
+            noisy = _round_preserving_total(noisy)
+        else:
+            noisy = np.round(noisy).astype(np.int64)
+        
+        dimensions = list(labels)
+        margins = {}
+        for axis, dimension in enumerate(dimensions):
+            other_axes = tuple(a for a in range(noisy.ndim) if a != axis)
+            totals = noisy.sum(axis=other_axes)
+            margins[dimension] = dict(zip(labels[dimension], totals.astype(int).tolist()))
+        
+        return {
+            'dimensions': dimensions,
+            'labels': labels,
+            'noisy_table': noisy.astype(int).tolist(),
+            'true_table': table.tolist(),
+            'margins': margins,
+            'noisy_total': int(noisy.sum()),
+            'true_total': int(table.sum()),
+            'epsilon_used': self.epsilon,
+            'delta_used': self.delta if mechanism == 'gaussian' else 0,
+            'mechanism': 'Gaussian' if mechanism == 'gaussian' else 'Laplace',
+            'sensitivity': sensitivity,
+            'consistent': consistent
+        }
+
+    @timed('noise')
+    def sparse_vector(self, counts, threshold: float, max_positives: int) -> Dict[str, Any]:
+        """
+        Sparse vector technique sur des comptages (sensibilité 1), en une passe
+        vectorisée : seuil bruité Lap(1/eps1), comptages bruités Lap(2c/eps2).
+        Les candidats sont parcourus dans l'ordre et la recherche s'arrête au
+        c-ième dépassement ; epsilon = eps1 + eps2 quel que soit le nombre de
+        candidats (répartition eps1:eps2 = 1:(2c)^(2/3)).
+        """
+        counts = np.asarray(counts, dtype=np.int64).ravel()
+        ratio = (2 * max_positives) ** (2 / 3)
+        epsilon_threshold = self.epsilon / (1 + ratio)
+        epsilon_queries = self.epsilon - epsilon_threshold
+        query_sensitivity = 2.0 * max_positives
+        
+        noisy_threshold = DifferentialPrivacyService(epsilon_threshold).add_laplace_noise(
+            float(threshold), 1.0
+        )
+        noisy_counts = DifferentialPrivacyService(epsilon_queries).add_laplace_noise(
+            counts, query_sensitivity
+        )
+        
+        above = np.flatnonzero(noisy_counts >= noisy_threshold)
+        halted = len(above) >= max_positives
+        positives = above[:max_positives]
+        evaluated = int(positives[-1]) + 1 if halted else len(counts)
+        
+        return {
+            'positives': positives.tolist(),
+            'true_results': counts[positives].tolist(),
+            'candidates': len(counts),
+            'evaluated': evaluated,
+            'halted': halted,
+            'threshold': threshold,
+            'max_positives': max_positives,
+            'epsilon_used': self.epsilon,
+            'epsilon_threshold': epsilon_threshold,
+            'epsilon_queries': epsilon_queries,
+            'threshold_noise_scale': 1.0 / epsilon_threshold,
+            'query_noise_scale': query_sensitivity / epsilon_queries,
+            'mechanism': 'Sparse vector (Laplace)',
+        }
+
+    @timed('noise')
+    def noisy_range_tree(self, leaf_counts, lower: int, branching: int) -> Dict[str, Any]:
+        """
+        Histogramme hiérarchique avec DP : arbre b-aire de comptages dont les
+        feuilles sont les valeurs entières de la colonne. Une personne compte
+        dans un noeud par niveau (sensibilité = nombre de niveaux) ; tous les
+        noeuds sont bruités en un seul tirage. Toute plage se répond ensuite
+        par range_tree_count, sans nouveau scan ni coût epsilon.
+        """
+        leaf_counts = np.asarray(leaf_counts, dtype=np.int64)
+        height = max(1, int(np.ceil(np.log(len(leaf_counts)) / np.log(branching) - 1e-9)))
+        padded = np.zeros(branching ** height, dtype=np.int64)
+        padded[:len(leaf_counts)] = leaf_counts
+        
+        # Niveau 0 = feuilles, niveau height = racine
+        levels = [padded]
+        for _ in range(height):
+            levels.append(levels[-1].reshape(-1, branching).sum(axis=1))
+        sensitivity = float(len(levels))
+        
+        sizes = np.cumsum([len(level) for level in levels])[:-1]
+        noisy = np.split(self.add_laplace_noise(np.concatenate(levels), sensitivity), sizes)
+        
+        return {
+            'lower': lower,
+            'upper': lower + len(leaf_counts) - 1,
+            'branching': branching,
+            'height': height,
+            'levels': [np.round(level, 3).tolist() for level in noisy],
+            'epsilon_used': self.epsilon,
+            'mechanism': 'Laplace (hierarchical)',
+            'sensitivity': sensitivity,
+            'noise_scale': sensitivity / self.epsilon,
+        }
+
+
+def _round_preserving_total(values: np.ndarray) -> np.ndarray:
+    """Arrondi entier (plus forts restes) qui conserve la somme arrondie du tableau"""
+    floored = np.floor(values)
+    remainder = int(round(values.sum() - floored.sum()))
+    if remainder > 0:
+        fractions = (values - floored).ravel()
+        top = np.argsort(-fractions, kind='stable')[:remainder]
+        flat = floored.ravel()
+        flat[top] += 1
+        floored = flat.reshape(values.shape)
+    return floored.astype(np.int64)
+
+
+def range_tree_count(tree: Dict[str, Any], lower: float, upper: float) -> Tuple[float, int]:
+    """
+    Comptage bruité sur [lower, upper] lu dans un arbre de noisy_range_tree :
+    au plus 2(b-1) noeuds par niveau. Renvoie (comptage, noeuds utilisés).
+    """
+    if lower > tree['upper'] or upper < tree['lower']:
+        # Plage hors du domaine : comptage exact nul, aucun noeud bruité
+        return 0.0, 0
+    
+    branching = tree['branching']
+    start = max(int(np.ceil(lower)), tree['lower']) - tree['lower']
+    stop = min(int(np.floor(upper)), tree['upper']) - tree['lower'] + 1
+    if upper >= tree['upper']:
+        # Feuilles de bourrage (comptage vrai nul) incluses : moins de noeuds à sommer
+        stop = len(tree['levels'][0])
+    total, nodes = 0.0, 0
+    
+    # Intervalle de noeuds [start, stop) remonté niveau par niveau
+    for level in tree['levels']:
+        if start >= stop:
+            break
+        while start < stop and start % branching:
+            total += level[start]
+            start += 1
+            nodes += 1
+        while start < stop and stop % branching:
+            stop -= 1
+            total += level[stop]
+            nodes += 1
+        start //= branching
+        stop //= branching
+    return total, nodes
+
 
 class PolicyEnforcer:
     """Enforcer pour les politiques de privacy"""
@@ -156,17 +757,23 @@ class PolicyEnforcer:
         self.user = user
         self.epsilon_budget = epsilon_budget
     
-    def can_execute_query(self, epsilon_required: float) -> Tuple[bool, str]:
+    def can_execute_query(self, epsilon_required: float, delta_required: float = 0.0) -> Tuple[bool, str]:
         """Vérifier si la requête peut être exécutée"""
         
         # Vérifier si user est actif
         if not self.user.is_active:
             return False, "User account is inactive"
         
-        # Vérifier budget epsilon
-        if not self.epsilon_budget.can_consume(epsilon_required):
-            remaining = self.epsilon_budget.remaining_budget
-            return False, f"Insufficient epsilon budget. Required: {epsilon_required}, Remaining: {remaining}"
+        # Vérifier budget epsilon : le cache (local au process) ne sert qu'à
+        # autoriser vite, un refus est confirmé par une relecture de la base
+        if not self.epsilon_budget.can_consume(epsilon_required, delta_required):
+            self.epsilon_budget.reload()
+        if not self.epsilon_budget.can_consume(epsilon_required, delta_required):
+            if self.epsilon_budget.remaining_budget < epsilon_required:
+                remaining = self.epsilon_budget.remaining_budget
+                return False, f"Insufficient epsilon budget. Required: {epsilon_required}, Remaining: {remaining}"
+            remaining = self.epsilon_budget.remaining_delta
+            return False, f"Insufficient delta budget. Required: {delta_required}, Remaining: {remaining}"
         
         # Vérifier warning threshold
         if self.epsilon_budget.is_warning:
@@ -175,9 +782,9 @@ class PolicyEnforcer:
         
         return True, "Query authorized"
     
-    def consume_budget(self, epsilon_used: float) -> bool:
-        """Consommer le budget epsilon"""
-        return self.epsilon_budget.consume(epsilon_used)
+    def consume_budget(self, epsilon_used: float, delta_used: float = 0.0) -> bool:
+        """Consommer le budget epsilon (et delta)"""
+        return self.epsilon_budget.consume(epsilon_used, delta_used)
     
     def get_status(self) -> Dict[str, Any]:
         """Obtenir le statut du budget"""
@@ -187,6 +794,9 @@ class PolicyEnforcer:
             'total_budget': self.epsilon_budget.total_budget,
             'consumed_budget': self.epsilon_budget.consumed_budget,
             'remaining_budget': self.epsilon_budget.remaining_budget,
+            'total_delta': self.epsilon_budget.total_delta,
+            'consumed_delta': self.epsilon_budget.consumed_delta,
+            'remaining_delta': self.epsilon_budget.remaining_delta,
             'is_warning': self.epsilon_budget.is_warning,
             'is_depleted': self.epsilon_budget.is_depleted,
             'last_reset': self.epsilon_budget.last_reset,
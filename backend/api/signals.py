@@ -0,0 +1,58 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from .models import Patient, EpsilonBudget, DataVersion
+from .snapshot import invalidate_snapshot
+from .replay_cache import clear_released_answers
+from .count_cube import count_cube
+from .prefix_index import prefix_indexes
+from .continual import patient_ingested
+
+
+# Index en mémoire mis à jour à chaque insertion / suppression de patient
+MAINTAINED_INDEXES = [count_cube, *prefix_indexes.values()]
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def patient_changed(sender, instance, **kwargs):
+    """Invalider le snapshot colonnaire et les réponses rejouables quand les données patients changent"""
+    invalidate_snapshot()
+    clear_released_answers()
+
+
+@receiver(post_save, sender=Patient)
+def patient_saved(sender, instance, created, **kwargs):
+    """Insertion : mise à jour incrémentale des index ; modification : reconstruction"""
+    # Dans la transaction de save() : la nouvelle version est validée avec la ligne
+    version = DataVersion.bump()
+    if created:
+        transaction.on_commit(lambda: _apply(instance, +1, version))
+        patient_ingested()
+    else:
+        for index in MAINTAINED_INDEXES:
+            index.invalidate()
+
+
+@receiver(post_delete, sender=Patient)
+def patient_deleted(sender, instance, **kwargs):
+    version = DataVersion.bump()
+    transaction.on_commit(lambda: _apply(instance, -1, version))
+
+
+def _apply(instance, sign, version):
+    # Après validation : une écriture annulée ne touche pas les index
+    for index in MAINTAINED_INDEXES:
+        index.apply(instance, sign, version)
+
+
+@receiver(post_save, sender=EpsilonBudget)
+def epsilon_budget_saved(sender, instance, **kwargs):
+    """Garder le cache des budgets cohérent avec la base (resets, admin)"""
+    instance.write_to_cache()
+
+
+@receiver(post_delete, sender=EpsilonBudget)
+def epsilon_budget_deleted(sender, instance, **kwargs):
+    EpsilonBudget.evict_from_cache(instance.user_id)
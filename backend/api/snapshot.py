@@ -0,0 +1,204 @@
+import logging
+import threading
+import time
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from django.conf import settings
+from django.db import connection
+
+from .bitmap_index import BitmapIndex
+
+
+logger = logging.getLogger(__name__)
+
+# Colonnes numériques et leur type NumPy
+NUMERIC_COLUMNS = {
+    'age': np.int16,
+    'weight': np.float64,
+    'height': np.float64,
+    'blood_pressure_systolic': np.int16,
+    'blood_pressure_diastolic': np.int16,
+    'treatment_cost': np.float64,
+}
+
+# Colonnes catégorielles (encodées en codes + catégories)
+CATEGORICAL_COLUMNS = ('gender', 'blood_type', 'zip_code', 'diagnosis')
+
+DATE_COLUMNS = ('admission_date',)
+
+
+class PatientSnapshot:
+    """Snapshot colonnaire en lecture seule de la table patients (un tableau NumPy par colonne)"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], categories: Dict[str, np.ndarray],
+                 version: int):
+        self.columns = columns
+        self.categories = categories
+        self.version = version
+        self.built_at = time.monotonic()
+        self.size = len(next(iter(columns.values()))) if columns else 0
+        self.bitmap_index = None
+        self._sorted = {}
+        self._category_codes = {
+            column: {value: code for code, value in enumerate(values)}
+            for column, values in categories.items()
+        }
+
+        for array in list(columns.values()) + list(categories.values()):
+            array.flags.writeable = False
+
+    @classmethod
+    def build(cls, version: int) -> 'PatientSnapshot':
+        """Construire le snapshot en une seule lecture de la table"""
+        from .models import Patient
+
+        fields = list(NUMERIC_COLUMNS) + list(CATEGORICAL_COLUMNS) + list(DATE_COLUMNS)
+        raw = {field: [] for field in fields}
+
+        rows = Patient.objects.order_by('pk').values_list(*fields)
+        for row in rows.iterator(chunk_size=10000):
+            for field, value in zip(fields, row):
+                raw[field].append(value)
+
+        columns = {}
+        categories = {}
+
+        for column, dtype in NUMERIC_COLUMNS.items():
+            columns[column] = np.array([float(v) for v in raw[column]], dtype=dtype)
+
+        for column in CATEGORICAL_COLUMNS:
+            values, codes = np.unique(np.array(raw[column], dtype=object).astype(str),
+                                      return_inverse=True)
+            categories[column] = values
+            columns[column] = codes.astype(np.int32)
+
+        for column in DATE_COLUMNS:
+            columns[column] = np.array(raw[column], dtype='datetime64[D]')
+
+        snapshot = cls(columns, categories, version)
+        snapshot.bitmap_index = BitmapIndex(snapshot)
+        return snapshot
+
+    def is_expired(self) -> bool:
+        ttl = getattr(settings, 'DP_SNAPSHOT_TTL', 300)
+        return ttl > 0 and time.monotonic() - self.built_at > ttl
+
+    def category_code(self, column: str, value: Any) -> int:
+        """Code d'une catégorie (-1 si absente du snapshot)"""
+        return self._category_codes[column].get(str(value), -1)
+
+    def mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Masque booléen vectorisé équivalent à apply_filters"""
+        from .filters import compile_filters
+        return compile_filters(filters).mask(self)
+
+    def values(self, column: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Valeurs d'une colonne numérique (filtrées par le masque)"""
+        values = self.columns[column]
+        if mask is not None:
+            values = values[mask]
+        return values.astype(np.float64)
+
+    def sorted_index(self, column: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Index trié par colonne (ordre des lignes, valeurs triées), construit à la demande"""
+        if column not in self._sorted:
+            order = np.argsort(self.columns[column], kind='stable')
+            sorted_values = self.columns[column][order].astype(np.float64)
+            sorted_values.flags.writeable = False
+            self._sorted[column] = (order, sorted_values)
+        return self._sorted[column]
+
+    def quantiles(self, column: str, quantiles: List[float],
+                  mask: Optional[np.ndarray] = None) -> Tuple[Dict[float, float], int]:
+        """
+        Quantiles (interpolation linéaire, comme np.quantile) lus dans l'index
+        trié : aucune copie ni tri des valeurs de la cohorte.
+        """
+        order, sorted_values = self.sorted_index(column)
+        selected = None if mask is None else mask[order]
+        count = self.size if selected is None else int(np.count_nonzero(selected))
+        if count == 0:
+            return {}, 0
+
+        rank_to_position = self._rank_lookup(selected)
+        results = {}
+        for q in quantiles:
+            position = q * (count - 1)
+            low = int(np.floor(position))
+            value = sorted_values[rank_to_position(low)]
+            if position > low:
+                upper_value = sorted_values[rank_to_position(low + 1)]
+                value = value + (upper_value - value) * (position - low)
+            results[q] = float(value)
+        return results, count
+
+    @staticmethod
+    def _rank_lookup(selected: Optional[np.ndarray], block: int = 65536):
+        """Position du k-ième élément sélectionné, via des compteurs par bloc (mémoire O(n / block))"""
+        if selected is None:
+            return lambda rank: rank
+
+        starts = np.arange(0, len(selected), block)
+        cumulative = np.cumsum(np.add.reduceat(selected, starts, dtype=np.int64))
+
+        def lookup(rank):
+            index = int(np.searchsorted(cumulative, rank, side='right'))
+            before = int(cumulative[index - 1]) if index else 0
+            start = int(starts[index])
+            return start + int(np.flatnonzero(selected[start:start + block])[rank - before])
+        return lookup
+
+
+_lock = threading.Lock()
+_snapshot: Optional[PatientSnapshot] = None
+_building = False
+
+
+def invalidate_snapshot():
+    """Écriture locale signalée : le snapshot courant n'est plus servi"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+def _rebuild():
+    global _snapshot, _building
+    from .models import DataVersion
+    try:
+        version = DataVersion.current()
+        snapshot = PatientSnapshot.build(version)
+        # Écriture validée pendant la lecture : version du snapshot incertaine, il est jeté
+        if DataVersion.current() == version:
+            with _lock:
+                _snapshot = snapshot
+    except Exception:
+        logger.exception('Patient snapshot build failed')
+    finally:
+        with _lock:
+            _building = False
+        connection.close()
+
+
+def get_snapshot(version: int) -> Optional[PatientSnapshot]:
+    """
+    Snapshot construit à la version de données demandée (DataVersion), ou
+    None (fallback ORM) : aucun snapshot, ou snapshot d'une autre version,
+    auquel cas une reconstruction est lancée en arrière-plan.
+
+    Un snapshot plus vieux que DP_SNAPSHOT_TTL mais toujours à la bonne
+    version reste servi pendant sa reconstruction (écritures qui n'incrémentent
+    pas la version, ex. SQL brut).
+    """
+    global _building
+    if not getattr(settings, 'DP_SNAPSHOT_ENABLED', True):
+        return None
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is not None and snapshot.version != version:
+            snapshot = None
+        if (snapshot is None or snapshot.is_expired()) and not _building:
+            _building = True
+            threading.Thread(target=_rebuild, daemon=True).start()
+
+    return snapshot
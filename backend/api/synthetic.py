@@ -0,0 +1,146 @@
+import json
+import re
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .cohort import Cohort
+from .services import DifferentialPrivacyService, DEFAULT_COLUMN_BOUNDS, DIMENSION_DOMAINS, time_buckets
+from .models import DataVersion
+
+
+# Cube de contingence bruité (distribution jointe) et marges numériques bruitées
+CUBE_DIMENSIONS = ['gender', 'blood_type', 'age_decade']
+MARGINAL_COLUMNS = ['weight', 'height', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+                    'treatment_cost']
+INTEGER_COLUMNS = {'blood_pressure_systolic', 'blood_pressure_diastolic'}
+
+DATASET_NAME = re.compile(r'^patients_\d{8}T\d{6}(_[0-9a-f]{6})?$')
+
+
+def synthetic_directory() -> Path:
+    return Path(getattr(settings, 'SYNTHETIC_DATA_DIR', settings.BASE_DIR / 'synthetic'))
+
+
+def _sample_bins(rng: np.random.Generator, noisy_counts, size: int) -> np.ndarray:
+    """Indices tirés proportionnellement aux comptages bruités (négatifs ramenés à 0)"""
+    weights = np.maximum(np.asarray(noisy_counts, dtype=np.float64).ravel(), 0)
+    if weights.sum() == 0:
+        weights = np.ones_like(weights)
+    return rng.choice(len(weights), size=size, p=weights / weights.sum())
+
+
+def build_synthetic_dataset(epsilon: float, rows: Optional[int] = None, num_bins: int = 20,
+                            months: int = 24, seed: Optional[int] = None
+                            ) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Table patients synthétique DP, en une lecture par marge et un seul epsilon :
+    - epsilon / 2 : cube gender x blood_type x age_decade (cohérent, total conservé)
+    - epsilon / 2 : réparti entre les histogrammes des colonnes numériques et
+      l'histogramme mensuel de admission_date (composition séquentielle)
+    Les colonnes numériques sont tirées indépendamment de leur marge ; zip_code
+    et diagnosis (texte libre, domaine non déclaré) ne sont pas synthétisés.
+    """
+    rng = np.random.default_rng(seed)
+    # Version lue dans la base avant les agrégations (partagée par tous les process)
+    version = DataVersion.current()
+    cohort = Cohort({}, version=version)
+    epsilon_cube = epsilon / 2
+    epsilon_marginal = (epsilon - epsilon_cube) / (len(MARGINAL_COLUMNS) + 1)
+
+    # Cube de contingence : nombre de lignes = total bruité (sauf rows déclaré)
+    labels = {dimension: DIMENSION_DOMAINS[dimension] for dimension in CUBE_DIMENSIONS}
+    cube = DifferentialPrivacyService(epsilon=epsilon_cube).noisy_crosstab(
+        cohort.crosstab(CUBE_DIMENSIONS), labels, consistent=True
+    )
+    noisy_cube = np.array(cube['noisy_table'], dtype=np.int64)
+    rows = rows or max(1, int(noisy_cube.sum()))
+
+    cells = np.unravel_index(_sample_bins(rng, noisy_cube, rows), noisy_cube.shape)
+    columns = {
+        dimension: np.array(labels[dimension])[cell]
+        for dimension, cell in zip(CUBE_DIMENSIONS[:2], cells[:2])
+    }
+    columns['age'] = np.minimum(cells[2] * 10 + rng.integers(0, 10, size=rows), 120).astype(np.int16)
+    released = {'cube': noisy_cube}
+
+    marginal_service = DifferentialPrivacyService(epsilon=epsilon_marginal)
+    for column in MARGINAL_COLUMNS:
+        lower, upper = DEFAULT_COLUMN_BOUNDS[column]
+        noisy = marginal_service.noisy_histogram(cohort.histogram(column, lower, upper, num_bins),
+                                                 num_bins)['noisy_bins']
+        width = (upper - lower) / num_bins
+        values = lower + (_sample_bins(rng, noisy, rows) + rng.random(rows)) * width
+        if column in INTEGER_COLUMNS:
+            columns[column] = np.floor(values).astype(np.int16)
+        else:
+            columns[column] = np.round(values, 2 if column == 'treatment_cost' else 1)
+        released[f'{column}_histogram'] = np.array(noisy, dtype=np.int64)
+
+    # Admissions par mois sur la fenêtre déclarée, jour tiré uniformément dans le mois
+    today = date.today()
+    start = (np.datetime64(today, 'M') - (months - 1)).astype('datetime64[D]')
+    buckets = time_buckets('month', str(start), today.isoformat())
+    counts, _ = cohort.time_series('month', str(start), today.isoformat())
+    noisy = marginal_service.noisy_histogram(counts, len(buckets))['noisy_bins']
+    month = _sample_bins(rng, noisy, rows)
+    month_days = ((buckets.astype('datetime64[M]') + 1).astype('datetime64[D]') - buckets).astype(np.int64)
+    offsets = np.floor(rng.random(rows) * month_days[month]).astype('timedelta64[D]')
+    columns['admission_date'] = buckets[month] + offsets
+    released['admission_month_histogram'] = np.array(noisy, dtype=np.int64)
+
+    metadata = {
+        'epsilon': epsilon,
+        'allocation': {
+            'cube': epsilon_cube,
+            **{column: epsilon_marginal for column in MARGINAL_COLUMNS},
+            'admission_date': epsilon_marginal,
+        },
+        'rows': rows,
+        'columns': list(columns),
+        'cube_dimensions': CUBE_DIMENSIONS,
+        'num_bins': num_bins,
+        'months': months,
+        'admission_window': [str(start), today.isoformat()],
+        'data_version': version,
+        'mechanism': 'Laplace (noisy cube + marginals)',
+    }
+    return {**columns, **{f'released_{key}': value for key, value in released.items()}}, metadata
+
+
+def save_synthetic_dataset(arrays: Dict[str, np.ndarray], metadata: Dict[str, Any]) -> str:
+    """Écrire le fichier colonnaire (.npz compressé) et ses métadonnées (.json)"""
+    directory = synthetic_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    created_at = timezone.now()
+    # Suffixe aléatoire : deux publications dans la même seconde ne s'écrasent pas
+    name = f'patients_{created_at:%Y%m%dT%H%M%S}_{uuid.uuid4().hex[:6]}'
+
+    np.savez_compressed(directory / f'{name}.npz', **arrays)
+    metadata = {'name': name, 'created_at': created_at.isoformat(), **metadata}
+    (directory / f'{name}.json').write_text(json.dumps(metadata, indent=2))
+    return name
+
+
+def list_synthetic_datasets() -> List[Dict[str, Any]]:
+    """Métadonnées des jeux synthétiques publiés, du plus récent au plus ancien"""
+    directory = synthetic_directory()
+    if not directory.is_dir():
+        return []
+    datasets = []
+    for path in sorted(directory.glob('patients_*.json'), reverse=True):
+        if path.with_suffix('.npz').exists():
+            datasets.append(json.loads(path.read_text()))
+    return datasets
+
+
+def synthetic_dataset_path(name: str) -> Optional[Path]:
+    """Chemin du fichier .npz d'un jeu publié (None si nom invalide ou absent)"""
+    if not DATASET_NAME.match(name):
+        return None
+    path = synthetic_directory() / f'{name}.npz'
+    return path if path.exists() else None
@@ -1,3 +1,302 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .audit import query_log_writer
+from .cohort import Cohort
+from .count_cube import CountCube
+from .filters import compile_filters
+from .models import Patient, User, EpsilonBudget, DataVersion, RangeTree
+from .prefix_index import PrefixSumIndex
+from .replay_cache import ANSWER_CACHE_ALIAS
+from .services import DifferentialPrivacyService, PolicyEnforcer, range_tree_count
+from .snapshot import PatientSnapshot
+
+
+def create_patients(n=200, seed=0):
+    """Patients déterministes, insérés en bulk comme les chargeurs (une incrémentation de version)"""
+    rng = np.random.default_rng(seed)
+    genders = [code for code, _ in Patient.GENDER_CHOICES]
+    blood_types = [code for code, _ in Patient.BLOOD_TYPES]
+    zip_codes = ['75001', '75002', '69001', '13001']
+    diagnoses = ['Hypertension', 'Diabetes', 'Asthma']
+    Patient.objects.bulk_create([
+        Patient(
+            age=int(rng.integers(0, 101)),
+            gender=genders[rng.integers(len(genders))],
+            zip_code=zip_codes[rng.integers(len(zip_codes))],
+            blood_type=blood_types[rng.integers(len(blood_types))],
+            weight=round(float(rng.uniform(40, 120)), 1),
+            height=round(float(rng.uniform(140, 200)), 1),
+            blood_pressure_systolic=int(rng.integers(90, 181)),
+            blood_pressure_diastolic=int(rng.integers(60, 111)),
+            treatment_cost=Decimal(f'{rng.uniform(100, 5000):.2f}'),
+            diagnosis=diagnoses[rng.integers(len(diagnoses))],
+            admission_date=date(2023, 1, 1) + timedelta(days=int(rng.integers(365))),
+        )
+        for _ in range(n)
+    ])
+    DataVersion.bump()
+
+
+# Logs écrits de façon synchrone et aucun build en arrière-plan : les tests
+# construisent snapshot et index eux-mêmes quand ils en ont besoin
+@override_settings(QUERY_LOG_ASYNC=False, DP_SNAPSHOT_ENABLED=False, DP_INDEXES_ENABLED=False,
+                   CONTINUAL_COUNTER_ENABLED=False, PROFILER_ENABLED=False)
+class DPTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_patients()
+        cls.user = User.objects.create_user('analyst', password='secret', role='analyst')
+
+    def setUp(self):
+        # Le writer est configuré à l'import : QUERY_LOG_ASYNC appliqué à l'instance
+        patcher = mock.patch.object(query_log_writer, 'enabled', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        caches[ANSWER_CACHE_ALIAS].clear()
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def set_budget(self, total, consumed=0.0):
+        EpsilonBudget.objects.update_or_create(
+            user=self.user, defaults={'total_budget': total, 'consumed_budget': consumed}
+        )
+        EpsilonBudget.evict_from_cache(self.user.pk)
+
+    def consumed(self):
+        return EpsilonBudget.objects.get(user=self.user).consumed_budget
+
+
+class EpsilonBudgetTests(DPTestCase):
+
+    def test_conditional_update_refuses_overspending(self):
+        """Le débit est un UPDATE conditionnel : deux vues périmées ne dépensent pas le même budget"""
+        self.set_budget(1.0)
+        first = EpsilonBudget.for_user(self.user, fresh=True)
+        second = EpsilonBudget.for_user(self.user, fresh=True)
+
+        self.assertTrue(first.consume(0.6))
+        # second croit encore disposer de 1.0
+        self.assertTrue(second.can_consume(0.6))
+        self.assertFalse(second.consume(0.6))
+        self.assertAlmostEqual(self.consumed(), 0.6)
+        # Refus : l'instance est resynchronisée avec la base
+        self.assertAlmostEqual(second.consumed_budget, 0.6)
+
+        self.assertTrue(second.consume(0.4))
+        self.assertAlmostEqual(self.consumed(), 1.0)
+
+    def test_cached_refusal_is_rechecked_against_database(self):
+        """Un refus lu dans le cache (local au process) est confirmé par une relecture de la base"""
+        self.set_budget(1.0)
+        budget = EpsilonBudget.for_user(self.user)
+        self.assertTrue(budget.consume(1.0))
+
+        # Reset effectué par un autre process : le cache local est périmé
+        EpsilonBudget.objects.filter(user=self.user).update(consumed_budget=0.0)
+        stale = EpsilonBudget.for_user(self.user)
+        self.assertFalse(stale.can_consume(0.5))
+
+        allowed, _ = PolicyEnforcer(self.user, stale).can_execute_query(0.5)
+        self.assertTrue(allowed)
+        self.assertAlmostEqual(stale.remaining_budget, 1.0)
+
+    def test_refusal_confirmed_by_database(self):
+        self.set_budget(1.0, consumed=0.9)
+        allowed, message = PolicyEnforcer(self.user, EpsilonBudget.for_user(self.user)).can_execute_query(0.5)
+        self.assertFalse(allowed)
+        self.assertIn('Insufficient epsilon budget', message)
+
+
+class ReplayTests(DPTestCase):
+
+    def test_replayed_query_costs_no_epsilon(self):
+        self.set_budget(10.0)
+        query = {'epsilon': 0.5, 'filters': {'age_min': 30, 'gender': 'F'}}
+
+        first = self.client.post('/api/query/count/', query, format='json')
+        self.assertEqual(first.status_code, 200)
+        self.assertAlmostEqual(self.consumed(), 0.5)
+
+        second = self.client.post('/api/query/count/', query, format='json')
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.data['replayed'])
+        self.assertEqual(second.data['epsilon_used'], 0)
+        self.assertEqual(second.data['result'], first.data['result'])
+        self.assertAlmostEqual(self.consumed(), 0.5)
+
+    def test_new_data_version_is_not_replayed(self):
+        self.set_budget(10.0)
+        query = {'epsilon': 0.5, 'filters': {'age_min': 30}}
+        self.client.post('/api/query/count/', query, format='json')
+
+        create_patients(n=5, seed=1)
+        response = self.client.post('/api/query/count/', query, format='json')
+        self.assertNotIn('replayed', response.data)
+        self.assertAlmostEqual(self.consumed(), 1.0)
+
+    def test_batch_charges_once_and_skips_replayed_specs(self):
+        self.set_budget(10.0)
+        queries = [
+            {'type': 'count', 'epsilon': 0.5, 'filters': {'age_max': 40}},
+            {'type': 'mean', 'epsilon': 0.3, 'columns': ['weight'], 'filters': {'age_max': 40}},
+        ]
+        with mock.patch.object(EpsilonBudget, 'consume', autospec=True,
+                               side_effect=EpsilonBudget.consume) as consume:
+            response = self.client.post('/api/query/batch/', {'queries': queries}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(consume.call_count, 1)
+        self.assertAlmostEqual(self.consumed(), 0.8)
+
+        queries.append({'type': 'count', 'epsilon': 0.2, 'filters': {'gender': 'M'}})
+        response = self.client.post('/api/query/batch/', {'queries': queries}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['replayed'] for r in results], [True, True, False])
+        self.assertEqual([r['epsilon_used'] for r in results], [0, 0, 0.2])
+        self.assertAlmostEqual(self.consumed(), 1.0)
+
+    def test_batch_over_budget_charges_nothing(self):
+        self.set_budget(1.0)
+        queries = [
+            {'type': 'count', 'epsilon': 0.6},
+            {'type': 'count', 'epsilon': 0.6, 'filters': {'gender': 'F'}},
+        ]
+        response = self.client.post('/api/query/batch/', {'queries': queries}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertAlmostEqual(self.consumed(), 0.0)
+
+
+class CohortConsistencyTests(DPTestCase):
+    """Snapshot, cube, index et ORM doivent donner les mêmes comptages vrais"""
+
+    FILTERS = [
+        {},
+        {'age_min': 30, 'age_max': 60},
+        {'age_min': 20.5, 'gender': 'F', 'blood_type': 'O+'},
+        {'zip_code': '75001', 'age_max': 50},
+        {'blood_pressure_systolic_min': 120, 'blood_pressure_systolic_max': 150},
+        {'gender': ['M', 'O']},
+        {'or': [{'blood_type': 'A+'}, {'age_max': 18}]},
+        {'and': [{'zip_code': ['75001', '69001']}, {'not': {'age_min': 40}}]},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.version = DataVersion.current()
+        self.snapshot = PatientSnapshot.build(self.version)
+        self.cube = CountCube.build()
+
+    def test_counts_agree(self):
+        for filters in self.FILTERS:
+            with self.subTest(filters=filters):
+                expected = Patient.objects.filter(compile_filters(filters).q).count()
+                self.assertEqual(Cohort(filters, version=self.version).count(), expected)
+                in_memory = Cohort(filters, snapshot=self.snapshot, version=self.version)
+                self.assertEqual(in_memory.count(), expected)
+                self.assertEqual(int(np.count_nonzero(in_memory.mask)), expected)
+
+                plan = compile_filters(filters)
+                if plan.simple is not None and self.cube.supports(plan.simple):
+                    self.assertEqual(self.cube.count(plan.simple), expected)
+                if self.snapshot.bitmap_index.supports(plan.node):
+                    self.assertEqual(self.snapshot.bitmap_index.count(plan.node), expected)
+
+    def test_indexes_answer_through_cohort(self):
+        """Cube et sommes cumulées servis par Cohort une fois construits à la version courante"""
+        index = PrefixSumIndex.build('age')
+        with mock.patch('api.cohort.count_cube.get', return_value=self.cube), \
+                mock.patch('api.cohort.get_prefix_index', return_value=index):
+            filters = {'age_min': 30, 'age_max': 60}
+            expected = Patient.objects.filter(age__gte=30, age__lte=60).count()
+            self.assertEqual(Cohort(filters, version=self.version).count(), expected)
+
+        stats = index.sufficient_stats(filters, ['weight'])
+        orm = Cohort(filters, version=self.version).sufficient_stats(['weight'])
+        self.assertEqual(stats['count'], orm['count'])
+        self.assertAlmostEqual(stats['columns']['weight']['sum'], orm['columns']['weight']['sum'], places=6)
+
+    def test_sufficient_stats_agree(self):
+        filters = {'gender': 'F', 'age_min': 25}
+        orm = Cohort(filters, version=self.version).sufficient_stats(['weight', 'age'])
+        memory = Cohort(filters, snapshot=self.snapshot, version=self.version).sufficient_stats(['weight', 'age'])
+        self.assertEqual(memory['count'], orm['count'])
+        for column in ('weight', 'age'):
+            self.assertAlmostEqual(memory['columns'][column]['sum'], orm['columns'][column]['sum'], places=6)
+            self.assertAlmostEqual(memory['columns'][column]['sum_sq'], orm['columns'][column]['sum_sq'],
+                                   places=4)
+
+    def test_histogram_agrees(self):
+        filters = {'blood_type': 'A+'}
+        orm = Cohort(filters, version=self.version).histogram('age', 0, 100, 10)
+        memory = Cohort(filters, snapshot=self.snapshot, version=self.version).histogram('age', 0, 100, 10)
+        self.assertEqual(memory, orm)
+
+
+class SparseVectorTests(TestCase):
+
+    def test_halts_after_max_positives(self):
+        counts = np.full(50, 1000)
+        result = DifferentialPrivacyService(epsilon=1.0).sparse_vector(counts, threshold=10, max_positives=3)
+        self.assertTrue(result['halted'])
+        self.assertEqual(len(result['positives']), 3)
+        self.assertEqual(result['evaluated'], result['positives'][-1] + 1)
+        self.assertAlmostEqual(result['epsilon_threshold'] + result['epsilon_queries'], 1.0)
+
+    def test_scans_all_candidates_without_halting(self):
+        counts = np.zeros(20)
+        result = DifferentialPrivacyService(epsilon=1.0).sparse_vector(counts, threshold=1e6, max_positives=3)
+        self.assertFalse(result['halted'])
+        self.assertEqual(result['positives'], [])
+        self.assertEqual(result['evaluated'], 20)
+
+
+class RangeTreeTests(DPTestCase):
+
+    def exact_tree(self, leaves, lower=0, branching=4):
+        """Arbre de noisy_range_tree sans bruit : chaque noeud est le comptage vrai"""
+        with mock.patch.object(DifferentialPrivacyService, 'add_laplace_noise',
+                               lambda self, values, sensitivity: np.asarray(values, dtype=float)):
+            return DifferentialPrivacyService(epsilon=1.0).noisy_range_tree(leaves, lower, branching)
+
+    def test_decomposition_matches_leaf_sums(self):
+        leaves = np.random.default_rng(0).integers(0, 20, size=37)
+        for branching in (2, 3, 4):
+            tree = self.exact_tree(leaves, lower=10, branching=branching)
+            for start in range(len(leaves)):
+                for stop in range(start, len(leaves)):
+                    total, nodes = range_tree_count(tree, 10 + start, 10 + stop)
+                    self.assertEqual(total, leaves[start:stop + 1].sum())
+                    # Au plus 2(b-1) noeuds par niveau
+                    self.assertLessEqual(nodes, 2 * (branching - 1) * len(tree['levels']))
+
+    def test_partial_and_outside_ranges(self):
+        leaves = np.arange(1, 11)
+        tree = self.exact_tree(leaves, lower=0)
+        self.assertEqual(range_tree_count(tree, -5, 2)[0], leaves[:3].sum())
+        self.assertEqual(range_tree_count(tree, 2.5, 4.5)[0], leaves[3:5].sum())
+        self.assertEqual(range_tree_count(tree, 20, 30), (0.0, 0))
+        self.assertEqual(range_tree_count(tree, -10, -1), (0.0, 0))
+
+    def test_tree_persisted_only_after_charge(self):
+        self.set_budget(1.0)
+        # Débit concurrent entre l'autorisation et le débit : l'arbre calculé n'est pas publié
+        with mock.patch.object(PolicyEnforcer, 'consume_budget', return_value=False):
+            response = self.client.post('/api/query/range-tree/', {'epsilon': 0.5, 'column': 'age'},
+                                        format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(RangeTree.objects.exists())
+
+        response = self.client.post('/api/query/range-tree/', {'epsilon': 0.5, 'column': 'age'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RangeTree.objects.get().data_version, DataVersion.current())
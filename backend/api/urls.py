@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
 router.register(r'patients', views.PatientViewSet, basename='patient')
@@ -19,6 +19,20 @@ urlpatterns = [
     path('query/sum/', views.query_sum, name='query-sum'),
     path('query/median/', views.query_median, name='query-median'),
     path('query/histogram/', views.query_histogram, name='query-histogram'),
+    path('query/groupby/', views.query_groupby, name='query-groupby'),
+    path('query/crosstab/', views.query_crosstab, name='query-crosstab'),
+    path('query/timeseries/', views.query_timeseries, name='query-timeseries'),
+    path('query/threshold/', views.query_threshold, name='query-threshold'),
+    path('query/range-tree/', views.query_range_tree, name='query-range-tree'),
+    path('query/range-tree/ranges/', views.query_range_tree_ranges, name='query-range-tree-ranges'),
+    path('query/batch/', views.query_batch, name='query-batch'),
+    
+    # Query endpoints async (ASGI)
+    path('async/query/count/', async_views.query_count, name='async-query-count'),
+    path('async/query/mean/', async_views.query_mean, name='async-query-mean'),
+    path('async/query/sum/', async_views.query_sum, name='async-query-sum'),
+    path('async/query/median/', async_views.query_median, name='async-query-median'),
+    path('async/query/histogram/', async_views.query_histogram, name='async-query-histogram'),
     
     # Epsilon management
     path('epsilon/status/', views.epsilon_status, name='epsilon-status'),
@@ -33,4 +47,17 @@ urlpatterns = [
     
     # Stats
     path('stats/overview/', views.stats_overview, name='stats-overview'),
+    
+    # Continual-release counters
+    path('counters/admissions/', views.admissions_counter, name='admissions-counter'),
+    
+    # Synthetic data releases
+    path('synthetic/', views.synthetic_datasets, name='synthetic-datasets'),
+    path('synthetic/<str:name>/', views.synthetic_dataset_download, name='synthetic-dataset-download'),
+    
+    # Metrics (Prometheus)
+    path('metrics/', views.metrics, name='metrics'),
+    
+    # Profiling (admin)
+    path('admin/profiles/', views.profiles_hotspots, name='profiles-hotspots'),
 ]
\ No newline at end of file
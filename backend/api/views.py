@@ -3,23 +3,47 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models import Count, Avg, Sum, Q
-from django.utils import timezone
+from django.db.models import Count
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.http import HttpResponse, FileResponse
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+import json
+import re
 import time
+import pstats
+from collections import Counter
 import numpy as np
 
-from .models import Patient, QueryLog, EpsilonBudget
+from .models import Patient, QueryLog, EpsilonBudget, RangeTree, DataVersion
 from .serializers import (
     PatientSerializer, PatientListSerializer, QueryLogSerializer,
     EpsilonBudgetSerializer, UserSerializer,
     QueryCountSerializer, QueryMeanSerializer, QuerySumSerializer,
-    QueryMedianSerializer, QueryHistogramSerializer,
+    QueryMedianSerializer, QueryHistogramSerializer, QueryGroupBySerializer,
+    QueryCrosstabSerializer, QueryTimeSeriesSerializer, QueryThresholdSerializer,
+    QueryRangeTreeSerializer, RangeLookupSerializer,
+    QueryBatchSerializer,
     DataLoadSerializer, EpsilonResetSerializer
 )
-from .services import DifferentialPrivacyService, PolicyEnforcer
+from .services import (
+    DifferentialPrivacyService, PolicyEnforcer, DEFAULT_COLUMN_BOUNDS, CATEGORICAL_DOMAINS,
+    DIMENSION_DOMAINS, time_buckets, range_tree_count
+)
+from .prefix_index import KEY_COLUMNS
+from .cohort import Cohort
+from .snapshot import get_snapshot
+from .audit import query_log_writer
+from .replay_cache import (
+    query_fingerprint, get_released_answer, store_released_answer
+)
+from .metrics import endpoint, timer, registry
+from .middleware import profiler_directory
+from .synthetic import list_synthetic_datasets, synthetic_dataset_path
+from .continual import (
+    ADMISSIONS_COUNTER, ingestion_batch, flush_pending, dyadic_nodes, released_nodes, running_total
+)
 
 User = get_user_model()
 
@@ -34,10 +58,10 @@ def get_client_ip(request):
     return ip
 
 
-def log_query(user, query_type, epsilon, delta, query_params, result_data, 
-              status_type, error_msg, exec_time, rows, request):
-    """Créer un log de requête"""
-    QueryLog.objects.create(
+def build_query_log(user, query_type, epsilon, delta, query_params, result_data,
+                    status_type, error_msg, exec_time, rows, request):
+    """Construire un log de requête (non sauvegardé)"""
+    return QueryLog(
         user=user,
         query_type=query_type,
         epsilon_used=epsilon,
@@ -53,20 +77,474 @@ def log_query(user, query_type, epsilon, delta, query_params, result_data,
     )
 
 
-def apply_filters(queryset, filters):
-    """Appliquer les filtres au queryset"""
-    if 'age_min' in filters:
-        queryset = queryset.filter(age__gte=filters['age_min'])
-    if 'age_max' in filters:
-        queryset = queryset.filter(age__lte=filters['age_max'])
-    if 'gender' in filters:
-        queryset = queryset.filter(gender=filters['gender'])
-    if 'blood_type' in filters:
-        queryset = queryset.filter(blood_type=filters['blood_type'])
-    if 'zip_code' in filters:
-        queryset = queryset.filter(zip_code=filters['zip_code'])
+def log_query(user, query_type, epsilon, delta, query_params, result_data, 
+              status_type, error_msg, exec_time, rows, request):
+    """Créer un log de requête (écrit en arrière-plan par le QueryLogWriter)"""
+    query_log_writer.submit(build_query_log(
+        user, query_type, epsilon, delta, query_params, result_data,
+        status_type, error_msg, exec_time, rows, request
+    ))
+
+
+class NoMatchingData(Exception):
+    """Aucun patient ne correspond aux filtres"""
+
+
+def query_delta(data):
+    """Delta consommé par une requête (non nul pour le mécanisme gaussien seulement)"""
+    return data.get('delta', 1e-5) if data.get('mechanism') == 'gaussian' else 0.0
+
+
+# Exécution des requêtes DP : (payload, rows) pour une cohorte déjà filtrée.
+# release_* ajoute le bruit aux agrégats vrais (partagé avec les vues async).
+
+def release_count(true_count, data):
+    """Count avec DP à partir du comptage vrai"""
+    epsilon = data.get('epsilon', 1.0)
+    
+    dp_service = DifferentialPrivacyService(epsilon=epsilon)
+    result = dp_service.noisy_count(true_count)
+    
+    return {'result': result}, true_count
+
+
+def execute_count(cohort, data):
+    """Count avec DP sur une cohorte"""
+    with timer('aggregate'):
+        true_count = cohort.count()
+    return release_count(true_count, data)
+
+
+def release_mean(stats, data):
+    """Mean avec DP multi-colonnes à partir des statistiques suffisantes"""
+    epsilon = data.get('epsilon', 1.0)
+    columns = data['columns']
+    
+    # Epsilon par colonne
+    epsilon_per_column = epsilon / len(columns)
+    count = stats['count']
+    
+    if count == 0:
+        raise NoMatchingData()
+    
+    results = {}
+    bounds_map = {
+        'age': data.get('age_bounds', [0, 120]),
+        'weight': data.get('weight_bounds', [30, 200]),
+        'height': data.get('height_bounds', [100, 250]),
+        'blood_pressure_systolic': data.get('bp_systolic_bounds', [50, 250]),
+        'blood_pressure_diastolic': data.get('bp_diastolic_bounds', [30, 150]),
+        'treatment_cost': data.get('cost_bounds', [0, 100000]),
+    }
+    
+    for column in columns:
+        column_stats = stats['columns'][column]
+        if column_stats['sum'] is not None:
+            bounds = tuple(bounds_map.get(column, [0, 1000]))
+            dp_service = DifferentialPrivacyService(epsilon=epsilon_per_column)
+            result = dp_service.noisy_mean_from_stats(
+                {'count': count, **column_stats}, bounds
+            )
+            results[column] = result
+    
+    return {
+        'results': results,
+        'epsilon_per_column': epsilon_per_column,
+        'columns': columns,
+    }, count
+
+
+def execute_mean(cohort, data):
+    """Mean avec DP multi-colonnes sur une cohorte"""
+    # Count, sum et sum_sq de toutes les colonnes en une seule passe
+    with timer('aggregate'):
+        stats = cohort.sufficient_stats(data['columns'])
+    return release_mean(stats, data)
+
+
+def release_sum(stats, data):
+    """Sum avec DP multi-colonnes à partir des statistiques suffisantes"""
+    epsilon = data.get('epsilon', 1.0)
+    columns = data['columns']
+    
+    epsilon_per_column = epsilon / len(columns)
+    count = stats['count']
+    
+    if count == 0:
+        raise NoMatchingData()
+    
+    results = {}
+    
+    for column in columns:
+        column_stats = stats['columns'][column]
+        if column_stats['sum'] is not None:
+            bounds = data.get('bounds', {}).get(column, DEFAULT_COLUMN_BOUNDS.get(column, (0, 1000)))
+            dp_service = DifferentialPrivacyService(epsilon=epsilon_per_column)
+            result = dp_service.noisy_sum_from_stats(
+                {'count': count, **column_stats}, bounds
+            )
+            results[column] = result
+    
+    return {'results': results}, count
+
+
+def execute_sum(cohort, data):
+    """Sum avec DP multi-colonnes sur une cohorte"""
+    # Count et sommes de toutes les colonnes en une seule passe
+    with timer('aggregate'):
+        stats = cohort.sufficient_stats(data['columns'])
+    return release_sum(stats, data)
+
+
+def requested_quantiles(data):
+    """Quantiles demandés (médiane par défaut)"""
+    return data.get('quantiles') or [0.5]
+
+
+def release_median(true_quantiles, count, data):
+    """Median avec DP à partir des quantiles vrais"""
+    epsilon = data.get('epsilon', 1.0)
+    bounds = tuple(data['bounds'])
+    
+    if count == 0:
+        raise NoMatchingData()
+    
+    dp_service = DifferentialPrivacyService(epsilon=epsilon)
+    if 'quantiles' in data:
+        result = dp_service.noisy_quantiles(true_quantiles, bounds)
+    else:
+        result = dp_service.noisy_quantile(true_quantiles[0.5], bounds)
+    
+    return {'column': data['column'], 'result': result}, count
+
+
+def execute_median(cohort, data):
+    """Median avec DP sur une cohorte"""
+    # Quantiles vrais lus dans l'index trié / par offset SQL (pas de liste Python)
+    with timer('aggregate'):
+        true_quantiles, count = cohort.quantiles(data['column'], requested_quantiles(data))
+    return release_median(true_quantiles, count, data)
+
+
+def histogram_range(data):
+    """(min, max, num_bins) : bornes déclarées ou bornes par défaut de la colonne (jamais lues dans les données)"""
+    default_min, default_max = DEFAULT_COLUMN_BOUNDS[data['column']]
+    return (
+        data.get('min_value', default_min),
+        data.get('max_value', default_max),
+        data.get('num_bins', 10),
+    )
+
+
+def release_histogram(hist, data):
+    """Histogram avec DP à partir des compteurs par bin"""
+    epsilon = data.get('epsilon', 1.0)
+    min_val, max_val, num_bins = histogram_range(data)
+    rows = sum(hist)
+    
+    if rows == 0:
+        raise NoMatchingData()
+    
+    bin_edges = np.linspace(min_val, max_val, num_bins + 1)
+    
+    # Appliquer DP
+    dp_service = DifferentialPrivacyService(epsilon=epsilon)
+    result = dp_service.noisy_histogram(hist, num_bins)
+    
+    # Formater pour réponse
+    result['bin_edges'] = bin_edges.tolist()
+    result['bin_labels'] = [
+        f"{bin_edges[i]:.1f}-{bin_edges[i+1]:.1f}" 
+        for i in range(num_bins)
+    ]
+    
+    return {'column': data['column'], 'result': result}, rows
+
+
+def execute_histogram(cohort, data):
+    """Histogram avec DP sur une cohorte"""
+    # Compteurs par bin (GROUP BY côté base ou snapshot)
+    with timer('aggregate'):
+        hist = cohort.histogram(data['column'], *histogram_range(data))
+    return release_histogram(hist, data)
+
+
+def execute_groupby(cohort, data):
+    """Count/mean/sum par catégorie avec DP : un seul GROUP BY, epsilon consommé une fois"""
+    epsilon = data.get('epsilon', 1.0)
+    group_by = data['group_by']
+    aggregate = data.get('aggregate', 'count')
+    column = data.get('column') if aggregate != 'count' else None
+    bounds = tuple(data.get('bounds') or DEFAULT_COLUMN_BOUNDS[column]) if column else None
+    
+    with timer('aggregate'):
+        counts, sums = cohort.grouped(group_by, column, bounds)
+    
+    groups = CATEGORICAL_DOMAINS[group_by]
+    dp_service = DifferentialPrivacyService(epsilon=epsilon)
+    if aggregate == 'count':
+        result = dp_service.noisy_group_counts(groups, counts)
+    elif aggregate == 'sum':
+        result = dp_service.noisy_group_sums(groups, sums, bounds)
+    else:
+        result = dp_service.noisy_group_means(groups, counts, sums, bounds)
+    
+    return {
+        'group_by': group_by,
+        'aggregate': aggregate,
+        'column': column,
+        'result': result,
+    }, int(counts.sum())
+
+
+def execute_crosstab(cohort, data):
+    """Table de contingence avec DP : une agrégation, un tirage de bruit pour toutes les cellules"""
+    epsilon = data.get('epsilon', 1.0)
+    dimensions = data['dimensions']
+    mechanism = data.get('mechanism', 'laplace')
+    
+    with timer('aggregate'):
+        table = cohort.crosstab(dimensions)
+    
+    dp_service = DifferentialPrivacyService(epsilon=epsilon, delta=data.get('delta', 1e-5))
+    result = dp_service.noisy_crosstab(
+        table, {dimension: DIMENSION_DOMAINS[dimension] for dimension in dimensions},
+        mechanism=mechanism, consistent=data.get('consistent', False)
+    )
+    
+    return {'dimensions': dimensions, 'result': result}, int(table.sum())
+
+
+def execute_timeseries(cohort, data):
+    """Série temporelle avec DP : un GROUP BY sur la date tronquée, buckets disjoints (epsilon consommé une fois)"""
+    epsilon = data.get('epsilon', 1.0)
+    bucket = data.get('bucket', 'month')
+    start, end = data['start'], data['end']
+    aggregate = data.get('aggregate', 'count')
+    column = data.get('column') if aggregate == 'mean' else None
+    bounds = tuple(data.get('bounds') or DEFAULT_COLUMN_BOUNDS[column]) if column else None
+    
+    with timer('aggregate'):
+        counts, sums = cohort.time_series(bucket, start, end, column, bounds)
+    
+    labels = time_buckets(bucket, start, end).astype(str).tolist()
+    dp_service = DifferentialPrivacyService(epsilon=epsilon)
+    if aggregate == 'count':
+        result = dp_service.noisy_group_counts(labels, counts)
+    else:
+        result = dp_service.noisy_group_means(labels, counts, sums, bounds)
+    
+    # Buckets dans l'ordre chronologique
+    groups = result.pop('groups')
+    result['series'] = [{'bucket': label, **groups[label]} for label in labels]
+    
+    return {
+        'bucket': bucket,
+        'aggregate': aggregate,
+        'column': column,
+        'result': result,
+    }, int(counts.sum())
+
+
+def execute_threshold(cohort, data):
+    """
+    Cohortes zip_code x diagnosis au-dessus d'un seuil (sparse vector technique) :
+    un seul GROUP BY, un seul tirage de bruit, epsilon indépendant du nombre de candidats
+    """
+    epsilon = data.get('epsilon', 1.0)
+    max_positives = data.get('max_positives', 10)
+    columns = ['zip_code', 'diagnosis']
+    domains = [data['zip_codes'], data['diagnoses']]
+    
+    with timer('aggregate'):
+        counts = cohort.candidate_counts(columns, domains)
+    
+    dp_service = DifferentialPrivacyService(epsilon=epsilon)
+    result = dp_service.sparse_vector(counts, data['threshold'], max_positives)
+    
+    # Position à plat -> (zip_code, diagnosis), candidats parcourus zip par zip
+    cohorts = []
+    for position, true_count in zip(result.pop('positives'), result.pop('true_results')):
+        zip_index, diagnosis_index = np.unravel_index(position, counts.shape)
+        cohorts.append({
+            'zip_code': domains[0][zip_index],
+            'diagnosis': domains[1][diagnosis_index],
+            'true_result': int(true_count),
+        })
+    result['cohorts'] = cohorts
+    return {'columns': columns, 'result': result}, int(counts.sum())
+
+
+def execute_range_tree(cohort, data):
+    """
+    Histogramme hiérarchique avec DP d'une colonne entière : un seul scan et un
+    seul débit epsilon ; l'arbre publié répond ensuite à toutes les plages.
+    """
+    column = data['column']
+    lower, upper = KEY_COLUMNS[column]
+    
+    # Une feuille par valeur entière du domaine
+    with timer('aggregate'):
+        leaves = cohort.histogram(column, lower, upper + 1, upper - lower + 1)
     
-    return queryset
+    dp_service = DifferentialPrivacyService(epsilon=data.get('epsilon', 1.0))
+    result = dp_service.noisy_range_tree(leaves, lower, data.get('branching', 4))
+    return {'column': column, 'result': result}, int(sum(leaves))
+
+
+def store_release(query_type, data, version, fingerprint, payload, rows):
+    """Mémoriser une réponse publiée (uniquement après le débit du budget)"""
+    store_released_answer(fingerprint, payload, rows)
+    if query_type == 'range_tree':
+        # Arbre relu par /range-tree/ranges/ sans nouveau débit
+        RangeTree.objects.exclude(data_version=version).delete()
+        RangeTree.objects.update_or_create(**RangeTree.key(data, version),
+                                           defaults={'tree': payload['result']})
+
+
+QUERY_TYPES = {
+    'count': (QueryCountSerializer, execute_count),
+    'mean': (QueryMeanSerializer, execute_mean),
+    'sum': (QuerySumSerializer, execute_sum),
+    'median': (QueryMedianSerializer, execute_median),
+    'histogram': (QueryHistogramSerializer, execute_histogram),
+    'groupby': (QueryGroupBySerializer, execute_groupby),
+    'crosstab': (QueryCrosstabSerializer, execute_crosstab),
+    'timeseries': (QueryTimeSeriesSerializer, execute_timeseries),
+    'threshold': (QueryThresholdSerializer, execute_threshold),
+    'range_tree': (QueryRangeTreeSerializer, execute_range_tree),
+}
+
+
+class DPQueryRun:
+    """
+    Cycle de vie d'une requête DP autour de son exécution : validation,
+    budget, rejeu, débit et log. Partagé par les vues sync (DRF) et async ;
+    chaque étape renvoie (body, status) pour la réponse HTTP.
+    """
+    
+    def __init__(self, request, user, query_type, params):
+        self.request = request
+        self.user = user
+        self.query_type = query_type
+        self.params = params
+        self.start_time = time.time()
+        self.data = None
+        self.epsilon = 0
+        self.delta = 0.0
+        self.version = None
+        self.filters = {}
+    
+    def elapsed(self):
+        return time.time() - self.start_time
+    
+    def log(self, epsilon, result_data, status_type, error_msg, rows):
+        # Réponse rejouée (epsilon nul) : aucun delta dépensé non plus
+        delta = self.delta if epsilon else 0.0
+        with timer('log'):
+            log_query(self.user, self.query_type, epsilon, delta, self.data, result_data,
+                      status_type, error_msg, self.elapsed(), rows, self.request)
+    
+    def prepare(self):
+        """Valider et autoriser : renvoie une réponse anticipée (erreur ou rejeu), sinon None"""
+        serializer_class, _ = QUERY_TYPES[self.query_type]
+        serializer = serializer_class(data=self.params)
+        with timer('validate'):
+            valid = serializer.is_valid()
+        if not valid:
+            return serializer.errors, status.HTTP_400_BAD_REQUEST
+        
+        self.data = serializer.validated_data
+        self.epsilon = self.data.get('epsilon', 1.0)
+        self.delta = query_delta(self.data)
+        self.filters = self.data.get('filters', {})
+        
+        # Récupérer epsilon budget
+        with timer('budget'):
+            self.epsilon_budget = EpsilonBudget.for_user(self.user)
+        self.enforcer = PolicyEnforcer(self.user, self.epsilon_budget)
+        
+        # Compte désactivé : refusé avant tout rejeu de réponse publiée
+        if not self.user.is_active:
+            message = "User account is inactive"
+            self.log(self.epsilon, None, 'blocked', message, 0)
+            return {'error': message}, status.HTTP_403_FORBIDDEN
+        
+        # Requête identique déjà publiée : rejouer la même réponse bruitée (coût epsilon nul)
+        with timer('replay_lookup'):
+            # Une lecture de la version (clé primaire) : partagée par le rejeu, le snapshot et les index
+            self.version = DataVersion.current()
+            self.fingerprint = query_fingerprint(self.query_type, self.data, self.version)
+            released = get_released_answer(self.fingerprint)
+        if released is not None:
+            payload, rows = released
+            self.log(0, payload.get('result', payload.get('results')), 'success', '', rows)
+            return self.response(payload, 0, replayed=True), status.HTTP_200_OK
+        
+        # Vérifier autorisation
+        can_execute, message = self.enforcer.can_execute_query(self.epsilon, self.delta)
+        if not can_execute:
+            self.log(self.epsilon, None, 'blocked', message, 0)
+            return {'error': message}, status.HTTP_403_FORBIDDEN
+        
+        return None
+    
+    def execute(self, cohort):
+        _, execute = QUERY_TYPES[self.query_type]
+        return execute(cohort, self.data)
+    
+    def finish(self, payload, rows):
+        """Débiter le budget, mémoriser la réponse publiée et logger"""
+        # UPDATE conditionnel : échoue si un débit concurrent a épuisé le budget
+        with timer('consume'):
+            consumed = self.enforcer.consume_budget(self.epsilon, self.delta)
+        if not consumed:
+            message = (f"Insufficient privacy budget. Required: epsilon {self.epsilon}, delta {self.delta}, "
+                       f"Remaining: epsilon {self.epsilon_budget.remaining_budget}, "
+                       f"delta {self.epsilon_budget.remaining_delta}")
+            self.log(self.epsilon, None, 'blocked', message, 0)
+            return {'error': message}, status.HTTP_403_FORBIDDEN
+        
+        with timer('replay_store'):
+            store_release(self.query_type, self.data, self.version, self.fingerprint, payload, rows)
+        self.log(self.epsilon, payload.get('result', payload.get('results')),
+                 'success', '', rows)
+        return self.response(payload, self.epsilon), status.HTTP_200_OK
+    
+    def fail(self, error):
+        """Réponse d'erreur d'exécution (404 si aucune donnée, sinon loggée en erreur)"""
+        if isinstance(error, NoMatchingData):
+            return {'error': 'No data matching filters'}, status.HTTP_404_NOT_FOUND
+        self.log(self.epsilon, None, 'error', str(error), 0)
+        return {'error': str(error)}, status.HTTP_500_INTERNAL_SERVER_ERROR
+    
+    def response(self, payload, epsilon_used, replayed=False):
+        body = {'query_type': self.query_type, **payload, 'epsilon_used': epsilon_used}
+        if replayed:
+            body['replayed'] = True
+        body.update({
+            'filters_applied': self.filters,
+            'execution_time': round(self.elapsed(), 4),
+            'budget_remaining': self.epsilon_budget.remaining_budget
+        })
+        return body
+
+
+def run_dp_query(request, query_type):
+    """Valider, autoriser, exécuter et logger une requête DP"""
+    with endpoint(query_type):
+        run = DPQueryRun(request, request.user, query_type, request.data)
+        
+        response = run.prepare()
+        if response is None:
+            try:
+                # Exécuter requête (snapshot colonnaire si disponible, sinon ORM)
+                response = run.finish(*run.execute(Cohort(run.filters, version=run.version)))
+            except Exception as e:
+                response = run.fail(e)
+    
+    body, status_code = response
+    return Response(body, status=status_code)
 
 
 class PatientViewSet(viewsets.ModelViewSet):
@@ -108,61 +586,7 @@ class PatientViewSet(viewsets.ModelViewSet):
 @permission_classes([IsAuthenticated])
 def query_count(request):
     """Count query avec DP"""
-    start_time = time.time()
-    
-    serializer = QueryCountSerializer(data=request.data)
-    if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
-    data = serializer.validated_data
-    epsilon = data.get('epsilon', 1.0)
-    filters = data.get('filters', {})
-    
-    # Récupérer epsilon budget
-    epsilon_budget, _ = EpsilonBudget.objects.get_or_create(user=request.user)
-    enforcer = PolicyEnforcer(request.user, epsilon_budget)
-    
-    # Vérifier autorisation
-    can_execute, message = enforcer.can_execute_query(epsilon)
-    if not can_execute:
-        exec_time = time.time() - start_time
-        log_query(request.user, 'count', epsilon, 0, data, None, 
-                 'blocked', message, exec_time, 0, request)
-        return Response({'error': message}, status=status.HTTP_403_FORBIDDEN)
-    
-    try:
-        # Exécuter requête
-        queryset = Patient.objects.all()
-        queryset = apply_filters(queryset, filters)
-        true_count = queryset.count()
-        
-        # Appliquer DP
-        dp_service = DifferentialPrivacyService(epsilon=epsilon)
-        result = dp_service.noisy_count(true_count)
-        
-        # Consommer budget
-        enforcer.consume_budget(epsilon)
-        
-        exec_time = time.time() - start_time
-        
-        # Log
-        log_query(request.user, 'count', epsilon, 0, data, result,
-                 'success', '', exec_time, true_count, request)
-        
-        return Response({
-            'query_type': 'count',
-            'result': result,
-            'epsilon_used': epsilon,
-            'filters_applied': filters,
-            'execution_time': round(exec_time, 4),
-            'budget_remaining': epsilon_budget.remaining_budget
-        })
-        
-    except Exception as e:
-        exec_time = time.time() - start_time
-        log_query(request.user, 'count', epsilon, 0, data, None,
-                 'error', str(e), exec_time, 0, request)
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return run_dp_query(request, 'count')
 
 
 @swagger_auto_schema(
@@ -173,80 +597,7 @@ def query_count(request):
 @permission_classes([IsAuthenticated])
 def query_mean(request):
     """Mean query avec DP pour multi-colonnes"""
-    start_time = time.time()
-    
-    serializer = QueryMeanSerializer(data=request.data)
-    if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
-    data = serializer.validated_data
-    epsilon = data.get('epsilon', 1.0)
-    columns = data['columns']
-    filters = data.get('filters', {})
-    
-    # Budget management
-    epsilon_budget, _ = EpsilonBudget.objects.get_or_create(user=request.user)
-    enforcer = PolicyEnforcer(request.user, epsilon_budget)
-    
-    # Epsilon par colonne
-    epsilon_per_column = epsilon / len(columns)
-    
-    can_execute, message = enforcer.can_execute_query(epsilon)
-    if not can_execute:
-        exec_time = time.time() - start_time
-        log_query(request.user, 'mean', epsilon, 0, data, None,
-                 'blocked', message, exec_time, 0, request)
-        return Response({'error': message}, status=status.HTTP_403_FORBIDDEN)
-    
-    try:
-        queryset = Patient.objects.all()
-        queryset = apply_filters(queryset, filters)
-        count = queryset.count()
-        
-        if count == 0:
-            return Response({'error': 'No data matching filters'}, 
-                          status=status.HTTP_404_NOT_FOUND)
-        
-        results = {}
-        bounds_map = {
-            'age': data.get('age_bounds', [0, 120]),
-            'weight': data.get('weight_bounds', [30, 200]),
-            'height': data.get('height_bounds', [100, 250]),
-            'blood_pressure_systolic': data.get('bp_systolic_bounds', [50, 250]),
-            'blood_pressure_diastolic': data.get('bp_diastolic_bounds', [30, 150]),
-            'treatment_cost': data.get('cost_bounds', [0, 100000]),
-        }
-        
-        for column in columns:
-            true_mean = queryset.aggregate(avg=Avg(column))['avg']
-            if true_mean is not None:
-                bounds = tuple(bounds_map.get(column, [0, 1000]))
-                dp_service = DifferentialPrivacyService(epsilon=epsilon_per_column)
-                result = dp_service.noisy_mean(float(true_mean), bounds, count)
-                results[column] = result
-        
-        enforcer.consume_budget(epsilon)
-        exec_time = time.time() - start_time
-        
-        log_query(request.user, 'mean', epsilon, 0, data, results,
-                 'success', '', exec_time, count, request)
-        
-        return Response({
-            'query_type': 'mean',
-            'results': results,
-            'epsilon_used': epsilon,
-            'epsilon_per_column': epsilon_per_column,
-            'columns': columns,
-            'filters_applied': filters,
-            'execution_time': round(exec_time, 4),
-            'budget_remaining': epsilon_budget.remaining_budget
-        })
-        
-    except Exception as e:
-        exec_time = time.time() - start_time
-        log_query(request.user, 'mean', epsilon, 0, data, None,
-                 'error', str(e), exec_time, 0, request)
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return run_dp_query(request, 'mean')
 
 
 @swagger_auto_schema(
@@ -257,77 +608,9 @@ def query_mean(request):
 @permission_classes([IsAuthenticated])
 def query_sum(request):
     """Sum query avec DP et agrégations"""
-    start_time = time.time()
-    
-    serializer = QuerySumSerializer(data=request.data)
-    if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
-    data = serializer.validated_data
-    epsilon = data.get('epsilon', 1.0)
-    columns = data['columns']
-    filters = data.get('filters', {})
-    
-    epsilon_budget, _ = EpsilonBudget.objects.get_or_create(user=request.user)
-    enforcer = PolicyEnforcer(request.user, epsilon_budget)
-    
-    epsilon_per_column = epsilon / len(columns)
-    
-    can_execute, message = enforcer.can_execute_query(epsilon)
-    if not can_execute:
-        exec_time = time.time() - start_time
-        log_query(request.user, 'sum', epsilon, 0, data, None,
-                 'blocked', message, exec_time, 0, request)
-        return Response({'error': message}, status=status.HTTP_403_FORBIDDEN)
-    
-    try:
-        queryset = Patient.objects.all()
-        queryset = apply_filters(queryset, filters)
-        count = queryset.count()
-        
-        if count == 0:
-            return Response({'error': 'No data matching filters'},
-                          status=status.HTTP_404_NOT_FOUND)
-        
-        results = {}
-        default_bounds = {
-            'age': (0, 120),
-            'weight': (30, 200),
-            'height': (100, 250),
-            'treatment_cost': (0, 100000),
-        }
-        
-        for column in columns:
-            true_sum = queryset.aggregate(total=Sum(column))['total']
-            if true_sum is not None:
-                bounds = data.get('bounds', {}).get(column, default_bounds.get(column, (0, 1000)))
-                dp_service = DifferentialPrivacyService(epsilon=epsilon_per_column)
-                result = dp_service.noisy_sum(float(true_sum), bounds, count)
-                results[column] = result
-        
-        enforcer.consume_budget(epsilon)
-        exec_time = time.time() - start_time
-        
-        log_query(request.user, 'sum', epsilon, 0, data, results,
-                 'success', '', exec_time, count, request)
-        
-        return Response({
-            'query_type': 'sum',
-            'results': results,
-            'epsilon_used': epsilon,
-            'filters_applied': filters,
-            'execution_time': round(exec_time, 4),
-            'budget_remaining': epsilon_budget.remaining_budget
-        })
-        
-    except Exception as e:
-        exec_time = time.time() - start_time
-        log_query(request.user, 'sum', epsilon, 0, data, None,
-                 'error', str(e), exec_time, 0, request)
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return run_dp_query(request, 'sum')
 
 
-# **Continue dans la prochaine partie avec median, histogram et autres endpoints...**
 @swagger_auto_schema(
     method='post',
     request_body=QueryMedianSerializer,
@@ -336,157 +619,255 @@ def query_sum(request):
 @permission_classes([IsAuthenticated])
 def query_median(request):
     """Median query avec DP"""
-    start_time = time.time()
-    
-    serializer = QueryMedianSerializer(data=request.data)
+    return run_dp_query(request, 'median')
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=QueryHistogramSerializer,
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def query_histogram(request):
+    """Histogram query avec DP"""
+    return run_dp_query(request, 'histogram')
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=QueryGroupBySerializer,
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def query_groupby(request):
+    """Group-by query avec DP (une catégorie = une cellule, composition parallèle)"""
+    return run_dp_query(request, 'groupby')
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=QueryCrosstabSerializer,
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def query_crosstab(request):
+    """Crosstab query avec DP (2 ou 3 dimensions, post-traitement de cohérence optionnel)"""
+    return run_dp_query(request, 'crosstab')
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=QueryTimeSeriesSerializer,
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def query_timeseries(request):
+    """Time-series query avec DP (admissions par jour, semaine ou mois)"""
+    return run_dp_query(request, 'timeseries')
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=QueryThresholdSerializer,
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def query_threshold(request):
+    """Threshold query avec DP (sparse vector : seules les cohortes au-dessus du seuil sont publiées)"""
+    return run_dp_query(request, 'threshold')
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=QueryRangeTreeSerializer,
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def query_range_tree(request):
+    """Range-tree query avec DP (arbre b-aire de comptages bruités, epsilon débité une fois)"""
+    return run_dp_query(request, 'range_tree')
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=RangeLookupSerializer,
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def query_range_tree_ranges(request):
+    """
+    POST /api/query/range-tree/ranges - Comptages de plages lus dans un arbre publié
+    
+    Post-traitement d'une réponse déjà publiée (même column, branching, epsilon
+    et filters que la construction) : aucun scan, aucun débit de budget.
+    """
+    serializer = RangeLookupSerializer(data=request.data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    data = serializer.validated_data
-    epsilon = data.get('epsilon', 1.0)
-    column = data['column']
-    filters = data.get('filters', {})
-    bounds = tuple(data['bounds'])
-    
-    epsilon_budget, _ = EpsilonBudget.objects.get_or_create(user=request.user)
-    enforcer = PolicyEnforcer(request.user, epsilon_budget)
-    
-    can_execute, message = enforcer.can_execute_query(epsilon)
-    if not can_execute:
-        exec_time = time.time() - start_time
-        log_query(request.user, 'median', epsilon, 0, data, None,
-                 'blocked', message, exec_time, 0, request)
-        return Response({'error': message}, status=status.HTTP_403_FORBIDDEN)
-    
-    try:
-        queryset = Patient.objects.all()
-        queryset = apply_filters(queryset, filters)
-        
-        # Récupérer toutes les valeurs
-        values = list(queryset.values_list(column, flat=True))
-        
-        if not values:
-            return Response({'error': 'No data matching filters'},
-                          status=status.HTTP_404_NOT_FOUND)
-        
-        # Convertir en float
-        values = [float(v) for v in values if v is not None]
-        
-        dp_service = DifferentialPrivacyService(epsilon=epsilon)
-        result = dp_service.noisy_median(values, bounds)
-        
-        enforcer.consume_budget(epsilon)
-        exec_time = time.time() - start_time
-        
-        log_query(request.user, 'median', epsilon, 0, data, result,
-                 'success', '', exec_time, len(values), request)
-        
+    params = serializer.tree_params()
+    released = RangeTree.objects.filter(**RangeTree.key(params, DataVersion.current())).first()
+    if released is None:
         return Response({
-            'query_type': 'median',
-            'column': column,
-            'result': result,
-            'epsilon_used': epsilon,
-            'filters_applied': filters,
-            'execution_time': round(exec_time, 4),
-            'budget_remaining': epsilon_budget.remaining_budget
+            'error': 'No released range tree for these parameters (or the data changed): '
+                     'build it with POST /api/query/range-tree/ first'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    tree = released.tree
+    results = []
+    for lower, upper in serializer.validated_data['ranges']:
+        count, nodes = range_tree_count(tree, lower, upper)
+        results.append({
+            'min': lower,
+            'max': upper,
+            'noisy_result': max(0, round(count)),
+            'nodes_used': nodes,
+            # Écart-type du bruit : somme de nodes tirages Lap(noise_scale)
+            'noise_std': round(float(np.sqrt(2 * nodes)) * tree['noise_scale'], 4),
         })
-        
-    except Exception as e:
-        exec_time = time.time() - start_time
-        log_query(request.user, 'median', epsilon, 0, data, None,
-                 'error', str(e), exec_time, 0, request)
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({
+        'column': released.column,
+        'branching': tree['branching'],
+        'results': results,
+        'epsilon_used': 0.0,
+    })
 
 
 @swagger_auto_schema(
     method='post',
-    request_body=QueryHistogramSerializer,
+    request_body=QueryBatchSerializer,
 )
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def query_histogram(request):
-    """Histogram query avec DP"""
+@endpoint('batch')
+def query_batch(request):
+    """Batch de requêtes DP : filtres partagés, un seul débit de budget, logs en bulk"""
     start_time = time.time()
     
-    serializer = QueryHistogramSerializer(data=request.data)
-    if not serializer.is_valid():
+    serializer = QueryBatchSerializer(data=request.data)
+    with timer('validate'):
+        valid = serializer.is_valid()
+    if not valid:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    data = serializer.validated_data
-    epsilon = data.get('epsilon', 1.0)
-    column = data['column']
-    num_bins = data.get('num_bins', 10)
-    filters = data.get('filters', {})
+    specs = serializer.validated_data['queries']
     
-    epsilon_budget, _ = EpsilonBudget.objects.get_or_create(user=request.user)
+    # Requêtes déjà publiées : rejouées sans coût epsilon
+    version = DataVersion.current()
+    for spec in specs:
+        spec['fingerprint'] = query_fingerprint(spec['type'], spec['data'], version)
+        spec['released'] = get_released_answer(spec['fingerprint'])
+    total_epsilon = sum(
+        spec['data'].get('epsilon', 1.0) for spec in specs if spec['released'] is None
+    )
+    total_delta = sum(query_delta(spec['data']) for spec in specs if spec['released'] is None)
+    
+    with timer('budget'):
+        epsilon_budget = EpsilonBudget.for_user(request.user)
     enforcer = PolicyEnforcer(request.user, epsilon_budget)
     
-    can_execute, message = enforcer.can_execute_query(epsilon)
+    can_execute, message = enforcer.can_execute_query(total_epsilon, total_delta)
     if not can_execute:
         exec_time = time.time() - start_time
-        log_query(request.user, 'histogram', epsilon, 0, data, None,
-                 'blocked', message, exec_time, 0, request)
+        query_log_writer.submit_many([
+            build_query_log(request.user, spec['type'], spec['data'].get('epsilon', 1.0),
+                            query_delta(spec['data']), spec['data'], None, 'blocked', message,
+                            exec_time, 0, request)
+            for spec in specs
+        ])
         return Response({'error': message}, status=status.HTTP_403_FORBIDDEN)
     
-    try:
-        queryset = Patient.objects.all()
-        queryset = apply_filters(queryset, filters)
-        
-        # Récupérer valeurs
-        values = list(queryset.values_list(column, flat=True))
-        values = [float(v) for v in values if v is not None]
-        
-        if not values:
-            return Response({'error': 'No data matching filters'},
-                          status=status.HTTP_404_NOT_FOUND)
-        
-        # Déterminer min/max
-        min_val = data.get('min_value', min(values))
-        max_val = data.get('max_value', max(values))
+    # Une cohorte (masque ou queryset) par jeu de filtres identique
+    snapshot = get_snapshot(version)
+    cohorts = {}
+    outcomes = []
+    for spec in specs:
+        query_type, data = spec['type'], spec['data']
+        if spec['released'] is not None:
+            payload, rows = spec['released']
+            outcomes.append((query_type, data, payload, rows, None, 0.0, True))
+            continue
         
-        # Créer bins
-        bin_edges = np.linspace(min_val, max_val, num_bins + 1)
-        hist, _ = np.histogram(values, bins=bin_edges)
+        filters = data.get('filters', {})
+        key = json.dumps(filters, sort_keys=True, default=str)
+        if key not in cohorts:
+            cohorts[key] = Cohort(filters, snapshot, version)
         
-        # Appliquer DP
-        dp_service = DifferentialPrivacyService(epsilon=epsilon)
-        result = dp_service.noisy_histogram(hist.tolist(), num_bins)
-        
-        enforcer.consume_budget(epsilon)
+        spec_start = time.time()
+        try:
+            payload, rows = QUERY_TYPES[query_type][1](cohorts[key], data)
+            outcomes.append((query_type, data, payload, rows, None, time.time() - spec_start, False))
+        except NoMatchingData:
+            outcomes.append((query_type, data, None, 0, 'No data matching filters',
+                             time.time() - spec_start, False))
+        except Exception as e:
+            outcomes.append((query_type, data, None, 0, str(e), time.time() - spec_start, False))
+    
+    # Débit unique pour toutes les requêtes exécutées (hors réponses rejouées)
+    charged = [
+        data for _, data, payload, _, _, _, replayed in outcomes
+        if payload is not None and not replayed
+    ]
+    charged_epsilon = sum(data.get('epsilon', 1.0) for data in charged)
+    charged_delta = sum(query_delta(data) for data in charged)
+    with timer('consume'):
+        consumed = charged_epsilon <= 0 or enforcer.consume_budget(charged_epsilon, charged_delta)
+    if not consumed:
+        message = (f"Insufficient privacy budget. Required: epsilon {charged_epsilon}, delta {charged_delta}, "
+                   f"Remaining: epsilon {epsilon_budget.remaining_budget}, "
+                   f"delta {epsilon_budget.remaining_delta}")
         exec_time = time.time() - start_time
-        
-        # Formater pour réponse
-        result['bin_edges'] = bin_edges.tolist()
-        result['bin_labels'] = [
-            f"{bin_edges[i]:.1f}-{bin_edges[i+1]:.1f}" 
-            for i in range(num_bins)
-        ]
-        
-        log_query(request.user, 'histogram', epsilon, 0, data, result,
-                 'success', '', exec_time, len(values), request)
-        
-        return Response({
-            'query_type': 'histogram',
-            'column': column,
-            'result': result,
-            'epsilon_used': epsilon,
-            'filters_applied': filters,
-            'execution_time': round(exec_time, 4),
-            'budget_remaining': epsilon_budget.remaining_budget
-        })
-        
-    except Exception as e:
-        exec_time = time.time() - start_time
-        log_query(request.user, 'histogram', epsilon, 0, data, None,
-                 'error', str(e), exec_time, 0, request)
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        query_log_writer.submit_many([
+            build_query_log(request.user, query_type, data.get('epsilon', 1.0), query_delta(data),
+                            data, None, 'blocked', message, exec_time, 0, request)
+            for query_type, data, _, _, _, _, _ in outcomes
+        ])
+        return Response({'error': message}, status=status.HTTP_403_FORBIDDEN)
+    
+    logs = []
+    results = []
+    for (query_type, data, payload, rows, error, spec_time, replayed), spec in zip(outcomes, specs):
+        epsilon = 0 if replayed else data.get('epsilon', 1.0)
+        delta = 0.0 if replayed else query_delta(data)
+        if payload is None:
+            logs.append(build_query_log(request.user, query_type, epsilon, delta, data, None,
+                                        'error', error, spec_time, 0, request))
+            results.append({'query_type': query_type, 'error': error, 'epsilon_used': 0})
+        else:
+            if not replayed:
+                store_release(query_type, data, version, spec['fingerprint'], payload, rows)
+            logs.append(build_query_log(request.user, query_type, epsilon, delta, data,
+                                        payload.get('result', payload.get('results')),
+                                        'success', '', spec_time, rows, request))
+            results.append({
+                'query_type': query_type,
+                **payload,
+                'epsilon_used': epsilon,
+                'replayed': replayed,
+                'filters_applied': data.get('filters', {}),
+            })
+    
+    with timer('log'):
+        query_log_writer.submit_many(logs)
+    exec_time = time.time() - start_time
+    
+    return Response({
+        'query_type': 'batch',
+        'results': results,
+        'epsilon_used': charged_epsilon,
+        'delta_used': charged_delta,
+        'distinct_filters': len(cohorts),
+        'execution_time': round(exec_time, 4),
+        'budget_remaining': epsilon_budget.remaining_budget
+    })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def epsilon_status(request):
     """GET /api/epsilon/status - Statut du budget epsilon"""
-    epsilon_budget, _ = EpsilonBudget.objects.get_or_create(user=request.user)
+    epsilon_budget = EpsilonBudget.for_user(request.user, fresh=True)
     enforcer = PolicyEnforcer(request.user, epsilon_budget)
     
     status_data = enforcer.get_status()
@@ -513,7 +894,7 @@ def epsilon_reset(request):
             'error': 'Confirmation required. Set confirm=true'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    epsilon_budget, _ = EpsilonBudget.objects.get_or_create(user=request.user)
+    epsilon_budget = EpsilonBudget.for_user(request.user, fresh=True)
     
     old_consumed = epsilon_budget.consumed_budget
     epsilon_budget.reset()
@@ -548,10 +929,11 @@ def platform_reset(request):
         }, status=status.HTTP_400_BAD_REQUEST)
         
     # 1. Reset Budget
-    epsilon_budget, _ = EpsilonBudget.objects.get_or_create(user=request.user)
+    epsilon_budget = EpsilonBudget.for_user(request.user, fresh=True)
     epsilon_budget.reset()
     
     # 2. Clear Logs (For the current user or all if admin? Let's say all for "Platform Reset")
+    query_log_writer.flush()
     if request.user.role == 'admin':
         deleted_count, _ = QueryLog.objects.all().delete()
     else:
@@ -612,9 +994,11 @@ def data_load(request):
     # Sauvegarder si pas d'erreurs
     if not errors:
         created_patients = []
-        for patient_serializer in valid_patients:
-            patient = patient_serializer.save()
-            created_patients.append(patient.patient_id)
+        # Un seul pas du compteur continu des admissions pour tout le lot
+        with ingestion_batch():
+            for patient_serializer in valid_patients:
+                patient = patient_serializer.save()
+                created_patients.append(patient.patient_id)
         
         return Response({
             'message': 'Data loaded successfully',
@@ -641,6 +1025,9 @@ def logs_history(request):
     date_from = request.query_params.get('date_from')
     date_to = request.query_params.get('date_to')
     
+    # Écrire les logs encore en file avant de lire
+    query_log_writer.flush()
+    
     # Base queryset
     if request.user.role == 'admin':
         # Admin voit tous les logs
@@ -676,6 +1063,7 @@ def stats_overview(request):
     """GET /api/stats/overview - Vue d'ensemble des statistiques"""
     
     # Stats pour l'utilisateur courant
+    query_log_writer.flush()
     user_logs = QueryLog.objects.filter(user=request.user)
     
     # Compter par type
@@ -692,7 +1080,7 @@ def stats_overview(request):
     total_epsilon = sum(log.epsilon_used for log in user_logs)
     
     # Budget actuel
-    epsilon_budget, _ = EpsilonBudget.objects.get_or_create(user=request.user)
+    epsilon_budget = EpsilonBudget.for_user(request.user, fresh=True)
     
     # Stats patients (si admin)
     patient_stats = {}
@@ -729,6 +1117,100 @@ def stats_overview(request):
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admissions_counter(request):
+    """
+    GET /api/counters/admissions - Nombre d'admissions courant (mécanisme binaire)
+    
+    Le total est relu depuis les noeuds déjà publiés (O(log T)) : aucune
+    lecture de la table patients ni aucun débit de budget epsilon.
+    Paramètres : step (pas demandé, défaut : dernier), series=true (tous les pas)
+    Les pas sont ceux de l'époque courante (nouvel arbre une fois l'horizon atteint).
+    Les insertions unitaires en attente (pending) sont publiées en un pas à la
+    lecture dès que CONTINUAL_COUNTER_WINDOW est écoulée depuis le dernier pas.
+    """
+    counter = flush_pending(ADMISSIONS_COUNTER)
+    if counter is None or counter.steps == 0:
+        return Response({
+            'error': 'No admissions batch recorded yet'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        step = int(request.query_params.get('step', counter.steps))
+    except ValueError:
+        return Response({'error': 'step must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= step <= counter.steps:
+        return Response({
+            'error': f'step must be between 1 and {counter.steps}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    series = request.query_params.get('series', '').lower() in ('1', 'true', 'yes')
+    nodes = released_nodes(counter, None if series else [step])
+    
+    result = {
+        'counter': counter.name,
+        'epoch': counter.epoch,
+        'step': step,
+        'steps': counter.steps,
+        'horizon': counter.horizon,
+        'exhausted': counter.is_exhausted,
+        'last_step_at': counter.last_step_at,
+        'noisy_total': max(0, round(running_total(nodes, step))),
+        'nodes_used': len(dyadic_nodes(step)),
+        'mechanism': 'Binary mechanism (Laplace)',
+        'epsilon': counter.epsilon,
+        'noise_scale': counter.levels / counter.epsilon,
+        'epsilon_charged': 0.0,
+    }
+    if request.user.role == 'admin':
+        result['true_total'] = int(running_total(nodes, step, 'true_sum'))
+        result['pending'] = counter.pending
+    if series:
+        # Horodatage de chaque pas : création de son noeud de niveau 0
+        result['series'] = [
+            {
+                'step': t,
+                'recorded_at': nodes[(0, t - 1)].created_at,
+                'noisy_total': max(0, round(running_total(nodes, t))),
+            }
+            for t in range(1, counter.steps + 1)
+        ]
+    return Response(result)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def synthetic_datasets(request):
+    """
+    GET /api/synthetic - Jeux de données synthétiques DP publiés
+    
+    Construits par la commande build_synthetic_data (epsilon débité une seule
+    fois) : leur lecture et leur exploration ne coûtent aucun budget.
+    """
+    datasets = list_synthetic_datasets()
+    return Response({
+        'count': len(datasets),
+        'latest': datasets[0]['name'] if datasets else None,
+        'datasets': datasets,
+        'epsilon_used': 0.0,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def synthetic_dataset_download(request, name):
+    """GET /api/synthetic/<name> - Fichier colonnaire (.npz) d'un jeu synthétique"""
+    if name == 'latest':
+        datasets = list_synthetic_datasets()
+        name = datasets[0]['name'] if datasets else ''
+    path = synthetic_dataset_path(name)
+    if path is None:
+        return Response({'error': 'Synthetic dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name,
+                        content_type='application/octet-stream')
+
+
 # Vue pour JWT login
 @swagger_auto_schema(
     method='post',
@@ -769,8 +1251,8 @@ def login_view(request):
     # Créer JWT tokens
     refresh = RefreshToken.for_user(user)
     
-    # Assurer que epsilon budget existe
-    EpsilonBudget.objects.get_or_create(user=user)
+    # Assurer que epsilon budget existe (et le charger dans le cache)
+    EpsilonBudget.for_user(user)
     
     return Response({
         'access': str(refresh.access_token),
@@ -790,3 +1272,65 @@ def current_user(request):
     """Obtenir l'utilisateur courant"""
     serializer = UserSerializer(request.user)
     return Response(serializer.data)
+
+
+def metrics(request):
+    """GET /api/metrics - Latences par endpoint et étape (exposition texte Prometheus)"""
+    # REMOTE_ADDR uniquement : X-Forwarded-For est contrôlé par le client
+    if (not getattr(settings, 'METRICS_ENABLED', True)
+            or request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+PROFILE_SORT_KEYS = {
+    'cumulative': 'cumulative_time',
+    'total': 'total_time',
+    'calls': 'calls',
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profiles_hotspots(request):
+    """GET /api/admin/profiles - Fonctions les plus coûteuses, agrégées sur les profils échantillonnés"""
+    if request.user.role != 'admin':
+        return Response({
+            'error': 'Only administrators can read profiles'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    endpoint_name = request.query_params.get('endpoint', '')
+    sort = request.query_params.get('sort', 'cumulative')
+    if sort not in PROFILE_SORT_KEYS or not re.fullmatch(r'[A-Za-z0-9_-]*', endpoint_name):
+        return Response({'error': 'Invalid endpoint or sort'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 30)), 1), 200)
+    except ValueError:
+        limit = 30
+    
+    pattern = f'{endpoint_name}_*.prof' if endpoint_name else '*.prof'
+    files = sorted(profiler_directory().glob(pattern))
+    endpoints = Counter(path.stem.rsplit('_', 1)[0] for path in files)
+    if not files:
+        return Response({'samples': 0, 'endpoints': {}, 'sort': sort, 'functions': []})
+    
+    # Agrégation de tous les profils (pstats additionne les compteurs)
+    stats = pstats.Stats(*[str(path) for path in files])
+    functions = []
+    for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+        functions.append({
+            'function': f"{filename}:{line}({name})",
+            'calls': calls,
+            'total_time': round(total, 6),
+            'cumulative_time': round(cumulative, 6),
+            'per_call': round(cumulative / calls, 6) if calls else 0,
+        })
+    functions.sort(key=lambda row: row[PROFILE_SORT_KEYS[sort]], reverse=True)
+    
+    return Response({
+        'samples': len(files),
+        'endpoints': dict(endpoints),
+        'sort': sort,
+        'functions': functions[:limit],
+    })
@@ -35,6 +35,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.SamplingProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -113,7 +114,14 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # Réponses DP déjà publiées, rejouées sans coût epsilon (LRU + TTL)
+    'dp_answers': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dp-answers',
+        'TIMEOUT': config('DP_ANSWER_CACHE_TTL', default=3600, cast=int),
+        'OPTIONS': {'MAX_ENTRIES': config('DP_ANSWER_CACHE_SIZE', default=5000, cast=int)},
+    },
 }
 
 # Rate Limiting
@@ -125,5 +133,42 @@ RATE_LIMIT = {
 # Epsilon Budget
 DEFAULT_EPSILON = 10.0
 EPSILON_WARNING = 2.0
+EPSILON_BUDGET_CACHE_TIMEOUT = 3600  # secondes (cache write-through des budgets)
+
+# Snapshot colonnaire des patients (requêtes DP en mémoire, fallback ORM)
+DP_SNAPSHOT_ENABLED = config('DP_SNAPSHOT_ENABLED', default=True, cast=bool)
+DP_SNAPSHOT_TTL = config('DP_SNAPSHOT_TTL', default=300, cast=int)  # secondes
+
+# Index incrémentaux (cube de comptages, ...) construits depuis la base
+DP_INDEXES_ENABLED = config('DP_INDEXES_ENABLED', default=True, cast=bool)
+DP_INDEX_TTL = config('DP_INDEX_TTL', default=300, cast=int)  # secondes
+
+# Compteur continu des admissions (mécanisme binaire, un pas par lot d'ingestion)
+CONTINUAL_COUNTER_ENABLED = config('CONTINUAL_COUNTER_ENABLED', default=True, cast=bool)
+CONTINUAL_COUNTER_EPSILON = config('CONTINUAL_COUNTER_EPSILON', default=1.0, cast=float)
+CONTINUAL_COUNTER_HORIZON = config('CONTINUAL_COUNTER_HORIZON', default=4096, cast=int)  # lots
+# Créations isolées (hors lot) regroupées en un pas par fenêtre
+CONTINUAL_COUNTER_WINDOW = config('CONTINUAL_COUNTER_WINDOW', default=86400, cast=int)  # secondes
+
+# Jeux de données synthétiques DP (commande build_synthetic_data)
+SYNTHETIC_DATA_DIR = config('SYNTHETIC_DATA_DIR', default=str(BASE_DIR / 'synthetic'))
+
+# Écriture asynchrone des QueryLog (bulk_create en arrière-plan)
+QUERY_LOG_ASYNC = config('QUERY_LOG_ASYNC', default=True, cast=bool)
+QUERY_LOG_BATCH_SIZE = config('QUERY_LOG_BATCH_SIZE', default=100, cast=int)
+QUERY_LOG_FLUSH_INTERVAL = config('QUERY_LOG_FLUSH_INTERVAL', default=1.0, cast=float)  # secondes
+QUERY_LOG_QUEUE_SIZE = config('QUERY_LOG_QUEUE_SIZE', default=10000, cast=int)
+QUERY_LOG_BACKPRESSURE = config('QUERY_LOG_BACKPRESSURE', default='block')  # 'block' ou 'sync'
+
+# Profilage cProfile opt-in (fraction des requêtes ou en-tête X-Profile d'un admin)
+PROFILER_ENABLED = config('PROFILER_ENABLED', default=True, cast=bool)
+PROFILER_SAMPLE_RATE = config('PROFILER_SAMPLE_RATE', default=0.0, cast=float)
+PROFILER_DIR = config('PROFILER_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILER_MAX_FILES = config('PROFILER_MAX_FILES', default=200, cast=int)
+
+# Endpoint de métriques (format Prometheus), réservé aux scrapers locaux
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1', cast=lambda v: [s.strip() for s in v.split(',')])
+
 # Custom User
 AUTH_USER_MODEL = 'api.User'
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark des endpoints de requêtes DP : vues sync (DRF) vs vues async,
+servies par le même handler ASGI (comme sous uvicorn/daphne).
+
+Sous ASGI, les vues sync passent toutes par un unique thread : les requêtes
+concurrentes sont sérialisées. Les vues async attendent la base et le bruit
+sans bloquer la boucle d'événements.
+
+Run this with: python scripts/benchmark_async.py --requests 200 --concurrency 20
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import django
+
+# Add the project root to the python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Setup Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.conf import settings
+from django.test import AsyncClient
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.models import EpsilonBudget
+from api.audit import query_log_writer
+
+User = get_user_model()
+
+QUERIES = {
+    'count': {'filters': {'age_min': 30, 'age_max': 60}},
+    'mean': {'columns': ['weight', 'height'], 'filters': {'gender': 'F'}},
+    'sum': {'columns': ['treatment_cost']},
+    'median': {'column': 'age', 'bounds': [0, 120]},
+    'histogram': {'column': 'weight', 'num_bins': 20},
+}
+
+
+def get_token(username):
+    """Utilisateur dédié au benchmark, avec un budget epsilon suffisant"""
+    user, _ = User.objects.get_or_create(username=username, defaults={'role': 'analyst'})
+    budget = EpsilonBudget.for_user(user)
+    budget.total_budget = 1e9
+    budget.save()
+    return str(RefreshToken.for_user(user).access_token)
+
+
+async def run(prefix, query_type, total, concurrency, token):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {'Authorization': f'Bearer {token}'}
+    failures = 0
+
+    async def one(i):
+        nonlocal failures
+        # Epsilon distinct par requête : pas de rejeu d'une réponse déjà publiée
+        body = {**QUERIES[query_type], 'epsilon': 0.1 + i * 1e-6}
+        async with semaphore:
+            response = await client.post(f'/api/{prefix}query/{query_type}/', body,
+                                         content_type='application/json', headers=headers)
+        if response.status_code != 200:
+            failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--queries', nargs='+', default=list(QUERIES), choices=list(QUERIES))
+    parser.add_argument('--username', default='benchmark')
+    args = parser.parse_args()
+
+    settings.ALLOWED_HOSTS.append('testserver')
+    token = get_token(args.username)
+
+    print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}")
+    print(f"{'query':<10} {'sync req/s':>12} {'async req/s':>12} {'speedup':>8}")
+    for query_type in args.queries:
+        sync_time, sync_failures = asyncio.run(
+            run('', query_type, args.requests, args.concurrency, token))
+        async_time, async_failures = asyncio.run(
+            run('async/', query_type, args.requests, args.concurrency, token))
+        print(f"{query_type:<10} {args.requests / sync_time:>12.1f} "
+              f"{args.requests / async_time:>12.1f} {sync_time / async_time:>7.2f}x"
+              + (f"  ({sync_failures} sync / {async_failures} async failures)"
+                 if sync_failures or async_failures else ''))
+
+    query_log_writer.flush()
+
+
+if __name__ == '__main__':
+    main()
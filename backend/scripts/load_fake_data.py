@@ -14,7 +14,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
-from api.models import Patient
+from django.db import transaction
+from api.models import Patient, DataVersion
+from api.continual import ingestion_batch
 
 fake = Faker()
 
@@ -62,7 +64,11 @@ def create_fake_patients(count=100):
             print(f"Generated {i + 1} records...")
 
     print("Bulk creating records in database...")
-    Patient.objects.bulk_create(patients)
+    with ingestion_batch() as batch:
+        with transaction.atomic():
+            Patient.objects.bulk_create(patients)
+            DataVersion.bump()
+        batch.add(len(patients))
     print(f"Successfully created {count} patient records!")
 
 if __name__ == '__main__':
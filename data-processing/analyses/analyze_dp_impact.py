@@ -40,15 +40,15 @@ def analyze_epsilon_vs_error():
     for eps in epsilons:
         engine = DPEngine(epsilon=eps)
         
-        # Tester Count
-        count_results = [engine.dp_count(true_count) for _ in range(100)]
-        count_rmse = np.sqrt(np.mean([(c - true_count)**2 for c in count_results]))
+        # Tester Count (100 requêtes, un seul tirage de bruit)
+        count_results = engine.dp_count_many(np.full(100, true_count))
+        count_rmse = np.sqrt(np.mean((count_results - true_count)**2))
         count_errors.append(count_rmse)
         
-        # Tester Mean
-        values = [50.0] * 100  # Tous égaux à 50
-        mean_results = [engine.dp_mean(values, 0, 100) for _ in range(100)]
-        mean_rmse = np.sqrt(np.mean([(m - true_mean)**2 for m in mean_results]))
+        # Tester Mean (100 requêtes sur 100 valeurs toutes égales à 50)
+        values = np.full((100, 100), 50.0)
+        mean_results = engine.dp_mean_many(values, 0, 100)
+        mean_rmse = np.sqrt(np.mean((mean_results - true_mean)**2))
         mean_errors.append(mean_rmse)
         
         print(f"ε={eps:5.2f} → Count RMSE={count_rmse:6.2f}, Mean RMSE={mean_rmse:5.2f}")
@@ -91,12 +91,12 @@ def analyze_noise_distribution():
     
     engine = DPEngine(epsilon=1.0)
     
-    # Générer 10000 échantillons de bruit
-    noises = [engine.add_laplace_noise(0, sensitivity=1.0) for _ in range(10000)]
+    # Générer 10000 échantillons de bruit (un seul tirage)
+    noises = engine.add_laplace_noise(np.zeros(10000), sensitivity=1.0)
     
     print(f"Moyenne du bruit: {np.mean(noises):.4f} (devrait être ~0)")
     print(f"Écart-type du bruit: {np.std(noises):.4f}")
-    print(f"Min: {min(noises):.2f}, Max: {max(noises):.2f}")
+    print(f"Min: {noises.min():.2f}, Max: {noises.max():.2f}")
     
     # Créer le graphique
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5))
@@ -155,12 +155,12 @@ def analyze_privacy_vs_utility():
     for eps in epsilons:
         engine = DPEngine(epsilon=eps)
         
-        # 50 mesures par epsilon
-        mean_results = [engine.dp_mean(list(ages), 0, 100) for _ in range(50)]
-        count_results = [engine.dp_count(true_count) for _ in range(50)]
+        # 50 mesures par epsilon (même jeu de données répété)
+        mean_results = engine.dp_mean_many(np.tile(ages, (50, 1)), 0, 100)
+        count_results = engine.dp_count_many(np.full(50, true_count))
         
-        mean_rmse = np.sqrt(np.mean([(m - true_mean)**2 for m in mean_results]))
-        count_rmse = np.sqrt(np.mean([(c - true_count)**2 for c in count_results]))
+        mean_rmse = np.sqrt(np.mean((mean_results - true_mean)**2))
+        count_rmse = np.sqrt(np.mean((count_results - true_count)**2))
         
         mean_errors.append(mean_rmse)
         count_errors.append(count_rmse)
@@ -293,10 +293,7 @@ def analyze_multiple_queries():
         engine = DPEngine(epsilon=epsilon_per_query)
         
         # Simuler plusieurs requêtes
-        all_results = []
-        for _ in range(num_queries):
-            result = engine.dp_count(true_value)
-            all_results.append(result)
+        all_results = engine.dp_count_many(np.full(num_queries, true_value))
         
         avg_result = np.mean(all_results)
         total_error = abs(avg_result - true_value)
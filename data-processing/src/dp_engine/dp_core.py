@@ -3,42 +3,47 @@ Moteur de Differential Privacy
 Personne 3 - DP Engine Core
 """
 import numpy as np
-from typing import List
+from typing import List, Sequence, Union
 
 class DPEngine:
     """Moteur pour appliquer la Differential Privacy"""
     
-    def __init__(self, epsilon: float = 1.0):
+    def __init__(self, epsilon: float = 1.0,
+                 seed: Union[int, np.random.Generator, None] = None):
         """
         Initialise le moteur DP
         
         Args:
             epsilon: Budget de confidentialité (plus petit = plus privé)
                     Valeurs typiques: 0.1 (très privé) à 10.0 (moins privé)
+            seed: Graine (ou Generator partagé) pour des tirages reproductibles
         """
         self.epsilon = epsilon
+        self.rng = np.random.default_rng(seed)
         print(f"DP Engine initialisé avec epsilon={epsilon}")
     
-    def add_laplace_noise(self, value: float, sensitivity: float = 1.0) -> float:
+    def add_laplace_noise(self, value, sensitivity: float = 1.0):
         """
         Ajoute du bruit de Laplace (mécanisme principal de DP)
         
         Formule: Laplace(0, sensitivity/epsilon)
         
         Args:
-            value: Valeur vraie à protéger
+            value: Valeur vraie à protéger (scalaire ou tableau NumPy)
             sensitivity: Sensibilité de la requête (combien une personne peut changer le résultat)
             
         Returns:
-            Valeur bruitée pour protéger la vie privée
+            Valeur bruitée pour protéger la vie privée (tableau : un seul tirage vectorisé)
         """
         # Calculer l'échelle du bruit
         scale = sensitivity / self.epsilon
         
-        # Générer le bruit de Laplace
-        noise = np.random.laplace(loc=0, scale=scale)
+        if np.ndim(value) == 0:
+            return value + self.rng.laplace(loc=0, scale=scale)
         
-        return value + noise
+        # Générer tout le bruit en un seul appel
+        value = np.asarray(value, dtype=np.float64)
+        return value + self.rng.laplace(loc=0, scale=scale, size=value.shape)
     
     def dp_count(self, count: int) -> int:
         """
@@ -57,6 +62,22 @@ class DPEngine:
         # Garantir que le compte est non-négatif et entier
         return max(0, int(round(noisy_count)))
     
+    def dp_count_many(self, counts) -> np.ndarray:
+        """
+        Plusieurs comptes avec DP en un seul tirage de bruit
+        
+        Chaque compte est une requête de sensibilité 1 (même garantie que
+        dp_count appliqué à chacun).
+        
+        Args:
+            counts: Tableau de comptes vrais
+            
+        Returns:
+            Tableau de comptes bruités (entiers >= 0), de même forme
+        """
+        noisy_counts = self.add_laplace_noise(np.asarray(counts, dtype=np.float64), sensitivity=1.0)
+        return np.maximum(0, np.round(noisy_counts)).astype(np.int64)
+    
     def dp_mean(self, values: List[float], lower: float, upper: float) -> float:
         """
         Moyenne avec Differential Privacy
@@ -84,6 +105,38 @@ class DPEngine:
         # Étape 4: Ajouter le bruit
         return self.add_laplace_noise(true_mean, sensitivity)
     
+    def dp_mean_many(self, groups: Union[np.ndarray, Sequence[Sequence[float]]],
+                     lower: float, upper: float) -> np.ndarray:
+        """
+        Moyennes avec DP de plusieurs groupes, en un seul tirage de bruit
+        
+        Args:
+            groups: Tableau 2D (une ligne par groupe) ou liste de groupes de tailles variables
+            lower: Borne inférieure pour le clipping
+            upper: Borne supérieure pour le clipping
+            
+        Returns:
+            Tableau des moyennes bruitées (0.0 pour un groupe vide, comme dp_mean)
+        """
+        if isinstance(groups, np.ndarray) and groups.ndim == 2:
+            sizes = np.full(groups.shape[0], groups.shape[1])
+            sums = np.clip(groups, lower, upper).sum(axis=1)
+        else:
+            # Groupes de tailles variables : une seule concaténation, sommes par bincount
+            sizes = np.array([len(group) for group in groups], dtype=np.int64)
+            values = np.concatenate([np.asarray(group, dtype=np.float64) for group in groups] or [[]])
+            group_ids = np.repeat(np.arange(len(sizes)), sizes)
+            sums = np.bincount(group_ids, weights=np.clip(values, lower, upper), minlength=len(sizes))
+        
+        non_empty = sizes > 0
+        safe_sizes = np.maximum(sizes, 1)
+        true_means = sums / safe_sizes
+        
+        # Sensibilité par groupe = (upper - lower) / n : bruit unitaire mis à l'échelle
+        unit_noise = self.add_laplace_noise(np.zeros(len(sizes)), sensitivity=upper - lower)
+        noisy_means = true_means + unit_noise / safe_sizes
+        return np.where(non_empty, noisy_means, 0.0)
+    
     def dp_sum(self, values: List[float], lower: float, upper: float) -> float:
         """
         Somme avec Differential Privacy
@@ -111,6 +164,34 @@ class DPEngine:
         # Ajouter bruit
         return self.add_laplace_noise(true_sum, sensitivity)
     
+    def _exponential_quantile(self, values: List[float], quantile: float,
+                              lower: float, upper: float) -> float:
+        """
+        Quantile avec mécanisme exponentiel sur les intervalles entre statistiques d'ordre
+        
+        Les valeurs triées découpent [lower, upper] en n+1 intervalles ; tous les
+        points de l'intervalle i ont i valeurs en dessous, donc le même score
+        -|i - quantile*n| (sensibilité 1). Un intervalle est choisi avec un poids
+        longueur * exp(epsilon * score / 2), calculé en log (Gumbel-max), puis un
+        point uniforme y est tiré. Coût dominé par le tri : O(n log n).
+        """
+        sorted_values = np.sort(np.clip(np.asarray(values, dtype=np.float64), lower, upper))
+        n = len(sorted_values)
+        
+        edges = np.concatenate(([lower], sorted_values, [upper]))
+        widths = np.diff(edges)
+        if not (widths > 0).any():
+            return float(lower)
+        
+        # Score par rang et poids en log (intervalles vides exclus)
+        scores = -np.abs(np.arange(n + 1) - quantile * n)
+        with np.errstate(divide='ignore'):
+            log_weights = np.log(widths) + self.epsilon * scores / 2
+        
+        # Gumbel-max : argmax(log_weights + Gumbel) suit la loi softmax(log_weights)
+        interval = int(np.argmax(log_weights + self.rng.gumbel(size=n + 1)))
+        return float(edges[interval] + self.rng.random() * widths[interval])
+    
     def dp_median(self, values: List[float], lower: float, upper: float) -> float:
         """
         Médiane avec mécanisme exponentiel (plus avancé)
@@ -121,31 +202,12 @@ class DPEngine:
             upper: Borne supérieure
             
         Returns:
-            Médiane approximative avec DP
+            Médiane approximative avec DP (valeur continue dans [lower, upper])
         """
         if len(values) == 0:
             return 0.0
         
-        # Clipper les valeurs
-        clipped = np.clip(values, lower, upper)
-        sorted_values = np.sort(clipped)
-        
-        # Créer des candidats pour la médiane
-        candidates = np.linspace(lower, upper, 100)
-        
-        # Score: distance à la médiane (moins c'est mieux)
-        def score_function(candidate):
-            return -sum(abs(v - candidate) for v in sorted_values)
-        
-        scores = np.array([score_function(c) for c in candidates])
-        
-        # Mécanisme exponentiel: probabilités selon exp(epsilon * score / sensitivity)
-        sensitivity = upper - lower
-        probabilities = np.exp(scores * self.epsilon / (2 * sensitivity))
-        probabilities = probabilities / probabilities.sum()
-        
-        # Échantillonner
-        return np.random.choice(candidates, p=probabilities)
+        return self._exponential_quantile(values, 0.5, lower, upper)
     
     def dp_histogram(self, values: List[float], bins: int, lower: float, upper: float) -> tuple:
         """
@@ -158,7 +220,7 @@ class DPEngine:
             upper: Borne supérieure
             
         Returns:
-            (bin_edges, noisy_counts)
+            (bin_edges, noisy_counts) -- noisy_counts : tableau d'entiers >= 0
         """
         # Créer histogramme vrai
         hist, bin_edges = np.histogram(
@@ -167,8 +229,8 @@ class DPEngine:
             range=(lower, upper)
         )
         
-        # Bruiter chaque bin (sensibilité = 1 par bin)
-        noisy_hist = [self.dp_count(int(count)) for count in hist]
+        # Bruiter tous les bins en un seul tirage (sensibilité = 1 par bin)
+        noisy_hist = self.dp_count_many(hist)
         
         return bin_edges, noisy_hist
     
@@ -193,7 +255,7 @@ class DPEngine:
         clipped = np.clip(values, lower, upper)
         
         # Calculer moyenne avec DP (epsilon/2)
-        engine_half = DPEngine(epsilon=self.epsilon/2)
+        engine_half = DPEngine(epsilon=self.epsilon/2, seed=self.rng)
         dp_mean_val = engine_half.dp_mean(list(clipped), lower, upper)
         
         # Calculer variance
@@ -222,28 +284,8 @@ class DPEngine:
         if len(values) == 0:
             return 0.0
         
-        clipped = np.clip(values, lower, upper)
-        sorted_values = np.sort(clipped)
-        
         # Cible: percentile% des valeurs doivent être sous le résultat
-        target_count = len(values) * (percentile / 100)
-        
-        # Créer candidats
-        candidates = np.linspace(lower, upper, 100)
-        
-        # Score
-        def score_function(candidate):
-            count_below = np.sum(sorted_values <= candidate)
-            return -abs(count_below - target_count)
-        
-        scores = np.array([score_function(c) for c in candidates])
-        
-        # Mécanisme exponentiel
-        sensitivity = upper - lower
-        probabilities = np.exp(scores * self.epsilon / (2 * sensitivity))
-        probabilities = probabilities / probabilities.sum()
-        
-        return np.random.choice(candidates, p=probabilities)
+        return self._exponential_quantile(values, percentile / 100, lower, upper)
     
     def dp_max(self, values: List[float], lower: float, upper: float) -> float:
         """
@@ -276,7 +318,7 @@ class DPEngine:
         probabilities = np.exp(scores * self.epsilon / (2 * sensitivity))
         probabilities = probabilities / probabilities.sum()
         
-        return np.random.choice(candidates, p=probabilities)
+        return self.rng.choice(candidates, p=probabilities)
 
 # ==================== TEST ====================
 if __name__ == "__main__":
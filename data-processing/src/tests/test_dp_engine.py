@@ -144,6 +144,125 @@ def test_epsilon_impact():
     print("Test impact de epsilon")
 
 
+def test_seed_reproducible():
+    """Test: Une même graine donne les mêmes tirages"""
+    results_a = DPEngine(epsilon=1.0, seed=42).dp_count_many(np.full(20, 100))
+    results_b = DPEngine(epsilon=1.0, seed=42).dp_count_many(np.full(20, 100))
+    
+    assert np.array_equal(results_a, results_b)
+    print("Test graine reproductible")
+
+
+def test_dp_count_many_shape_and_range():
+    """Test: DP Count Many garde la forme et retourne des entiers >= 0"""
+    engine = DPEngine(epsilon=1.0, seed=0)
+    counts = np.array([[0, 1, 2], [1000, 1000, 1000]])
+    
+    results = engine.dp_count_many(counts)
+    
+    assert results.shape == counts.shape
+    assert results.dtype == np.int64
+    assert (results >= 0).all()
+    print("Test DP Count Many forme et bornes")
+
+
+def test_dp_count_many_approximate():
+    """Test: DP Count Many est centré sur les vraies valeurs"""
+    engine = DPEngine(epsilon=1.0, seed=1)
+    
+    results = engine.dp_count_many(np.full(10000, 1000))
+    
+    assert abs(results.mean() - 1000) < 0.1
+    assert len(set(results.tolist())) > 10  # Un bruit différent par compte
+    print("Test DP Count Many approximation")
+
+
+def test_dp_mean_many_groups():
+    """Test: DP Mean Many accepte des groupes de tailles variables (et vides)"""
+    engine = DPEngine(epsilon=1e6, seed=2)  # Bruit négligeable
+    groups = [[10, 20, 30], [], [50, 1000]]  # 1000 clippé à 100
+    
+    results = engine.dp_mean_many(groups, lower=0, upper=100)
+    
+    assert np.allclose(results, [20, 0, 75], atol=0.01)
+    print("Test DP Mean Many groupes")
+
+
+def test_dp_mean_many_matrix():
+    """Test: DP Mean Many sur un tableau 2D (une ligne par requête)"""
+    engine = DPEngine(epsilon=1.0, seed=3)
+    values = np.full((2000, 100), 50.0)
+    
+    results = engine.dp_mean_many(values, lower=0, upper=100)
+    
+    # Sensibilité (100 - 0) / 100 = 1 : écart-type théorique sqrt(2)
+    assert results.shape == (2000,)
+    assert abs(results.mean() - 50) < 0.2
+    assert 1.2 < results.std() < 1.6
+    print("Test DP Mean Many tableau 2D")
+
+
+def test_dp_histogram_single_draw():
+    """Test: DP Histogram bruite tous les bins en un seul tirage"""
+    engine = DPEngine(epsilon=1.0, seed=4)
+    calls = []
+    laplace = engine.rng.laplace
+    
+    def counting_laplace(*args, **kwargs):
+        calls.append(kwargs.get('size'))
+        return laplace(*args, **kwargs)
+    
+    engine.rng = type('Rng', (), {'laplace': staticmethod(counting_laplace)})()
+    _, noisy_hist = engine.dp_histogram(list(range(100)), bins=10, lower=0, upper=100)
+    
+    assert calls == [(10,)]
+    assert (np.asarray(noisy_hist) >= 0).all()
+    print("Test DP Histogram un seul tirage")
+
+
+def test_dp_median_large_dataset():
+    """Test: DP Median reste rapide et précise sur 10^6 valeurs"""
+    engine = DPEngine(epsilon=1.0, seed=5)
+    values = engine.rng.normal(50, 10, 1_000_000)
+    
+    result = engine.dp_median(values, lower=0, upper=100)
+    
+    assert abs(result - np.median(values)) < 0.1
+    print("Test DP Median grand jeu de données")
+
+
+def test_dp_median_continuous():
+    """Test: DP Median tire une valeur continue (pas limitée à une grille)"""
+    engine = DPEngine(epsilon=0.5, seed=6)
+    values = [25, 30, 35, 40, 45, 50, 55, 60]
+    
+    results = [engine.dp_median(values, lower=0, upper=100) for _ in range(200)]
+    
+    assert len(set(results)) == 200
+    assert all(0 <= r <= 100 for r in results)
+    print("Test DP Median continue")
+
+
+def test_dp_median_constant_values():
+    """Test: Valeurs identiques ou bornes égales ne cassent pas le mécanisme"""
+    engine = DPEngine(epsilon=1.0, seed=7)
+    
+    assert engine.dp_median([42.0] * 1000, lower=42, upper=42) == 42.0
+    assert 0 <= engine.dp_median([42.0] * 1000, lower=0, upper=100) <= 100
+    print("Test DP Median valeurs constantes")
+
+
+def test_dp_percentile_accuracy():
+    """Test: DP Percentile proche du vrai percentile sur beaucoup de valeurs"""
+    engine = DPEngine(epsilon=1.0, seed=8)
+    values = np.arange(100_000) / 1000.0  # Uniforme sur [0, 100)
+    
+    for percentile in (10, 25, 75, 90):
+        result = engine.dp_percentile(values, percentile, 0, 100)
+        assert abs(result - percentile) < 0.5
+    print("Test DP Percentile précision")
+
+
 # ==================== TESTS EPSILON MANAGER ====================
 
 def test_epsilon_tracker_initialization():
@@ -283,6 +402,16 @@ if __name__ == "__main__":
     test_dp_variance_non_negative()
     test_dp_percentile_order()
     test_epsilon_impact()
+    test_seed_reproducible()
+    test_dp_count_many_shape_and_range()
+    test_dp_count_many_approximate()
+    test_dp_mean_many_groups()
+    test_dp_mean_many_matrix()
+    test_dp_histogram_single_draw()
+    test_dp_median_large_dataset()
+    test_dp_median_continuous()
+    test_dp_median_constant_values()
+    test_dp_percentile_accuracy()
     
     # Tests Epsilon Manager
     print("\nTests Epsilon Manager:")
@@ -299,5 +428,5 @@ if __name__ == "__main__":
     
     print("\n" + "="*70)
     print("TOUS LES TESTS SONT PASSÉS!")
-    print(f"21 TESTS UNITAIRES RÉUSSIS")
+    print(f"31 TESTS UNITAIRES RÉUSSIS")
     print("="*70)
\ No newline at end of file